@@ -0,0 +1,86 @@
+"""Benchmark the selector poll and dispatch path of the event loop.
+
+Registers readers for many sockets that all have data waiting, then
+repeatedly polls the selector and dispatches the ready events, once
+with select() and (key, events) pairs and once with select_raw().
+
+Allocations are measured in a separate pass with tracemalloc: the
+peak amount of memory allocated while polling and dispatching, per
+event, is mostly the per-event tuples and the lists holding them.
+"""
+
+import argparse
+import socket
+import time
+import tracemalloc
+
+from tulip import selectors
+from tulip import unix_events
+
+ARGS = argparse.ArgumentParser(description="Selector poll path benchmark.")
+ARGS.add_argument(
+    '--fds', action='store', dest='fds',
+    default=500, type=int, help='Number of ready sockets')
+ARGS.add_argument(
+    '--polls', action='store', dest='polls',
+    default=200, type=int, help='Number of polls per run')
+ARGS.add_argument(
+    '--selector', action='store', dest='selector',
+    default='DefaultSelector', help='Selector class to use')
+
+
+def noop():
+    pass
+
+
+def poll(loop):
+    event_list = loop._poll_events(0)
+    loop._process_events(event_list)
+    loop._ready.clear()
+    return len(event_list)
+
+
+def run(loop, raw, polls):
+    loop._raw_events = raw
+    nevents = 0
+    t0 = time.perf_counter()
+    for i in range(polls):
+        nevents += poll(loop)
+    t1 = time.perf_counter()
+
+    tracemalloc.start()
+    peak = 0
+    for i in range(10):
+        tracemalloc.clear_traces()
+        n = poll(loop)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] / n)
+    tracemalloc.stop()
+    return (t1 - t0) / nevents, peak
+
+
+def main():
+    args = ARGS.parse_args()
+    selector = getattr(selectors, args.selector)()
+    loop = unix_events.SelectorEventLoop(selector)
+    pairs = [socket.socketpair() for i in range(args.fds)]
+    for rsock, wsock in pairs:
+        wsock.send(b'x')
+        loop.add_reader(rsock.fileno(), noop)
+    print('{}: {} ready fds, {} polls'.format(
+        selector.__class__.__name__, args.fds, args.polls))
+    try:
+        for name, raw in (('select', False), ('select_raw', True)):
+            run(loop, raw, 10)  # Warm up.
+            elapsed, peak = run(loop, raw, args.polls)
+            print('{:>10}: {:.3f} usec/event  {:.0f} bytes/event'.format(
+                name, elapsed * 1e6, peak))
+    finally:
+        for rsock, wsock in pairs:
+            loop.remove_reader(rsock.fileno())
+            rsock.close()
+            wsock.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Benchmark the receive path of socket transports.
+
+Two workloads are run, each with a transport that always passes
+max_size (256 KiB) to recv(), which is how reads used to be done, and
+with the default transport that adapts the size to the data:
+
+- small: many connections that each receive one short message per
+  round, like a chat or RPC server with idle-ish clients;
+- bulk: one connection receiving a stream from a thread.
+
+For the small workload the time per read and the peak memory
+allocated during a round of reads (measured in a separate pass with
+tracemalloc) are reported; for the bulk workload, the throughput.
+"""
+
+import argparse
+import socket
+import threading
+import time
+import tracemalloc
+
+import tulip
+from tulip import selector_events
+
+ARGS = argparse.ArgumentParser(description="Socket read path benchmark.")
+ARGS.add_argument(
+    '--conns', action='store', dest='conns',
+    default=500, type=int, help='Number of connections (small workload)')
+ARGS.add_argument(
+    '--rounds', action='store', dest='rounds',
+    default=200, type=int, help='Number of rounds (small workload)')
+ARGS.add_argument(
+    '--message', action='store', dest='message',
+    default=100, type=int, help='Message size (small workload)')
+ARGS.add_argument(
+    '--total', action='store', dest='total',
+    default=1 << 30, type=int, help='Number of bytes (bulk workload)')
+
+
+class _FixedTransport(selector_events._SelectorSocketTransport):
+
+    min_size = selector_events._SelectorSocketTransport.max_size
+
+
+class Counter(tulip.Protocol):
+
+    def __init__(self, state):
+        self.state = state
+
+    def data_received(self, data):
+        state = self.state
+        state.received += len(data)
+        state.reads += 1
+        if state.received >= state.expected and not state.done.done():
+            state.done.set_result(None)
+
+    def connection_lost(self, exc):
+        if not self.state.done.done():
+            self.state.done.set_result(None)
+
+
+class State:
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.received = self.expected = self.reads = 0
+        self.done = None
+
+    def expect(self, nbytes):
+        self.expected += nbytes
+        self.done = tulip.Future(loop=self.loop)
+
+
+def connect(loop, transport_class, state):
+    rsock, wsock = socket.socketpair()
+    rsock.setblocking(False)
+    transport = transport_class(loop, rsock, Counter(state))
+    return transport, wsock
+
+
+def run_small(loop, transport_class, args):
+    state = State(loop)
+    pairs = [connect(loop, transport_class, state)
+             for i in range(args.conns)]
+    message = b'x' * args.message
+
+    def one_round():
+        state.expect(args.conns * args.message)
+        for transport, wsock in pairs:
+            wsock.send(message)
+        loop.run_until_complete(state.done)
+
+    for i in range(3):
+        one_round()  # Warm up; lets the adaptive size settle.
+    reads = state.reads
+    t0 = time.perf_counter()
+    for i in range(args.rounds):
+        one_round()
+    t1 = time.perf_counter()
+    reads = state.reads - reads
+
+    tracemalloc.start()
+    peak = 0
+    for i in range(5):
+        tracemalloc.clear_traces()
+        one_round()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    for transport, wsock in pairs:
+        transport.close()
+        wsock.close()
+    return (t1 - t0) / reads, peak
+
+
+def writer(sock, total):
+    data = b'x' * (1 << 20)
+    remaining = total
+    while remaining > 0:
+        sock.sendall(data[:remaining])
+        remaining -= len(data)
+    sock.close()
+
+
+def run_bulk(loop, transport_class, args):
+    state = State(loop)
+    transport, wsock = connect(loop, transport_class, state)
+    state.expect(args.total)
+    thread = threading.Thread(target=writer, args=(wsock, args.total))
+    t0 = time.perf_counter()
+    thread.start()
+    loop.run_until_complete(state.done)
+    t1 = time.perf_counter()
+    thread.join()
+    size = transport.get_extra_info('recv_size')
+    transport.close()
+    return t1 - t0, state.reads, size
+
+
+def main():
+    args = ARGS.parse_args()
+    loop = tulip.new_event_loop()
+    transports = (('fixed', _FixedTransport),
+                  ('adaptive', selector_events._SelectorSocketTransport))
+    try:
+        print('small: {} connections, {} byte messages, {} rounds'.format(
+            args.conns, args.message, args.rounds))
+        for name, transport_class in transports:
+            elapsed, peak = run_small(loop, transport_class, args)
+            print('{:>10}: {:.2f} usec/read  peak {:.0f} KiB/round'.format(
+                name, elapsed * 1e6, peak / 1024))
+        print('bulk: {} MiB'.format(args.total >> 20))
+        for name, transport_class in transports:
+            # Best of three; the first run also pays for page faults.
+            elapsed, reads, size = min(
+                run_bulk(loop, transport_class, args) for i in range(3))
+            print('{:>10}: {:.1f} MiB/sec  {} reads  recv_size {}'.format(
+                name, args.total / elapsed / (1 << 20), reads, size))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Benchmark a burst of identical getaddrinfo() lookups.
+
+--lookups lookups of the same host are started at once, first with
+the loop's resolver cache turned off and then with it on, and the time
+until all of them are done and the cache counters are printed.
+"""
+
+import argparse
+import time
+
+import tulip
+from tulip import base_events
+
+ARGS = argparse.ArgumentParser(description="getaddrinfo() cache benchmark.")
+ARGS.add_argument(
+    '--lookups', action='store', dest='lookups',
+    default=1000, type=int, help='Number of concurrent lookups')
+ARGS.add_argument(
+    '--host', action='store', dest='host',
+    default='localhost', help='Host name to look up')
+
+
+def run(loop, args):
+    t0 = time.perf_counter()
+    fs = [loop.getaddrinfo(args.host, 80) for i in range(args.lookups)]
+    loop.run_until_complete(tulip.wait(fs, loop=loop))
+    return time.perf_counter() - t0
+
+
+def main():
+    args = ARGS.parse_args()
+    loop = tulip.new_event_loop()
+    tulip.set_event_loop(None)
+    try:
+        for name, cache in (('uncached', None),
+                            ('cached', base_events.ResolverCache())):
+            loop.set_resolver_cache(cache)
+            elapsed = run(loop, args)
+            print('{:>8}: {:.3f} sec'.format(name, elapsed))
+            if cache is not None:
+                print('          {}'.format(cache.get_stats()))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
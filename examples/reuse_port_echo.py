@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""TCP and UDP echo server sharded over worker processes.
+
+Each of --workers processes runs its own event loop and binds the
+same TCP and UDP port with SO_REUSEPORT; the kernel spreads incoming
+connections and datagrams over them.  Crashed workers are restarted;
+stop the server with ^C.
+"""
+
+import argparse
+import os
+
+import tulip
+from tulip import unix_events
+
+ARGS = argparse.ArgumentParser(description="SO_REUSEPORT echo server.")
+ARGS.add_argument(
+    '--host', action='store', dest='host',
+    default='127.0.0.1', help='Host name')
+ARGS.add_argument(
+    '--port', action='store', dest='port',
+    default=9999, type=int, help='Port number')
+ARGS.add_argument(
+    '--workers', action='store', dest='workers',
+    default=None, type=int, help='Number of processes (default: CPUs)')
+
+
+class TcpEcho(tulip.Protocol):
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.transport.write(data)
+
+    def eof_received(self):
+        self.transport.close()
+
+
+class UdpEcho(tulip.DatagramProtocol):
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+def main():
+    args = ARGS.parse_args()
+
+    def worker(loop, index):
+        loop.run_until_complete(loop.create_server(
+            TcpEcho, args.host, args.port, reuse_port=True))
+        loop.run_until_complete(loop.create_datagram_endpoint(
+            UdpEcho, local_addr=(args.host, args.port), reuse_port=True))
+        print('Worker {} (pid {}) serving on {}:{}'.format(
+            index, os.getpid(), args.host, args.port))
+        loop.run_forever()
+
+    supervisor = unix_events.WorkerSupervisor(worker, args.workers)
+    returncodes = supervisor.run()
+    print('Exit statuses:', returncodes)
+    print('Restarts:', supervisor.restarts)
+
+
+if __name__ == '__main__':
+    main()
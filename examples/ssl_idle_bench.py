@@ -0,0 +1,78 @@
+"""Measure the CPU time an event loop spends on idle SSL connections.
+
+--conns SSL connections are made to a server running in the same loop,
+then the loop sleeps for --seconds while nothing is sent.  The process
+CPU time used during the sleep and the number of loop iterations are
+reported; with idle connections both should be close to zero.
+"""
+
+import argparse
+import os
+import ssl
+import time
+
+import tulip
+
+HERE = os.path.join(os.path.dirname(__file__), '..', 'tests')
+
+ARGS = argparse.ArgumentParser(description="Idle SSL connections benchmark.")
+ARGS.add_argument(
+    '--conns', action='store', dest='conns',
+    default=200, type=int, help='Number of connections')
+ARGS.add_argument(
+    '--seconds', action='store', dest='seconds',
+    default=2.0, type=float, help='How long to stay idle')
+ARGS.add_argument(
+    '--certfile', action='store', dest='certfile',
+    default=os.path.join(HERE, 'sample.crt'), help='Server certificate')
+ARGS.add_argument(
+    '--keyfile', action='store', dest='keyfile',
+    default=os.path.join(HERE, 'sample.key'), help='Server private key')
+
+
+def main():
+    args = ARGS.parse_args()
+    loop = tulip.new_event_loop()
+    tulip.set_event_loop(None)
+
+    server_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    server_context.load_cert_chain(args.certfile, args.keyfile)
+    client_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+
+    server = loop.run_until_complete(loop.create_server(
+        tulip.Protocol, '127.0.0.1', 0, ssl=server_context))
+    host, port = server.sockets[0].getsockname()
+    clients = []
+    for i in range(args.conns):
+        transport, protocol = loop.run_until_complete(
+            loop.create_connection(tulip.Protocol, host, port,
+                                   ssl=client_context))
+        clients.append(transport)
+    loop.run_until_complete(tulip.sleep(0.1, loop=loop))
+
+    iterations = 0
+    run_once = loop._run_once
+
+    def counting_run_once():
+        nonlocal iterations
+        iterations += 1
+        run_once()
+
+    loop._run_once = counting_run_once
+    t0 = time.process_time()
+    loop.run_until_complete(tulip.sleep(args.seconds, loop=loop))
+    t1 = time.process_time()
+    del loop._run_once
+
+    print('{} idle connections for {:.1f} sec: {:.3f} sec CPU, '
+          '{} loop iterations'.format(args.conns, args.seconds,
+                                      t1 - t0, iterations))
+    for transport in clients:
+        transport.close()
+    server.close()
+    loop.run_until_complete(tulip.sleep(0.1, loop=loop))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
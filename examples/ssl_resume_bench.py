@@ -0,0 +1,90 @@
+"""Benchmark short-lived SSL connections with and without resumption.
+
+--conns connections are made one after the other to a server running
+in the same loop; each sends one message and is closed.  This is done
+once with session resumption turned off and once with the loop's
+default session cache, and the connections per second and the
+session cache counters are printed.
+"""
+
+import argparse
+import os
+import ssl
+import time
+
+import tulip
+from tulip import sslproto
+
+HERE = os.path.join(os.path.dirname(__file__), '..', 'tests')
+
+ARGS = argparse.ArgumentParser(description="SSL resumption benchmark.")
+ARGS.add_argument(
+    '--conns', action='store', dest='conns',
+    default=500, type=int, help='Number of connections')
+ARGS.add_argument(
+    '--certfile', action='store', dest='certfile',
+    default=os.path.join(HERE, 'sample.crt'), help='Server certificate')
+ARGS.add_argument(
+    '--keyfile', action='store', dest='keyfile',
+    default=os.path.join(HERE, 'sample.key'), help='Server private key')
+
+
+class Echo(tulip.Protocol):
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.transport.write(data)
+
+
+class Client(tulip.Protocol):
+
+    def __init__(self, loop):
+        self.done = tulip.Future(loop=loop)
+
+    def data_received(self, data):
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+def run(loop, port, context, args):
+    t0 = time.perf_counter()
+    for i in range(args.conns):
+        transport, protocol = loop.run_until_complete(
+            loop.create_connection(lambda: Client(loop), '127.0.0.1', port,
+                                   ssl=context))
+        transport.write(b'ping')
+        loop.run_until_complete(protocol.done)
+        transport.close()
+    return time.perf_counter() - t0
+
+
+def main():
+    args = ARGS.parse_args()
+    loop = tulip.new_event_loop()
+    tulip.set_event_loop(None)
+
+    server_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    server_context.load_cert_chain(args.certfile, args.keyfile)
+    client_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+
+    server = loop.run_until_complete(loop.create_server(
+        Echo, '127.0.0.1', 0, ssl=server_context))
+    port = server.sockets[0].getsockname()[1]
+    try:
+        for name, cache in (('full', None),
+                            ('resumed', sslproto.SSLSessionCache())):
+            loop.set_ssl_session_cache(cache)
+            elapsed = run(loop, port, client_context, args)
+            print('{:>8}: {:.0f} connections/sec'.format(
+                name, args.conns / elapsed))
+            if cache is not None:
+                print('          {}'.format(cache.get_stats()))
+    finally:
+        server.close()
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark the heap timer queue against the TimerWheel.
+
+Schedules many timers with call_later(), cancels most of them (like
+read timeouts that are cancelled when data arrives), and runs the
+loop until all remaining timers have fired.  The loop runs on a
+virtual clock so the numbers measure only the scheduler.
+"""
+
+import argparse
+import random
+import time
+
+from tulip import base_events
+from tulip import timers
+
+ARGS = argparse.ArgumentParser(description="Timer queue benchmark.")
+ARGS.add_argument(
+    '--timers', action='store', dest='timers',
+    default=10**6, type=int, help='Number of timers')
+ARGS.add_argument(
+    '--cancel', action='store', dest='cancel',
+    default=0.95, type=float, help='Fraction of timers cancelled')
+ARGS.add_argument(
+    '--span', action='store', dest='span',
+    default=60.0, type=float, help='Timers are spread over this many seconds')
+
+
+class VirtualSelector:
+    """Selector that never has I/O and jumps the clock on select()."""
+
+    def __init__(self, clock):
+        self.clock = clock
+
+    def select(self, timeout):
+        if timeout:
+            self.clock.now += timeout
+        return []
+
+
+class Clock:
+    now = 0.0
+
+
+class VirtualLoop(base_events.BaseEventLoop):
+
+    def __init__(self):
+        super().__init__()
+        self._clock = Clock()
+        self._selector = VirtualSelector(self._clock)
+
+    def time(self):
+        return self._clock.now
+
+    def _process_events(self, event_list):
+        pass
+
+
+def run(loop, delays, cancel):
+    fired = 0
+
+    def cb():
+        nonlocal fired
+        fired += 1
+
+    t0 = time.perf_counter()
+    handles = [loop.call_later(delay, cb) for delay in delays]
+    t1 = time.perf_counter()
+    for i in cancel:
+        handles[i].cancel()
+    handles = None
+    t2 = time.perf_counter()
+    while fired < len(delays) - len(cancel):
+        loop._run_once()
+    t3 = time.perf_counter()
+    return t1 - t0, t2 - t1, t3 - t2, fired
+
+
+def main():
+    args = ARGS.parse_args()
+    rnd = random.Random(0)
+    delays = [rnd.random() * args.span for i in range(args.timers)]
+    cancel = rnd.sample(range(args.timers), int(args.timers * args.cancel))
+    print('{} timers over {:.0f}s, {:.0%} cancelled'.format(
+        args.timers, args.span, args.cancel))
+    for name in ('heap', 'wheel'):
+        loop = VirtualLoop()
+        if name == 'wheel':
+            loop.set_timer_wheel(timers.TimerWheel())
+        schedule, cancelled, expire, fired = run(loop, delays, cancel)
+        print('{:>5}: schedule {:.3f}s  cancel {:.3f}s  expire {:.3f}s  '
+              'total {:.3f}s  ({} fired)'.format(
+                  name, schedule, cancelled, expire,
+                  schedule + cancelled + expire, fired))
+
+
+if __name__ == '__main__':
+    main()
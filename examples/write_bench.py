@@ -0,0 +1,125 @@
+"""Benchmark the buffered write path of socket transports.
+
+A protocol writes --total bytes in --chunk sized pieces through a
+socket transport as fast as flow control allows, while a thread reads
+the other end of the socket pair in small pieces, so a backlog of
+many chunks builds up in the transport's buffer.
+
+The run is repeated with a transport that joins the whole buffer into
+one bytes object before every send() and copies the remainder after a
+partial send, which is how the buffer used to be written, to compare
+it with the scatter-gather sendmsg() path.
+"""
+
+import argparse
+import socket
+import threading
+import time
+
+import tulip
+from tulip import selector_events
+
+ARGS = argparse.ArgumentParser(description="Socket write path benchmark.")
+ARGS.add_argument(
+    '--total', action='store', dest='total',
+    default=1 << 30, type=int, help='Number of bytes to stream')
+ARGS.add_argument(
+    '--chunk', action='store', dest='chunk',
+    default=4096, type=int, help='Size of each write()')
+ARGS.add_argument(
+    '--high', action='store', dest='high',
+    default=16 << 20, type=int, help='High-water mark of the transport')
+ARGS.add_argument(
+    '--read-size', action='store', dest='read_size',
+    default=16384, type=int, help='Size of each recv() by the reader')
+
+
+class _JoiningTransport(selector_events._SelectorSocketTransport):
+
+    def _send_buffer(self):
+        data = b''.join(self._buffer)
+        self._buffer.clear()
+        n = self._sock.send(data)
+        self._buffer_size -= n
+        if n < len(data):
+            self._buffer.append(data[n:])
+
+
+class Producer(tulip.Protocol):
+
+    def __init__(self, total, chunk, done):
+        self.remaining = total
+        self.data = b'x' * chunk
+        self.done = done
+        self.paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.produce()
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.produce()
+
+    def produce(self):
+        while self.remaining > 0 and not self.paused:
+            self.transport.write(self.data)
+            self.remaining -= len(self.data)
+        if self.remaining <= 0 and not self.done.done():
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        self.done.set_result(None)
+
+
+def reader(sock, read_size, result):
+    total = 0
+    while True:
+        data = sock.recv(read_size)
+        if not data:
+            break
+        total += len(data)
+    result.append(total)
+
+
+def run(loop, transport_class, args):
+    rsock, wsock = socket.socketpair()
+    wsock.setblocking(False)
+    result = []
+    thread = threading.Thread(target=reader,
+                              args=(rsock, args.read_size, result))
+    thread.start()
+    done = tulip.Future(loop=loop)
+    protocol = Producer(args.total, args.chunk, done)
+    t0 = time.perf_counter()
+    transport = transport_class(loop, wsock, protocol)
+    transport.set_write_buffer_limits(high=args.high)
+    loop.run_until_complete(done)
+    thread.join()
+    t1 = time.perf_counter()
+    rsock.close()
+    assert result[0] >= args.total, result
+    return t1 - t0
+
+
+def main():
+    args = ARGS.parse_args()
+    loop = tulip.new_event_loop()
+    print('{} MiB in {} byte writes, high-water mark {} KiB'.format(
+        args.total >> 20, args.chunk, args.high >> 10))
+    try:
+        for name, transport_class in (
+                ('join', _JoiningTransport),
+                ('sendmsg', selector_events._SelectorSocketTransport)):
+            elapsed = run(loop, transport_class, args)
+            print('{:>8}: {:.2f} sec  {:.1f} MiB/sec'.format(
+                name, elapsed, args.total / elapsed / (1 << 20)))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
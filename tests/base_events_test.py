@@ -1,6 +1,6 @@
 """Tests for base_events.py"""
 
-import logging
+import errno
 import socket
 import time
 import unittest
@@ -9,9 +9,16 @@ import unittest.mock
 from tulip import base_events
 from tulip import events
 from tulip import futures
+from tulip import monitor
 from tulip import protocols
 from tulip import tasks
 from tulip import test_utils
+from tulip import timers
+
+
+# The counters of a new loop's resolver cache, in get_stats().
+RESOLVER_STATS = {'resolver_cached': 0, 'resolver_hits': 0,
+                  'resolver_misses': 0, 'resolver_merges': 0}
 
 
 class BaseEventLoopTests(unittest.TestCase):
@@ -123,6 +130,117 @@ class BaseEventLoopTests(unittest.TestCase):
         t1 = self.loop.time()
         self.assertTrue(0.09 <= t1-t0 <= 0.12, t1-t0)
 
+    def test_call_later_timer_wheel(self):
+        calls = []
+
+        def cb(arg):
+            calls.append(arg)
+
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop.set_timer_wheel(timers.TimerWheel())
+        self.loop.call_later(-1, cb, 'a')
+        self.loop.call_later(-2, cb, 'b')
+        self.loop.call_later(-3, cb, 'c').cancel()
+        self.assertEqual(2, len(self.loop._timer_wheel))
+        test_utils.run_briefly(self.loop)
+        self.assertEqual(calls, ['b', 'a'])
+
+    def test_set_timer_wheel_moves_timers(self):
+        h1 = self.loop.call_later(10.0, lambda: True)
+        h2 = self.loop.call_later(20.0, lambda: True)
+        h2.cancel()
+        wheel = timers.TimerWheel()
+        self.loop.set_timer_wheel(wheel)
+        self.assertEqual([], self.loop._scheduled)
+        self.assertEqual([h1], wheel.clear())
+
+        self.loop.set_timer_wheel(wheel)
+        h3 = self.loop.call_later(30.0, lambda: True)
+        self.loop.set_timer_wheel(None)
+        self.assertEqual([h3], self.loop._scheduled)
+        self.assertIsNone(self.loop._timer_wheel)
+
+    def test_timer_wheel_cancel_removes(self):
+        wheel = timers.TimerWheel()
+        self.loop.set_timer_wheel(wheel)
+        h = self.loop.call_later(10.0, lambda: True)
+        self.assertEqual(1, len(wheel))
+        h.cancel()
+        self.assertEqual(0, len(wheel))
+
+    def test_time_and_call_at_timer_wheel(self):
+        def cb():
+            self.loop.stop()
+
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop.set_timer_wheel(timers.TimerWheel())
+        when = self.loop.time() + 0.1
+        self.loop.call_at(when, cb)
+        t0 = self.loop.time()
+        self.loop.run_forever()
+        t1 = self.loop.time()
+        self.assertTrue(0.09 <= t1-t0 <= 0.12, t1-t0)
+
+    def test_timer_cancelled_count(self):
+        h1 = self.loop.call_later(10.0, lambda: True)
+        h2 = self.loop.call_later(20.0, lambda: True)
+        h1.cancel()
+        h1.cancel()
+        self.assertEqual(
+            dict(RESOLVER_STATS,
+                 timers=2, timers_cancelled=1, timer_purges=0),
+            self.loop.get_stats())
+
+        # Popping it from the head of the heap uncounts it.
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop._run_once()
+        self.assertEqual([h2], self.loop._scheduled)
+        self.assertEqual(0, self.loop.get_stats()['timers_cancelled'])
+
+    def test_timer_cancel_after_run(self):
+        h = self.loop.call_later(-1, lambda: True)
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop._run_once()
+        self.assertFalse(h._scheduled)
+        h.cancel()
+        self.assertEqual(0, self.loop.get_stats()['timers_cancelled'])
+
+    def test_purge_cancelled_timers(self):
+        handles = [self.loop.call_later(10.0 + i, lambda: True)
+                   for i in range(300)]
+        for h in handles[1:201]:
+            h.cancel()
+        self.assertEqual(200, self.loop.get_stats()['timers_cancelled'])
+
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop._run_once()
+        self.assertEqual(
+            dict(RESOLVER_STATS,
+                 timers=100, timers_cancelled=0, timer_purges=1),
+            self.loop.get_stats())
+        self.assertEqual(
+            sorted(handles[:1] + handles[201:]), sorted(self.loop._scheduled))
+        self.assertFalse(any(h._scheduled for h in handles[1:201]))
+
+    def test_purge_cancelled_timers_few(self):
+        handles = [self.loop.call_later(10.0 + i, lambda: True)
+                   for i in range(50)]
+        for h in handles[1:]:
+            h.cancel()
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop._run_once()
+        self.assertEqual(0, self.loop.get_stats()['timer_purges'])
+        self.assertEqual(50, len(self.loop._scheduled))
+
+    def test_get_stats_timer_wheel(self):
+        self.loop.set_timer_wheel(timers.TimerWheel())
+        self.loop.call_later(10.0, lambda: True)
+        self.loop.call_later(20.0, lambda: True).cancel()
+        self.assertEqual(
+            dict(RESOLVER_STATS,
+                 timers=1, timers_cancelled=0, timer_purges=0),
+            self.loop.get_stats())
+
     def test_run_once_in_executor_handle(self):
         def cb():
             pass
@@ -182,12 +300,18 @@ class BaseEventLoopTests(unittest.TestCase):
         self.assertEqual([h2], self.loop._scheduled)
         self.assertTrue(self.loop._process_events.called)
 
-    @unittest.mock.patch('tulip.base_events.time')
     @unittest.mock.patch('tulip.base_events.tulip_log')
-    def test__run_once_logging(self, m_logging, m_time):
-        # Log to INFO level if timeout > 1.0 sec.
+    def test__run_once_no_instrument(self, m_logging):
+        self.loop._scheduled.append(
+            events.TimerHandle(11.0, lambda: True, ()))
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop._run_once()
+        self.assertFalse(m_logging.log.called)
+
+    @unittest.mock.patch('tulip.base_events.time')
+    def test__run_once_instrument(self, m_time):
         idx = -1
-        data = [10.0, 10.0, 12.0, 13.0]
+        data = [10.0, 12.0, 13.0, 13.0, 13.5]
 
         def monotonic():
             nonlocal data, idx
@@ -195,20 +319,45 @@ class BaseEventLoopTests(unittest.TestCase):
             return data[idx]
 
         m_time.monotonic = monotonic
-        m_logging.INFO = logging.INFO
-        m_logging.DEBUG = logging.DEBUG
-
+        instrument = unittest.mock.Mock(slow_callback_duration=None)
+        self.loop._instrument = instrument
         self.loop._scheduled.append(
             events.TimerHandle(11.0, lambda: True, ()))
+        self.loop.call_soon(lambda: True)
+        self.loop._selector.select.return_value = [object()]
         self.loop._process_events = unittest.mock.Mock()
         self.loop._run_once()
-        self.assertEqual(logging.INFO, m_logging.log.call_args[0][0])
-
-        idx = -1
-        data = [10.0, 10.0, 10.3, 13.0]
-        self.loop._scheduled = [events.TimerHandle(11.0, lambda:True, ())]
-        self.loop._run_once()
-        self.assertEqual(logging.DEBUG, m_logging.log.call_args[0][0])
+        instrument.iteration.assert_called_with(2.0, 0.5, 2, 1, 1)
+        self.assertFalse(instrument.slow_callback.called)
+
+    def test_set_instrument(self):
+        instrument = monitor.LoopInstrument()
+        self.loop.set_instrument(instrument)
+        self.assertIs(instrument, self.loop._instrument)
+        self.loop.set_instrument(None)
+        self.assertIsNone(self.loop._instrument)
+        self.assertRaises(AssertionError, self.loop.set_instrument, object())
+
+    def test_slow_callback(self):
+        loop = test_utils.TestLoop()
+        instrument = monitor.LoopInstrument(slow_callback_duration=0.1)
+        instrument.slow_callback = unittest.mock.Mock()
+        loop.set_instrument(instrument)
+
+        def slow():
+            loop.advance_time(0.5)
+
+        def fast():
+            loop.advance_time(0.01)
+
+        h = loop.call_soon(slow)
+        loop.call_soon(fast)
+        test_utils.run_once(loop)
+        instrument.slow_callback.assert_called_once_with(h, 0.5)
+        self.assertEqual(1, instrument.iterations)
+        self.assertEqual(3, instrument.max_ready)
+        self.assertAlmostEqual(0.51, instrument.callback_time)
+        loop.close()
 
     def test__run_once_schedule_handle(self):
         handle = None
@@ -333,6 +482,108 @@ class BaseEventLoopWithSelectorTests(unittest.TestCase):
 
         self.assertEqual(str(cm.exception), 'Multiple exceptions: err1, err2')
 
+    def _listen(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(5)
+        self.addCleanup(listener.close)
+        return listener.getsockname()[1]
+
+    def _patch_connect(self, port, *blackholed):
+        # Connects to the addresses in blackholed never complete.
+        @tasks.coroutine
+        def getaddrinfo(*args, **kw):
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (host, port))
+                    for host in blackholed + ('127.0.0.1',)]
+
+        self.loop.getaddrinfo = lambda *args, **kw: tasks.Task(
+            getaddrinfo(), loop=self.loop)
+        sock_connect = self.loop.sock_connect
+        self.blackholes = []
+
+        def connect(sock, address):
+            if address[0] in blackholed:
+                fut = futures.Future(loop=self.loop)
+                self.blackholes.append(fut)
+                return fut
+            return sock_connect(sock, address)
+
+        self.loop.sock_connect = connect
+
+    def test_create_connection_happy_eyeballs(self):
+        port = self._listen()
+        self._patch_connect(port, '192.0.2.1', '192.0.2.2')
+        t0 = time.monotonic()
+        tr, pr = self.loop.run_until_complete(self.loop.create_connection(
+            MyProto, 'example.com', port, happy_eyeballs_delay=0.01))
+        self.assertLess(time.monotonic() - t0, 1)
+        self.assertEqual(('127.0.0.1', port), tr.get_extra_info('peername'))
+        self.assertEqual(2, len(self.blackholes))
+        test_utils.run_briefly(self.loop)
+        self.assertTrue(all(fut.cancelled() for fut in self.blackholes))
+        tr.close()
+
+    def test_create_connection_happy_eyeballs_error(self):
+        # A failed attempt starts the next one without waiting.
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+
+        @tasks.coroutine
+        def getaddrinfo(*args, **kw):
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '',
+                     ('127.0.0.1', p)) for p in (closed_port, port)]
+
+        port = self._listen()
+        self.loop.getaddrinfo = lambda *args, **kw: tasks.Task(
+            getaddrinfo(), loop=self.loop)
+        t0 = time.monotonic()
+        tr, pr = self.loop.run_until_complete(self.loop.create_connection(
+            MyProto, 'example.com', port, happy_eyeballs_delay=10))
+        self.assertLess(time.monotonic() - t0, 5)
+        self.assertEqual(('127.0.0.1', port), tr.get_extra_info('peername'))
+        tr.close()
+
+    def test_create_connection_happy_eyeballs_all_fail(self):
+        port = self._listen()
+        self._patch_connect(port, '192.0.2.1', '192.0.2.2', '127.0.0.1')
+        coro = self.loop.create_connection(
+            MyProto, 'example.com', port, happy_eyeballs_delay=0.01,
+            connect_timeout=0.05)
+        with self.assertRaises(OSError) as cm:
+            self.loop.run_until_complete(coro)
+        self.assertIn('timed out', str(cm.exception))
+        self.assertTrue(all(fut.cancelled() for fut in self.blackholes))
+
+    def test_create_connection_connect_timeout(self):
+        port = self._listen()
+        self._patch_connect(port, '192.0.2.1')
+        tr, pr = self.loop.run_until_complete(self.loop.create_connection(
+            MyProto, 'example.com', port, connect_timeout=0.05))
+        self.assertEqual(('127.0.0.1', port), tr.get_extra_info('peername'))
+        self.assertTrue(self.blackholes[0].cancelled())
+        tr.close()
+
+        self._patch_connect(port, '192.0.2.1', '127.0.0.1')
+        coro = self.loop.create_connection(
+            MyProto, 'example.com', port, connect_timeout=0.01)
+        with self.assertRaises(OSError) as cm:
+            self.loop.run_until_complete(coro)
+        self.assertIn('timed out', str(cm.exception))
+
+    def test_interleave_addrinfos(self):
+        v4 = [(socket.AF_INET, 1, 6, '', ('192.0.2.%d' % i, 80))
+              for i in range(3)]
+        v6 = [(socket.AF_INET6, 1, 6, '', ('2001:db8::%d' % i, 80, 0, 0))
+              for i in range(2)]
+        interleave = base_events._interleave_addrinfos
+        self.assertEqual([v6[0], v4[0], v6[1], v4[1], v4[2]],
+                         interleave(v6 + v4))
+        self.assertEqual([v6[0], v6[1], v4[0], v4[1], v4[2]],
+                         interleave(v6 + v4, 2))
+        self.assertEqual(v4, interleave(v4))
+
     def test_create_connection_host_port_sock(self):
         coro = self.loop.create_connection(
             MyProto, 'example.com', 80, sock=object())
@@ -490,6 +741,47 @@ class BaseEventLoopWithSelectorTests(unittest.TestCase):
         self.assertRaises(OSError, self.loop.run_until_complete, fut)
         self.assertTrue(m_sock.close.called)
 
+    @unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), 'No SO_REUSEPORT')
+    def test_create_server_reuse_port(self):
+        servers = [self.loop.run_until_complete(self.loop.create_server(
+            MyProto, '127.0.0.1', 0, reuse_port=True))]
+        port = servers[0].sockets[0].getsockname()[1]
+        servers.append(self.loop.run_until_complete(self.loop.create_server(
+            MyProto, '127.0.0.1', port, reuse_port=True)))
+        for server in servers:
+            sock = server.sockets[0]
+            self.assertEqual(port, sock.getsockname()[1])
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_REUSEPORT))
+            server.close()
+
+    @unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), 'No SO_REUSEPORT')
+    def test_create_datagram_endpoint_reuse_port(self):
+        transport, protocol = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                MyDatagramProto, local_addr=('127.0.0.1', 0),
+                reuse_port=True))
+        port = transport.get_extra_info('sockname')[1]
+        transport2, protocol = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                MyDatagramProto, local_addr=('127.0.0.1', port),
+                reuse_port=True))
+        self.assertEqual(port, transport2.get_extra_info('sockname')[1])
+        transport.close()
+        transport2.close()
+        self.loop.run_until_complete(tasks.sleep(0, loop=self.loop))
+
+    @unittest.mock.patch('tulip.base_events.socket')
+    def test_reuse_port_not_supported(self, m_socket):
+        del m_socket.SO_REUSEPORT
+        coro = self.loop.create_server(MyProto, '127.0.0.1', 0,
+                                       reuse_port=True)
+        self.assertRaises(ValueError, self.loop.run_until_complete, coro)
+        coro = self.loop.create_datagram_endpoint(
+            MyDatagramProto, local_addr=('127.0.0.1', 0), reuse_port=True)
+        self.assertRaises(ValueError, self.loop.run_until_complete, coro)
+        self.assertFalse(m_socket.socket.called)
+
     @unittest.mock.patch('tulip.base_events.socket')
     def test_create_datagram_endpoint_no_addrinfo(self, m_socket):
         m_socket.getaddrinfo.return_value = []
@@ -588,3 +880,304 @@ class BaseEventLoopWithSelectorTests(unittest.TestCase):
         self.loop._accept_connection(MyProto, sock)
         self.assertTrue(sock.close.called)
         self.assertTrue(m_log.exception.called)
+
+    def test_accept_connection_batch(self):
+        sock = unittest.mock.Mock()
+        conns = [(unittest.mock.Mock(), ('127.0.0.1', 1000 + i))
+                 for i in range(3)]
+        sock.accept.side_effect = conns + [BlockingIOError()]
+        self.loop._make_socket_transport = unittest.mock.Mock()
+
+        self.loop._accept_connection(MyProto, sock)
+        self.assertEqual(4, sock.accept.call_count)
+        self.assertEqual(3, self.loop._make_socket_transport.call_count)
+        for conn, addr in conns:
+            conn.setblocking.assert_called_with(False)
+        self.assertFalse(sock.close.called)
+
+    def test_accept_connection_batch_limit(self):
+        sock = unittest.mock.Mock()
+        sock.accept.return_value = (unittest.mock.Mock(), ('127.0.0.1', 1))
+        self.loop._make_socket_transport = unittest.mock.Mock()
+        self.loop.accept_batch = 5
+
+        self.loop._accept_connection(MyProto, sock)
+        self.assertEqual(5, sock.accept.call_count)
+
+    def test_accept_connection_aborted(self):
+        sock = unittest.mock.Mock()
+        sock.accept.side_effect = [ConnectionAbortedError(),
+                                   (unittest.mock.Mock(), ('127.0.0.1', 1)),
+                                   BlockingIOError()]
+        self.loop._make_socket_transport = unittest.mock.Mock()
+
+        self.loop._accept_connection(MyProto, sock)
+        self.assertEqual(1, self.loop._make_socket_transport.call_count)
+        self.assertFalse(sock.close.called)
+
+    @unittest.mock.patch('tulip.selector_events.tulip_log')
+    def test_accept_connection_emfile(self, m_log):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = 10
+        sock.accept.side_effect = OSError(errno.EMFILE, 'Too many open files')
+        self.loop.remove_reader = unittest.mock.Mock()
+        self.loop.call_later = unittest.mock.Mock()
+
+        self.loop._accept_connection(MyProto, sock)
+        self.assertFalse(sock.close.called)
+        self.assertTrue(m_log.warning.called)
+        self.loop.remove_reader.assert_called_with(10)
+        self.loop.call_later.assert_called_with(
+            self.loop.accept_backoff, self.loop._resume_accepting,
+            MyProto, sock, None, None)
+        self.assertEqual(1, self.loop.get_stats()['accept_pauses'])
+
+    def test_resume_accepting(self):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = 10
+        self.loop._start_serving = unittest.mock.Mock()
+
+        self.loop._resume_accepting(MyProto, sock, None, None)
+        self.loop._start_serving.assert_called_with(
+            MyProto, sock, None, None)
+
+    def test_resume_accepting_closed(self):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = -1
+        self.loop._start_serving = unittest.mock.Mock()
+
+        self.loop._resume_accepting(MyProto, sock, None, None)
+        self.assertFalse(self.loop._start_serving.called)
+
+    def test_create_server_admission_errors(self):
+        sock = unittest.mock.Mock()
+        fut = self.loop.create_server(MyProto, sock=sock, max_connections=0)
+        self.assertRaises(ValueError, self.loop.run_until_complete, fut)
+        fut = self.loop.create_server(MyProto, sock=sock, max_accept_rate=0)
+        self.assertRaises(ValueError, self.loop.run_until_complete, fut)
+
+        loop = base_events.BaseEventLoop()
+        fut = loop.create_server(MyProto, sock=sock, max_connections=1)
+        self.assertRaises(NotImplementedError, next, fut)
+
+    def _make_server(self, **kwargs):
+        self.loop._start_serving = unittest.mock.Mock()
+        self.loop._pause_serving = unittest.mock.Mock()
+        self.sock = unittest.mock.Mock()
+        return self.loop.run_until_complete(self.loop.create_server(
+            MyProto, sock=self.sock, **kwargs))
+
+    def test_server_max_connections(self):
+        server = self._make_server(max_connections=20)
+        for i in range(19):
+            server.attach(None)
+        self.assertFalse(server._paused)
+        server.attach(None)
+        self.assertTrue(server._paused)
+        self.loop._pause_serving.assert_called_with(self.sock)
+        self.loop._start_serving.reset_mock()
+
+        # Resumes at the low-water mark, 90% of max_connections.
+        server.detach(None)
+        self.assertTrue(server._paused)
+        self.assertFalse(self.loop._start_serving.called)
+        server.detach(None)
+        self.assertFalse(server._paused)
+        self.loop._start_serving.assert_called_with(
+            MyProto, self.sock, None, server)
+
+        stats = server.get_stats()
+        self.assertEqual(18, stats['active_count'])
+        self.assertEqual(1, stats['pauses'])
+        self.assertFalse(stats['paused'])
+        self.assertGreaterEqual(stats['paused_time'], 0)
+
+    def test_server_max_accept_rate(self):
+        self.loop.time = unittest.mock.Mock(return_value=100.0)
+        self.loop.call_later = unittest.mock.Mock()
+        server = self._make_server(max_accept_rate=2)
+        server.attach(None)
+        self.assertFalse(server._paused)
+        server.attach(None)
+        self.assertTrue(server._paused)
+        self.loop.call_later.assert_called_with(0.5, server._rate_ready)
+
+        # Closing connections does not help.
+        server.detach(None)
+        self.assertTrue(server._paused)
+
+        self.loop.time.return_value = 100.5
+        server._rate_ready()
+        self.assertFalse(server._paused)
+        self.assertEqual(
+            {'active_count': 1, 'paused': False, 'pauses': 1,
+             'paused_time': 0.5},
+            server.get_stats())
+
+    def test_server_close_paused(self):
+        self.loop._stop_serving = unittest.mock.Mock()
+        server = self._make_server(max_connections=1, max_accept_rate=1)
+        self.loop._start_serving.reset_mock()
+        server.attach(None)
+        self.assertTrue(server._paused)
+        timer = server._rate_timer
+        server.close()
+        self.assertTrue(timer._cancelled)
+        self.assertFalse(server._paused)
+        self.loop._stop_serving.assert_called_with(self.sock)
+        server.detach(None)
+        self.assertFalse(self.loop._start_serving.called)
+
+    def test_accept_connection_server_paused(self):
+        sock = unittest.mock.Mock()
+        sock.accept.return_value = (unittest.mock.Mock(), ('127.0.0.1', 1))
+        server = unittest.mock.Mock()
+        server._paused = False
+        server._handoff = None
+
+        def make_transport(*args, **kwargs):
+            server._paused = True
+
+        self.loop._make_socket_transport = make_transport
+        self.loop._accept_connection(MyProto, sock, None, server)
+        self.assertEqual(1, sock.accept.call_count)
+
+    def test_resume_accepting_server_paused(self):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = 10
+        server = unittest.mock.Mock()
+        server._paused = True
+        self.loop._start_serving = unittest.mock.Mock()
+
+        self.loop._resume_accepting(MyProto, sock, None, server)
+        self.assertFalse(self.loop._start_serving.called)
+
+
+class ResolverCacheTests(unittest.TestCase):
+
+    INFOS = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 80))]
+
+    def setUp(self):
+        self.loop = events.new_event_loop()
+        events.set_event_loop(None)
+        self.cache = base_events.ResolverCache()
+        self.loop.set_resolver_cache(self.cache)
+        patcher = unittest.mock.patch('socket.getaddrinfo',
+                                      return_value=self.INFOS)
+        self.m_getaddrinfo = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def lookup(self, n=1, **kwargs):
+        fs = [self.loop.getaddrinfo('example.com', 80, **kwargs)
+              for i in range(n)]
+        self.loop.run_until_complete(tasks.wait(fs, loop=self.loop))
+        return fs
+
+    def test_hit(self):
+        f1, = self.lookup()
+        f2, = self.lookup()
+        self.assertEqual(self.INFOS, f1.result())
+        self.assertEqual(self.INFOS, f2.result())
+        self.assertIsNot(f1.result(), f2.result())
+        self.assertEqual(1, self.m_getaddrinfo.call_count)
+        self.assertEqual({'cached': 1, 'hits': 1, 'misses': 1, 'merges': 0},
+                         self.cache.get_stats())
+        self.assertEqual(1, self.loop.get_stats()['resolver_hits'])
+
+    def test_single_flight(self):
+        fs = self.lookup(3)
+        self.assertEqual([self.INFOS] * 3, [f.result() for f in fs])
+        self.assertEqual(1, self.m_getaddrinfo.call_count)
+        self.assertEqual(1, self.cache.misses)
+        self.assertEqual(2, self.cache.merges)
+        self.assertEqual({}, self.cache._waiters)
+
+    def test_single_flight_cancelled_waiter(self):
+        fs = [self.loop.getaddrinfo('example.com', 80) for i in range(2)]
+        fs[0].cancel()
+        self.loop.run_until_complete(fs[1])
+        self.assertEqual(self.INFOS, fs[1].result())
+
+    def test_ttl(self):
+        self.loop.time = unittest.mock.Mock(return_value=100.0)
+        self.lookup()
+        self.loop.time.return_value = 100.0 + self.cache.ttl - 0.01
+        self.lookup()
+        self.assertEqual(1, self.m_getaddrinfo.call_count)
+        self.loop.time.return_value = 100.0 + self.cache.ttl
+        self.lookup()
+        self.assertEqual(2, self.m_getaddrinfo.call_count)
+
+    def test_negative(self):
+        self.loop.time = unittest.mock.Mock(return_value=100.0)
+        self.m_getaddrinfo.side_effect = socket.gaierror(
+            socket.EAI_NONAME, 'Name or service not known')
+        for i in range(2):
+            f, = self.lookup()
+            self.assertIsInstance(f.exception(), socket.gaierror)
+        self.assertEqual(1, self.m_getaddrinfo.call_count)
+        self.loop.time.return_value = 100.0 + self.cache.negative_ttl
+        f, = self.lookup()
+        self.assertIsInstance(f.exception(), socket.gaierror)
+        self.assertEqual(2, self.m_getaddrinfo.call_count)
+
+    def test_negative_fresh_exception(self):
+        # Each waiter and each cache hit gets its own exception.
+        exc = socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        self.m_getaddrinfo.side_effect = exc
+        fs = self.lookup(2) + self.lookup()
+        errors = [f.exception() for f in fs]
+        self.assertEqual(3, len(set(map(id, errors))))
+        self.assertNotIn(exc, errors)
+        for error in errors:
+            self.assertIsInstance(error, socket.gaierror)
+            self.assertEqual(exc.args, error.args)
+        self.assertEqual(1, self.m_getaddrinfo.call_count)
+
+    def test_error_not_cached(self):
+        self.m_getaddrinfo.side_effect = UnicodeError
+        for i in range(2):
+            f, = self.lookup()
+            self.assertIsInstance(f.exception(), UnicodeError)
+        self.assertEqual(2, self.m_getaddrinfo.call_count)
+
+    def test_bypass(self):
+        self.lookup(2, cache=False)
+        self.assertEqual(2, self.m_getaddrinfo.call_count)
+        self.loop.set_resolver_cache(None)
+        self.lookup()
+        self.assertEqual(3, self.m_getaddrinfo.call_count)
+        self.assertNotIn('resolver_hits', self.loop.get_stats())
+        self.assertEqual(0, len(self.cache))
+
+    def test_create_connection_bypass(self):
+        self.loop.getaddrinfo = unittest.mock.Mock(
+            side_effect=OSError('no lookup'))
+        for kwargs in ({}, {'cache_addrinfo': False}):
+            coro = self.loop.create_connection(MyProto, 'example.com', 80,
+                                               **kwargs)
+            self.assertRaises(OSError, self.loop.run_until_complete, coro)
+        self.assertEqual(
+            [True, False],
+            [c[1]['cache'] for c in self.loop.getaddrinfo.call_args_list])
+
+        self.loop.getaddrinfo.reset_mock()
+        coro = self.loop.create_server(MyProto, 'example.com', 80,
+                                       cache_addrinfo=False)
+        self.assertRaises(OSError, self.loop.run_until_complete, coro)
+        self.assertFalse(self.loop.getaddrinfo.call_args[1]['cache'])
+
+    def test_lru(self):
+        cache = base_events.ResolverCache(maxsize=2)
+        for key in 'abc':
+            if key == 'c':
+                self.assertIsNotNone(cache.get('a', 0))
+            cache.put(key, 0, self.INFOS)
+        self.assertIsNone(cache.get('b', 0))
+        self.assertEqual((self.INFOS, None), cache.get('a', 0))
+        self.assertEqual(2, len(cache))
+        cache.clear()
+        self.assertEqual(0, len(cache))
@@ -743,6 +743,38 @@ class EventLoopTestsMixin:
             ConnectionRefusedError, client.connect, ('127.0.0.1', port))
         client.close()
 
+    def test_create_server_max_connections(self):
+        protos = []
+
+        def factory():
+            proto = MyProto()
+            protos.append(proto)
+            return proto
+
+        f = self.loop.create_server(factory, '127.0.0.1', 0,
+                                    max_connections=1)
+        server = self.loop.run_until_complete(f)
+        port = server.sockets[0].getsockname()[1]
+        clients = [socket.create_connection(('127.0.0.1', port))
+                   for i in range(2)]
+        test_utils.run_briefly(self.loop)
+        test_utils.run_briefly(self.loop)
+        # The second connection waits in the backlog.
+        self.assertEqual(1, len(protos))
+        self.assertTrue(server.get_stats()['paused'])
+
+        protos[0].transport.close()
+        test_utils.run_briefly(self.loop)
+        test_utils.run_briefly(self.loop)
+        self.assertEqual(2, len(protos))
+        self.assertEqual(2, server.get_stats()['pauses'])
+
+        protos[1].transport.close()
+        test_utils.run_briefly(self.loop)
+        for client in clients:
+            client.close()
+        server.close()
+
     def test_create_datagram_endpoint(self):
         class TestMyDatagramProto(MyDatagramProto):
             def __init__(inner_self):
@@ -1256,6 +1288,10 @@ if sys.platform == 'win32':
         def test_create_datagram_endpoint(self):
             raise unittest.SkipTest(
                 "IocpEventLoop does not have create_datagram_endpoint()")
+
+        def test_create_server_max_connections(self):
+            raise unittest.SkipTest(
+                "IocpEventLoop cannot pause accepting connections")
 else:
     from tulip import selectors
     from tulip import unix_events
@@ -1285,6 +1321,111 @@ else:
         def create_event_loop(self):
             return unix_events.SelectorEventLoop(selectors.SelectSelector())
 
+    class DeferredFdChangesEventLoopTests(EventLoopTestsMixin,
+                                          unittest.TestCase):
+
+        def create_event_loop(self):
+            loop = unix_events.SelectorEventLoop()
+            loop.set_defer_fd_changes(True)
+            return loop
+
+    if hasattr(selectors, 'EpollSelector'):
+        class EdgeTriggeredEventLoopTests(EventLoopTestsMixin,
+                                          unittest.TestCase):
+
+            def create_event_loop(self):
+                return unix_events.EdgeTriggeredEventLoop()
+
+            def test_partial_reads_and_writes(self):
+                # More data than fits in the socket buffers, read by a
+                # protocol that pauses the transport now and then.
+                data = b'x' * (4 * 1024 * 1024)
+                received = []
+
+                class Receiver(protocols.Protocol):
+                    def connection_made(self, transport):
+                        self.transport = transport
+                        self.chunks = 0
+
+                    def data_received(self, chunk):
+                        received.append(chunk)
+                        self.chunks += 1
+                        if self.chunks % 3 == 0:
+                            self.transport.pause()
+                            loop.call_later(0.001, self.transport.resume)
+
+                loop = self.loop
+                rsock, wsock = test_utils.socketpair()
+                rsock.setblocking(False)
+                wsock.setblocking(False)
+                rtr, rproto = loop.run_until_complete(
+                    loop.create_connection(Receiver, sock=rsock))
+                wtr, wproto = loop.run_until_complete(
+                    loop.create_connection(protocols.Protocol, sock=wsock))
+                wtr.write(data)
+                self.assertTrue(wtr._buffer)
+                deadline = time.monotonic() + 10
+                while sum(map(len, received)) < len(data):
+                    self.assertLess(time.monotonic(), deadline)
+                    test_utils.run_once(loop)
+                self.assertEqual(len(data), sum(map(len, received)))
+                self.assertFalse(wtr._buffer)
+                self.assertGreater(rproto.chunks, 3)
+                wtr.close()
+                rtr.close()
+                test_utils.run_briefly(loop)
+
+
+    try:
+        from tulip import uring_events
+        uring_events.UringProactor().close()
+    except (ImportError, OSError):
+        uring_events = None
+
+    if uring_events is not None:
+        class UringProactorEventLoopTests(EventLoopTestsMixin,
+                                          unittest.TestCase):
+
+            def create_event_loop(self):
+                return uring_events.ProactorEventLoop()
+
+            def test_create_ssl_connection(self):
+                raise unittest.SkipTest("Proactor incompatible with SSL")
+
+            def test_create_server_ssl(self):
+                raise unittest.SkipTest("Proactor incompatible with SSL")
+
+            def test_reader_callback(self):
+                raise unittest.SkipTest("Proactor does not have add_reader()")
+
+            def test_reader_callback_cancel(self):
+                raise unittest.SkipTest("Proactor does not have add_reader()")
+
+            def test_writer_callback(self):
+                raise unittest.SkipTest("Proactor does not have add_writer()")
+
+            def test_writer_callback_cancel(self):
+                raise unittest.SkipTest("Proactor does not have add_writer()")
+
+            def test_create_datagram_endpoint(self):
+                raise unittest.SkipTest(
+                    "Proactor does not have create_datagram_endpoint()")
+
+            def test_write_pipe_disconnect_on_close(self):
+                raise unittest.SkipTest(
+                    "Proactor only notices a closed pipe when writing")
+
+            def test_create_server_max_connections(self):
+                raise unittest.SkipTest(
+                    "Proactor cannot pause accepting connections")
+
+        # Signals and subprocesses need unix_events.SelectorEventLoop.
+        for name in dir(UringProactorEventLoopTests):
+            if name.startswith(('test_subprocess', 'test_signal',
+                                'test_add_signal')):
+                setattr(UringProactorEventLoopTests, name, unittest.skip(
+                    'Proactor does not support signals')(lambda self: None))
+
 
 class HandleTests(unittest.TestCase):
 
@@ -1360,6 +1501,14 @@ class TimerTests(unittest.TestCase):
         self.assertRaises(AssertionError,
                           events.TimerHandle, None, callback, args)
 
+    def test_timer_cancel_notifies_loop(self):
+        loop = unittest.mock.Mock()
+        h = events.TimerHandle(time.monotonic(), lambda: False, (), loop)
+        h.cancel()
+        loop._timer_handle_cancelled.assert_called_with(h)
+        h.cancel()
+        self.assertEqual(1, loop._timer_handle_cancelled.call_count)
+
     def test_timer_comparison(self):
         def callback(*args):
             return args
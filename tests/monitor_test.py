@@ -0,0 +1,148 @@
+"""Tests for monitor.py"""
+
+import unittest
+import unittest.mock
+
+from tulip import events
+from tulip import monitor
+from tulip import test_utils
+
+
+class LoopInstrumentTests(unittest.TestCase):
+
+    def test_ctor(self):
+        instrument = monitor.LoopInstrument()
+        self.assertIsNone(instrument.slow_callback_duration)
+        self.assertEqual(0, instrument.iterations)
+        instrument = monitor.LoopInstrument(slow_callback_duration=0.5)
+        self.assertEqual(0.5, instrument.slow_callback_duration)
+
+    @unittest.mock.patch('tulip.monitor.tulip_log')
+    def test_iteration(self, m_log):
+        instrument = monitor.LoopInstrument()
+        instrument.iteration(0.5, 0.25, 3, 1, 2)
+        instrument.iteration(0.5, 0.25, 7, 0, 4)
+        self.assertEqual(2, instrument.iterations)
+        self.assertEqual(1.0, instrument.poll_time)
+        self.assertEqual(0.5, instrument.callback_time)
+        self.assertEqual(7, instrument.max_ready)
+        self.assertEqual(1, instrument.timers_fired)
+        self.assertEqual(6, instrument.io_events)
+        self.assertFalse(m_log.info.called)
+
+        instrument.iteration(1.5, 0, 0, 0, 0)
+        self.assertTrue(m_log.info.called)
+
+    @unittest.mock.patch('tulip.monitor.tulip_log')
+    def test_slow_callback(self, m_log):
+        def cb():
+            pass
+
+        instrument = monitor.LoopInstrument(slow_callback_duration=0.1)
+        instrument.slow_callback(events.Handle(cb, ()), 0.2)
+        self.assertEqual(1, instrument.slow_callbacks)
+        self.assertIs(cb, m_log.warning.call_args[0][1])
+
+
+class LatencyHistogramTests(unittest.TestCase):
+
+    def test_bad_args(self):
+        self.assertRaises(ValueError, monitor.LatencyHistogram, resolution=0)
+        self.assertRaises(
+            ValueError, monitor.LatencyHistogram, significant_bits=1)
+        self.assertRaises(ValueError, monitor.LatencyHistogram().percentile,
+                          101)
+
+    def test_empty(self):
+        h = monitor.LatencyHistogram()
+        self.assertEqual(
+            {'count': 0, 'max': 0, 'mean': 0, 'p50': 0, 'p99': 0, 'p999': 0},
+            h.summary())
+
+    def test_buckets_are_contiguous(self):
+        h = monitor.LatencyHistogram(resolution=1, highest=10 ** 6,
+                                     significant_bits=3)
+        prev = -1
+        for value in range(10 ** 4):
+            index = h._index(value)
+            self.assertIn(index, (prev, prev + 1))
+            self.assertLessEqual(value, h._upper(index))
+            prev = index
+
+    def test_percentiles(self):
+        h = monitor.LatencyHistogram(resolution=0.001, highest=100)
+        for i in range(1, 1001):
+            h.record(i * 0.001)
+        self.assertEqual(1000, h.count)
+        self.assertAlmostEqual(1.0, h.max)
+        self.assertAlmostEqual(0.5005, h.total / h.count)
+        summary = h.summary()
+        # Within the relative precision of the buckets.
+        self.assertAlmostEqual(0.5, summary['p50'], delta=0.5 / 64)
+        self.assertAlmostEqual(0.99, summary['p99'], delta=0.99 / 64)
+        self.assertAlmostEqual(0.999, summary['p999'], delta=0.999 / 64)
+        self.assertGreaterEqual(summary['p50'], 0.5)
+        self.assertAlmostEqual(0.001, h.percentile(0))
+        self.assertAlmostEqual(1.0, h.percentile(100))
+
+    def test_clamp(self):
+        h = monitor.LatencyHistogram(resolution=0.001, highest=1)
+        h.record(-1)
+        h.record(50)
+        self.assertEqual(2, h.count)
+        self.assertEqual(1.0, h.max)
+        self.assertEqual(0, h.percentile(50))
+        self.assertEqual(1.0, h.percentile(100))
+        h.reset()
+        self.assertEqual(0, h.count)
+        self.assertEqual(0, h.percentile(100))
+
+
+class LagMonitorTests(unittest.TestCase):
+
+    def test_lag(self):
+        def gen():
+            when = yield
+            self.assertAlmostEqual(1.0, when)
+            when = yield 0
+            self.assertAlmostEqual(2.3, when)
+            when = yield 0
+            self.assertAlmostEqual(3.3, when)
+            yield 0
+
+        loop = test_utils.TestLoop(gen)
+        self.addCleanup(loop.close)
+
+        m = monitor.LagMonitor(loop, interval=1.0, threshold=0.25)
+        m.lag_detected = unittest.mock.Mock()
+        m.start()
+        self.assertRaises(AssertionError, m.start)
+        loop._run_once()
+        self.assertEqual(0, m.histogram.count)
+
+        loop.advance_time(1.3)
+        loop._run_once()
+        self.assertEqual(1, m.histogram.count)
+        self.assertAlmostEqual(0.3, m.histogram.max, places=5)
+        m.lag_detected.assert_called_once_with(unittest.mock.ANY)
+        self.assertAlmostEqual(0.3, m.lag_detected.call_args[0][0])
+
+        loop.advance_time(1.0)
+        loop._run_once()
+        self.assertEqual(2, m.histogram.count)
+        self.assertEqual(1, m.lag_detected.call_count)
+        self.assertAlmostEqual(0.0, m.histogram.percentile(50), places=5)
+
+        m.stop()
+        self.assertEqual([], [h for h in loop._scheduled if not h._cancelled])
+        m.stop()
+
+    @unittest.mock.patch('tulip.monitor.tulip_log')
+    def test_lag_detected(self, m_log):
+        m = monitor.LagMonitor(unittest.mock.Mock())
+        m.lag_detected(2.0)
+        self.assertTrue(m_log.warning.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
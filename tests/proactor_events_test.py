@@ -99,6 +99,73 @@ class ProactorSocketTransportTests(unittest.TestCase):
         self.assertFalse(tr._fatal_error.called)
         tr._force_close.assert_called_with(err)
 
+    def test_loop_reading_buffered(self):
+        protocol = test_utils.make_test_protocol(tulip.BufferedProtocol)
+        buf = bytearray(10)
+        protocol.get_buffer.return_value = buf
+        res = tulip.Future(loop=self.loop)
+        res.set_result(4)
+
+        tr = _ProactorSocketTransport(self.loop, self.sock, protocol)
+        tr._read_fut = res
+        protocol.buffer_updated.side_effect = (
+            lambda n: self.assertFalse(protocol.get_buffer.called))
+        tr._loop_reading(res)
+
+        protocol.buffer_updated.assert_called_with(4)
+        protocol.get_buffer.assert_called_with(tr.max_size)
+        sock, view = self.proactor.recv_into.call_args[0]
+        self.assertIs(self.sock, sock)
+        self.assertIs(buf, view.obj)
+        self.assertFalse(self.proactor.recv.called)
+
+    def test_loop_reading_buffered_paused(self):
+        protocol = test_utils.make_test_protocol(tulip.BufferedProtocol)
+        protocol.get_buffer.return_value = bytearray(10)
+        res = tulip.Future(loop=self.loop)
+        res.set_result(4)
+
+        tr = _ProactorSocketTransport(self.loop, self.sock, protocol)
+        tr._read_fut = res
+        protocol.buffer_updated.side_effect = lambda n: tr.pause()
+        tr._loop_reading(res)
+
+        self.assertFalse(self.proactor.recv_into.called)
+        tr.resume()
+        test_utils.run_briefly(self.loop)
+        self.assertTrue(self.proactor.recv_into.called)
+
+    def test_loop_reading_buffered_eof(self):
+        protocol = test_utils.make_test_protocol(tulip.BufferedProtocol)
+        res = tulip.Future(loop=self.loop)
+        res.set_result(0)
+
+        tr = _ProactorSocketTransport(self.loop, self.sock, protocol)
+        tr.close = unittest.mock.Mock()
+        tr._read_fut = res
+        tr._loop_reading(res)
+
+        self.assertFalse(protocol.buffer_updated.called)
+        self.assertFalse(self.proactor.recv_into.called)
+        protocol.eof_received.assert_called_with()
+        tr.close.assert_called_with()
+
+    def test_loop_reading_buffered_error(self):
+        protocol = test_utils.make_test_protocol(tulip.BufferedProtocol)
+        protocol.get_buffer.return_value = bytearray()
+        tr = _ProactorSocketTransport(self.loop, self.sock, protocol)
+        tr._fatal_error = unittest.mock.Mock()
+        tr._loop_reading()
+        self.assertIsInstance(tr._fatal_error.call_args[0][0], RuntimeError)
+        self.assertFalse(self.proactor.recv_into.called)
+
+        err = protocol.buffer_updated.side_effect = ValueError()
+        res = tulip.Future(loop=self.loop)
+        res.set_result(4)
+        tr._read_fut = res
+        tr._loop_reading(res)
+        tr._fatal_error.assert_called_with(err)
+
     def test_loop_reading_exception(self):
         err = self.loop._proactor.recv.side_effect = (OSError())
 
@@ -135,6 +202,41 @@ class ProactorSocketTransportTests(unittest.TestCase):
         self.loop._proactor.send.return_value.add_done_callback.\
             assert_called_with(tr._loop_writing)
 
+    def test_write_bytearray(self):
+        tr = _ProactorSocketTransport(self.loop, self.sock, self.protocol)
+        data = bytearray(b'data')
+        tr.write(data)
+        data[:] = b'xxxx'
+        self.loop._proactor.send.assert_called_with(self.sock, b'data')
+
+    def test_write_bytearray_no_copy(self):
+        tr = _ProactorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_write_copy(False)
+        data = bytearray(b'data')
+        tr.write(data)
+        self.assertIs(data, self.loop._proactor.send.call_args[0][1].obj)
+
+    def test_pause_resume_writing(self):
+        tr = _ProactorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_write_buffer_limits(high=4, low=2)
+        tr.write(b'da')
+        tr.write(b'ta')
+        self.assertEqual(4, tr.get_write_buffer_size())
+        self.assertFalse(self.protocol.pause_writing.called)
+        tr.write(b'!')
+        self.assertEqual(5, tr.get_write_buffer_size())
+        self.protocol.pause_writing.assert_called_with()
+
+        fut = tr._write_fut
+        tr._loop_writing(fut)
+        self.loop._proactor.send.assert_called_with(self.sock, b'ta!')
+        self.assertEqual(3, tr.get_write_buffer_size())
+        self.assertFalse(self.protocol.resume_writing.called)
+
+        tr._loop_writing(fut)
+        self.assertEqual(0, tr.get_write_buffer_size())
+        self.protocol.resume_writing.assert_called_with()
+
     @unittest.mock.patch('tulip.proactor_events.tulip_log')
     def test_loop_writing_err(self, m_log):
         err = self.loop._proactor.send.side_effect = OSError()
@@ -336,6 +438,22 @@ class ProactorSocketTransportTests(unittest.TestCase):
         self.protocol.data_received.assert_called_with(b'data4')
         tr.close()
 
+    def test_pause_resume_read_pending(self):
+        tr = _ProactorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        f = tulip.Future(loop=self.loop)
+        self.loop._proactor.recv.return_value = f
+        self.loop._run_once()
+        tr.pause()
+        tr.resume()
+        self.loop._run_once()
+        self.assertEqual(1, self.loop._proactor.recv.call_count)
+        f.set_result(b'data')
+        self.loop._run_once()
+        self.protocol.data_received.assert_called_with(b'data')
+        self.assertEqual(2, self.loop._proactor.recv.call_count)
+        tr.close()
+
 
 class BaseProactorEventLoopTests(unittest.TestCase):
 
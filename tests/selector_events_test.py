@@ -3,9 +3,13 @@
 import collections
 import errno
 import gc
+import io
 import pprint
 import socket
 import sys
+import tempfile
+import threading
+import time
 import unittest
 import unittest.mock
 try:
@@ -13,14 +17,20 @@ try:
 except ImportError:
     ssl = None
 
+import tulip
+from tulip import base_events
 from tulip import futures
+from tulip import selector_events
 from tulip import selectors
+from tulip import sslproto
+from tulip import tasks
 from tulip import test_utils
-from tulip.protocols import DatagramProtocol, Protocol
+from tulip.protocols import BufferedProtocol, DatagramProtocol, Protocol
 from tulip.selector_events import BaseSelectorEventLoop
+from tulip.selector_events import LoopGroup
 from tulip.selector_events import _SelectorTransport
-from tulip.selector_events import _SelectorSslTransport
 from tulip.selector_events import _SelectorSocketTransport
+from tulip.selector_events import _SelectorEdgeSocketTransport
 from tulip.selector_events import _SelectorDatagramTransport
 
 
@@ -43,14 +53,99 @@ class BaseSelectorEventLoopTests(unittest.TestCase):
         self.assertIsInstance(
             self.loop._make_socket_transport(m, m), _SelectorSocketTransport)
 
+    def test_flush_corked_transports(self):
+        self.loop._selector.select.return_value = []
+        tr = unittest.mock.Mock()
+        self.loop._flush_soon(tr)
+        self.loop.call_soon(self.loop._flush_soon, tr)
+        self.loop._run_once()
+        self.assertEqual(2, tr._flush_corked.call_count)
+        self.assertEqual([], self.loop._corked_transports)
+
+    def test_flush_corked_transports_on_stop(self):
+        rsock, wsock = test_utils.socketpair()
+        self.addCleanup(rsock.close)
+        loop = tulip.new_event_loop()
+        self.addCleanup(loop.close)
+        tr = _SelectorSocketTransport(loop, wsock, unittest.mock.Mock())
+        tr.set_cork(True)
+
+        # The write is held back in the iteration that stops the loop.
+        loop.call_soon(tr.write, b'hello')
+        loop.stop()
+        loop.run_forever()
+        self.assertEqual(0, tr.get_write_buffer_size())
+        rsock.settimeout(1.0)
+        self.assertEqual(b'hello', rsock.recv(100))
+        tr.close()
+        test_utils.run_briefly(loop)
+
+    @unittest.skipIf(ssl is None, 'No ssl module')
     def test_make_ssl_transport(self):
         m = unittest.mock.Mock()
+        sslcontext = unittest.mock.Mock(ssl.SSLContext)
         self.loop.add_reader = unittest.mock.Mock()
         self.loop.add_writer = unittest.mock.Mock()
-        self.loop.remove_reader = unittest.mock.Mock()
-        self.loop.remove_writer = unittest.mock.Mock()
-        self.assertIsInstance(
-            self.loop._make_ssl_transport(m, m, m, m), _SelectorSslTransport)
+        tr = self.loop._make_ssl_transport(m, m, sslcontext, None)
+        self.assertIsInstance(tr, sslproto._SSLProtocolTransport)
+        ssl_protocol = tr._ssl_protocol
+        self.assertTrue(self.loop.add_reader.called)
+        sslcontext.wrap_bio.assert_called_with(
+            ssl_protocol._incoming, ssl_protocol._outgoing,
+            server_side=False, server_hostname=None, session=None)
+
+        # The handshake starts when the socket transport is made.
+        ssl_protocol._sslobj.do_handshake.side_effect = ssl.SSLWantReadError
+        self.loop._selector.select.return_value = []
+        test_utils.run_briefly(self.loop)
+        self.assertTrue(ssl_protocol._sslobj.do_handshake.called)
+        # Nothing to send, so the socket is not watched for writing.
+        self.assertFalse(self.loop.add_writer.called)
+
+    @unittest.skipIf(ssl is None, 'No ssl module')
+    @unittest.mock.patch('tulip.sslproto._create_default_context')
+    def test_make_ssl_transport_default_context(self, m_context):
+        rawsock = unittest.mock.Mock()
+        rawsock.getpeername.return_value = ('1.2.3.4', 443)
+        self.loop.add_reader = unittest.mock.Mock()
+        tr1 = self.loop._make_ssl_transport(rawsock, Protocol(), None, None,
+                                            server_hostname='example.com')
+        tr2 = self.loop._make_ssl_transport(rawsock, Protocol(), None, None)
+        # The default context is made once per loop.
+        self.assertEqual(1, m_context.call_count)
+        self.assertIs(m_context.return_value,
+                      tr1.get_extra_info('sslcontext'))
+        self.assertIs(m_context.return_value,
+                      tr2.get_extra_info('sslcontext'))
+        self.assertEqual(
+            (m_context.return_value, ('1.2.3.4', 443), 'example.com'),
+            tr1._ssl_protocol._session_key)
+        self.assertIs(self.loop._ssl_session_cache,
+                      tr1._ssl_protocol._session_cache)
+
+    @unittest.skipIf(ssl is None, 'No ssl module')
+    def test_make_ssl_transport_session_cache(self):
+        rawsock = unittest.mock.Mock()
+        sslcontext = unittest.mock.Mock(ssl.SSLContext)
+        self.loop.add_reader = unittest.mock.Mock()
+        cache = sslproto.SSLSessionCache()
+        session = unittest.mock.Mock(time=time.time(), timeout=300)
+        cache.put((sslcontext, rawsock.getpeername(), None), session)
+        self.loop.set_ssl_session_cache(cache)
+        self.loop._make_ssl_transport(rawsock, Protocol(), sslcontext, None)
+        self.assertIs(session, sslcontext.wrap_bio.call_args[1]['session'])
+        self.assertEqual(1, self.loop.get_stats()['ssl_session_hits'])
+
+        # Server connections are not looked up.
+        self.loop._make_ssl_transport(rawsock, Protocol(), sslcontext, None,
+                                      server_side=True)
+        self.assertIsNone(sslcontext.wrap_bio.call_args[1]['session'])
+        self.assertEqual(1, cache.hits + cache.misses)
+
+        self.loop.set_ssl_session_cache(None)
+        self.loop._make_ssl_transport(rawsock, Protocol(), sslcontext, None)
+        self.assertIsNone(sslcontext.wrap_bio.call_args[1]['session'])
+        self.assertNotIn('ssl_session_hits', self.loop.get_stats())
 
     def test_close(self):
         ssock = self.loop._ssock
@@ -265,6 +360,76 @@ class BaseSelectorEventLoopTests(unittest.TestCase):
             (10, self.loop._sock_sendall, f, True, sock, b'data'),
             self.loop.add_writer.call_args[0])
 
+    @unittest.mock.patch('os.sendfile', create=True)
+    def test__sock_sendfile(self, m_sendfile):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = 10
+        m_sendfile.side_effect = [3, 2]
+
+        f = futures.Future(loop=self.loop)
+        self.loop.add_writer = unittest.mock.Mock()
+        self.loop._sock_sendfile(f, False, sock, 5, 100, 5, 0)
+        self.assertFalse(f.done())
+        self.assertEqual(
+            (10, self.loop._sock_sendfile, f, True, sock, 5, 100, 5, 3),
+            self.loop.add_writer.call_args[0])
+        m_sendfile.assert_called_with(10, 5, 100, 5)
+
+        self.loop.remove_writer = unittest.mock.Mock()
+        self.loop._sock_sendfile(f, True, sock, 5, 100, 5, 3)
+        self.loop.remove_writer.assert_called_with(10)
+        m_sendfile.assert_called_with(10, 5, 103, 2)
+        self.assertEqual(5, f.result())
+
+    @unittest.mock.patch('os.sendfile', create=True)
+    def test__sock_sendfile_tryagain(self, m_sendfile):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = 10
+        m_sendfile.side_effect = BlockingIOError
+
+        f = futures.Future(loop=self.loop)
+        self.loop.add_writer = unittest.mock.Mock()
+        self.loop._sock_sendfile(f, False, sock, 5, 0, 5, 0)
+        self.assertFalse(f.done())
+        self.assertEqual(
+            (10, self.loop._sock_sendfile, f, True, sock, 5, 0, 5, 0),
+            self.loop.add_writer.call_args[0])
+
+    @unittest.mock.patch('os.sendfile', create=True)
+    def test__sock_sendfile_truncated(self, m_sendfile):
+        sock = unittest.mock.Mock()
+        m_sendfile.return_value = 0
+
+        f = futures.Future(loop=self.loop)
+        self.loop._sock_sendfile(f, False, sock, 5, 0, 5, 2)
+        self.assertEqual(2, f.result())
+
+    @unittest.mock.patch('os.sendfile', create=True)
+    def test__sock_sendfile_unsupported(self, m_sendfile):
+        sock = unittest.mock.Mock()
+        m_sendfile.side_effect = OSError(errno.EINVAL, 'Invalid argument')
+
+        f = futures.Future(loop=self.loop)
+        self.loop._sock_sendfile(f, False, sock, 5, 0, 5, 0)
+        self.assertRaises(base_events._SendfileNotAvailable, f.result)
+
+        # Once data has been sent, the error is passed on.
+        f = futures.Future(loop=self.loop)
+        self.loop._sock_sendfile(f, False, sock, 5, 0, 5, 2)
+        self.assertRaises(OSError, f.result)
+        self.assertNotIsInstance(
+            f.exception(), base_events._SendfileNotAvailable)
+
+    @unittest.mock.patch('os.sendfile', create=True)
+    def test__sock_sendfile_canceled_fut(self, m_sendfile):
+        sock = unittest.mock.Mock()
+
+        f = futures.Future(loop=self.loop)
+        f.cancel()
+
+        self.loop._sock_sendfile(f, False, sock, 5, 0, 5, 0)
+        self.assertFalse(m_sendfile.called)
+
     def test_sock_connect(self):
         sock = unittest.mock.Mock()
         self.loop._sock_connect = unittest.mock.Mock()
@@ -275,6 +440,20 @@ class BaseSelectorEventLoopTests(unittest.TestCase):
             (f, False, sock, ('127.0.0.1', 8080)),
             self.loop._sock_connect.call_args[0])
 
+    def test_sock_connect_cancel(self):
+        sock = unittest.mock.Mock()
+        sock.fileno.return_value = 10
+        sock.connect.side_effect = BlockingIOError
+        self.loop.add_writer = unittest.mock.Mock()
+        self.loop.remove_writer = unittest.mock.Mock()
+
+        f = self.loop.sock_connect(sock, ('127.0.0.1', 8080))
+        self.assertTrue(self.loop.add_writer.called)
+        f.cancel()
+        self.loop._selector.select.return_value = []
+        test_utils.run_briefly(self.loop)
+        self.loop.remove_writer.assert_called_with(10)
+
     def test__sock_connect(self):
         f = futures.Future(loop=self.loop)
 
@@ -543,6 +722,32 @@ class BaseSelectorEventLoopTests(unittest.TestCase):
              selectors.EVENT_READ)])
         self.loop.remove_reader.assert_called_with(1)
 
+    def test_process_events_edge_readiness(self):
+        self.loop._add_callback = unittest.mock.Mock()
+        self.loop._add_edge_fd(1, unittest.mock.Mock(), unittest.mock.Mock())
+        self.assertTrue(self.loop._selector.register.called)
+        self.assertTrue(self.loop._fd_is_ready(1, selectors.EVENT_WRITE))
+        self.assertFalse(self.loop._fd_is_ready(1, selectors.EVENT_READ))
+
+        reader = unittest.mock.Mock()
+        reader._cancelled = False
+        self.loop._process_events(
+            [(selectors.SelectorKey(
+                1, 1, selectors.EVENT_READ, (reader, None)),
+              selectors.EVENT_READ)])
+        self.assertTrue(self.loop._fd_is_ready(1, selectors.EVENT_READ))
+        self.loop._clear_fd_ready(1, selectors.EVENT_READ)
+        self.assertFalse(self.loop._fd_is_ready(1, selectors.EVENT_READ))
+        self.assertTrue(self.loop._fd_is_ready(1, selectors.EVENT_WRITE))
+
+    def test_make_socket_transport_edge_triggered(self):
+        m = unittest.mock.Mock()
+        self.loop._edge_triggered = True
+        self.loop._add_edge_fd = unittest.mock.Mock()
+        self.assertIsInstance(
+            self.loop._make_socket_transport(m, m),
+            _SelectorEdgeSocketTransport)
+
     def test_process_events_write(self):
         writer = unittest.mock.Mock()
         writer._cancelled = False
@@ -566,6 +771,179 @@ class BaseSelectorEventLoopTests(unittest.TestCase):
         self.loop.remove_writer.assert_called_with(1)
 
 
+class CountingSelector(selectors.SelectSelector):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def register(self, fileobj, events, data=None):
+        self.calls.append(('register', events))
+        return super().register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        self.calls.append(('unregister',))
+        return super().unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        if events != self.get_key(fileobj).events:
+            self.calls.append(('modify', events))
+        return super().modify(fileobj, events, data)
+
+
+class DeferredFdChangesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.selector = CountingSelector()
+        self.loop = TestBaseSelectorEventLoop(self.selector)
+        self.loop.set_defer_fd_changes(True)
+        self.sock, self.peer = test_utils.socketpair()
+        self.fd = self.sock.fileno()
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def test_add_remove_no_syscall(self):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.assertTrue(self.loop.remove_reader(self.fd))
+        self.assertFalse(self.loop.remove_reader(self.fd))
+        self.loop._apply_fd_changes()
+        self.assertEqual([], self.selector.calls)
+        stats = self.loop.get_stats()
+        self.assertEqual(2, stats['fd_changes_requested'])
+        self.assertEqual(0, stats['fd_changes_applied'])
+        self.assertEqual(2, stats['fd_syscalls_saved'])
+
+    def test_net_change_applied(self):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.loop.add_writer(self.fd, lambda: True)
+        self.loop.remove_writer(self.fd)
+        self.loop.add_writer(self.fd, lambda: True)
+        self.assertEqual([], self.selector.calls)
+        self.loop._apply_fd_changes()
+        self.assertEqual(
+            [('register', selectors.EVENT_READ | selectors.EVENT_WRITE)],
+            self.selector.calls)
+        key = self.selector.get_key(self.fd)
+        reader, writer = key.data
+        self.assertFalse(reader._cancelled)
+        self.assertFalse(writer._cancelled)
+        self.assertEqual(1, self.loop.get_stats()['fd_changes_applied'])
+
+    def test_writer_toggle_on_registered_fd(self):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.loop._apply_fd_changes()
+        del self.selector.calls[:]
+
+        for i in range(3):
+            self.loop.add_writer(self.fd, lambda: True)
+            self.loop.remove_writer(self.fd)
+        self.loop._apply_fd_changes()
+        self.assertEqual([], self.selector.calls)
+        self.assertEqual(selectors.EVENT_READ,
+                         self.selector.get_key(self.fd).events)
+
+    def test_replace_reader(self):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.loop._apply_fd_changes()
+        old, _ = self.selector.get_key(self.fd).data
+        self.loop.add_reader(self.fd, lambda: False)
+        self.assertTrue(old._cancelled)
+        self.loop._apply_fd_changes()
+        new, _ = self.selector.get_key(self.fd).data
+        self.assertIsNot(old, new)
+        self.assertFalse(new._cancelled)
+
+    def test_last_removal_is_immediate(self):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.loop._apply_fd_changes()
+        self.assertTrue(self.loop.remove_reader(self.fd))
+        self.assertEqual(
+            [('register', selectors.EVENT_READ), ('unregister',)],
+            self.selector.calls)
+        self.assertRaises(KeyError, self.selector.get_key, self.fd)
+
+    def test_applied_before_poll(self):
+        self.loop._process_events = unittest.mock.Mock()
+        self.loop.add_reader(self.fd, lambda: True)
+        self.peer.send(b'x')
+        self.loop._run_once()
+        self.assertEqual([('register', selectors.EVENT_READ)],
+                         self.selector.calls)
+        event_list = self.loop._process_events.call_args[0][0]
+        self.assertEqual(1, len(event_list))
+
+    @unittest.mock.patch('tulip.selector_events.tulip_log')
+    def test_apply_error(self, m_log):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.selector.register = unittest.mock.Mock(side_effect=OSError)
+        self.loop._apply_fd_changes()
+        self.assertTrue(m_log.exception.called)
+
+    def test_disable_flushes(self):
+        self.loop.add_reader(self.fd, lambda: True)
+        self.loop.set_defer_fd_changes(False)
+        self.assertIsNone(self.loop._fd_changes)
+        self.assertEqual([('register', selectors.EVENT_READ)],
+                         self.selector.calls)
+        self.assertTrue(self.loop.remove_reader(self.fd))
+        self.assertEqual(('unregister',), self.selector.calls[-1])
+
+
+class RawEventsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = TestBaseSelectorEventLoop(selectors.SelectSelector())
+        self.sock, self.peer = test_utils.socketpair()
+        self.fd = self.sock.fileno()
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+        self.loop._selector.close()
+
+    def test_uses_select_raw(self):
+        self.assertTrue(self.loop._raw_events)
+        self.loop._selector.select_raw = unittest.mock.Mock(return_value=[])
+        self.loop._selector.select = unittest.mock.Mock()
+        self.assertEqual([], self.loop._poll_events(0))
+        self.loop._selector.select_raw.assert_called_with(0)
+        self.assertFalse(self.loop._selector.select.called)
+
+    def test_process_events(self):
+        reader = unittest.mock.Mock()
+        writer = unittest.mock.Mock()
+        self.loop.add_reader(self.fd, reader)
+        self.loop.add_writer(self.fd, writer)
+        self.loop._process_events(
+            [(self.fd, selectors.EVENT_READ | selectors.EVENT_WRITE),
+             (self.peer.fileno(), selectors.EVENT_READ)])
+        self.assertEqual([reader, writer],
+                         [h._callback for h in self.loop._ready])
+
+    def test_process_events_only_registered(self):
+        reader = unittest.mock.Mock()
+        self.loop.add_reader(self.fd, reader)
+        self.loop._process_events([(self.fd, selectors.EVENT_WRITE)])
+        self.assertFalse(self.loop._ready)
+
+    def test_process_events_cancelled(self):
+        self.loop.add_reader(self.fd, unittest.mock.Mock())
+        key = self.loop._selector.get_key(self.fd)
+        key.data[0].cancel()
+        self.loop._process_events([(self.fd, selectors.EVENT_READ)])
+        self.assertFalse(self.loop._ready)
+        self.assertRaises(KeyError, self.loop._selector.get_key, self.fd)
+
+    def test_run_once(self):
+        reader = unittest.mock.Mock()
+        self.loop.add_reader(self.fd, reader)
+        self.peer.send(b'x')
+        self.loop._run_once()
+        reader.assert_called_with()
+
+
 class SelectorTransportTests(unittest.TestCase):
 
     def setUp(self):
@@ -697,6 +1075,88 @@ class SelectorSocketTransportTests(unittest.TestCase):
 
         self.protocol.data_received.assert_called_with(b'data')
 
+    def test_read_ready_adapts_recv_size(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.max_size = 16384
+        self.assertEqual(4096, transport.get_extra_info('recv_size'))
+
+        def recv(size):
+            sizes.append(size)
+            return b'x' * min(size, nbytes)
+        self.sock.recv.side_effect = recv
+
+        # Reads that fill the buffer grow it up to max_size.
+        sizes = []
+        nbytes = 100000
+        for i in range(4):
+            transport._read_ready()
+        self.assertEqual([4096, 8192, 16384, 16384], sizes)
+        self.assertEqual(16384, transport.get_extra_info('recv_size'))
+
+        # It shrinks after two small reads in a row, down to min_size.
+        sizes = []
+        nbytes = 100
+        for i in range(6):
+            transport._read_ready()
+        self.assertEqual([16384, 16384, 8192, 8192, 4096, 4096], sizes)
+        self.assertEqual(4096, transport.get_extra_info('recv_size'))
+
+    def test_read_ready_budget(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.read_budget = 3
+        self.sock.recv.side_effect = lambda size: b'x' * size
+        transport._read_ready()
+        self.assertEqual(3, self.sock.recv.call_count)
+        self.assertEqual(3, self.protocol.data_received.call_count)
+
+    def test_read_ready_budget_until_blocked(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.read_budget = 3
+        self.sock.recv.side_effect = [b'x' * 4096, BlockingIOError]
+        transport._read_ready()
+        self.assertEqual(2, self.sock.recv.call_count)
+        self.protocol.data_received.assert_called_once_with(b'x' * 4096)
+
+    def test_read_ready_budget_short_read(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.read_budget = 3
+        self.sock.recv.return_value = b'data'
+        transport._read_ready()
+        self.assertEqual(1, self.sock.recv.call_count)
+
+    def test_read_ready_byte_budget(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.max_size = transport.min_size
+        transport.read_budget = 10
+        transport.read_byte_budget = 8192
+        self.sock.recv.side_effect = lambda size: b'x' * size
+        transport._read_ready()
+        self.assertEqual(2, self.sock.recv.call_count)
+
+    def test_read_ready_budget_paused(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.read_budget = 3
+        self.sock.recv.side_effect = lambda size: b'x' * size
+        self.protocol.data_received.side_effect = (
+            lambda data: transport.pause())
+        transport._read_ready()
+        self.assertEqual(1, self.sock.recv.call_count)
+
+    def test_read_ready_recv_size_no_shrink_on_mixed_reads(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport._recv_size = 8192
+        for nbytes in [100, 5000, 100, 5000, 100]:
+            self.sock.recv.return_value = b'x' * nbytes
+            transport._read_ready()
+        self.sock.recv.assert_called_with(8192)
+
     def test_read_ready_eof(self):
         transport = _SelectorSocketTransport(
             self.loop, self.sock, self.protocol)
@@ -763,6 +1223,45 @@ class SelectorSocketTransportTests(unittest.TestCase):
 
         transport._fatal_error.assert_called_with(err)
 
+    def test_read_ready_buffered(self):
+        protocol = test_utils.make_test_protocol(BufferedProtocol)
+        buf = bytearray(10)
+        protocol.get_buffer.return_value = buf
+        transport = _SelectorSocketTransport(self.loop, self.sock, protocol)
+
+        self.sock.recv_into.return_value = 4
+        transport._read_ready()
+
+        protocol.get_buffer.assert_called_with(transport.min_size)
+        self.assertEqual(buf, self.sock.recv_into.call_args[0][0])
+        protocol.buffer_updated.assert_called_with(4)
+        self.assertFalse(self.sock.recv.called)
+
+    def test_read_ready_buffered_eof(self):
+        protocol = test_utils.make_test_protocol(BufferedProtocol)
+        protocol.get_buffer.return_value = bytearray(10)
+        transport = _SelectorSocketTransport(self.loop, self.sock, protocol)
+        transport.close = unittest.mock.Mock()
+
+        self.sock.recv_into.return_value = 0
+        transport._read_ready()
+
+        self.assertFalse(protocol.buffer_updated.called)
+        protocol.eof_received.assert_called_with()
+        transport.close.assert_called_with()
+
+    def test_read_ready_buffered_empty_buffer(self):
+        protocol = test_utils.make_test_protocol(BufferedProtocol)
+        protocol.get_buffer.return_value = bytearray()
+        transport = _SelectorSocketTransport(self.loop, self.sock, protocol)
+        transport._fatal_error = unittest.mock.Mock()
+
+        transport._read_ready()
+
+        self.assertFalse(self.sock.recv_into.called)
+        self.assertIsInstance(transport._fatal_error.call_args[0][0],
+                              RuntimeError)
+
     def test_write(self):
         data = b'data'
         self.sock.send.return_value = len(data)
@@ -915,8 +1414,79 @@ class SelectorSocketTransportTests(unittest.TestCase):
         self.loop.assert_writer(7, transport._write_ready)
         self.assertEqual(collections.deque([b'data']), transport._buffer)
 
+    def test_write_bytearray(self):
+        data = bytearray(b'data')
+        self.sock.send.return_value = 4
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.write(data)
+        sent = self.sock.send.call_args[0][0]
+        self.assertIsInstance(sent, memoryview)
+        self.assertIs(data, sent.obj)
+        self.assertFalse(transport._buffer)
+
+    def test_write_bytearray_partial_copies(self):
+        data = bytearray(b'data')
+        self.sock.send.return_value = 2
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.write(data)
+        data[:] = b'xxxx'
+        self.assertEqual(collections.deque([b'ta']), transport._buffer)
+        self.assertEqual(2, transport.get_write_buffer_size())
+
+    def test_write_memoryview_no_copy(self):
+        data = bytearray(b'data')
+        self.sock.send.return_value = 0
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.set_write_copy(False)
+        transport.write(memoryview(data)[1:])
+        self.assertIs(data, transport._buffer[0].obj)
+        self.assertEqual(3, transport.get_write_buffer_size())
+
+    def test_write_pause_resume_writing(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.set_write_buffer_limits(high=4, low=2)
+
+        self.sock.send.return_value = 0
+        transport.write(b'data')
+        self.assertEqual(4, transport.get_write_buffer_size())
+        self.assertFalse(self.protocol.pause_writing.called)
+        transport.write(b'x')
+        self.protocol.pause_writing.assert_called_with()
+
+        self.sock.sendmsg.return_value = 2
+        transport._write_ready()
+        self.assertEqual(3, transport.get_write_buffer_size())
+        self.assertFalse(self.protocol.resume_writing.called)
+
+        self.sock.sendmsg.return_value = 1
+        transport._write_ready()
+        self.assertEqual(2, transport.get_write_buffer_size())
+        self.protocol.resume_writing.assert_called_with()
+        self.loop.assert_writer(7, transport._write_ready)
+
+    def test_write_ready_resume_writing_writes(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport.set_write_buffer_limits(high=0)
+        self.protocol.resume_writing.side_effect = (
+            lambda: transport.write(b'more'))
+
+        self.sock.send.return_value = 0
+        transport.write(b'data')
+        self.protocol.pause_writing.assert_called_with()
+
+        self.sock.send.side_effect = [4, 2]
+        transport._write_ready()
+        self.sock.send.assert_called_with(b'more')
+        self.assertEqual(collections.deque([b're']), transport._buffer)
+        self.loop.assert_writer(7, transport._write_ready)
+
     def test_write_ready_tryagain(self):
-        self.sock.send.side_effect = BlockingIOError
+        self.sock.sendmsg.side_effect = BlockingIOError
 
         transport = _SelectorSocketTransport(
             self.loop, self.sock, self.protocol)
@@ -925,7 +1495,64 @@ class SelectorSocketTransportTests(unittest.TestCase):
         transport._write_ready()
 
         self.loop.assert_writer(7, transport._write_ready)
-        self.assertEqual(collections.deque([b'data1data2']), transport._buffer)
+        self.assertEqual(collections.deque([b'data1', b'data2']),
+                         transport._buffer)
+
+    def test_write_ready_sendmsg(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport._buffer = collections.deque([b'data1', b'data2', b'3'])
+        self.loop.add_writer(7, transport._write_ready)
+        self.sock.sendmsg.return_value = 7
+        transport._write_ready()
+
+        self.assertEqual([b'data1', b'data2', b'3'],
+                         list(self.sock.sendmsg.call_args[0][0]))
+        self.assertFalse(self.sock.send.called)
+        self.loop.assert_writer(7, transport._write_ready)
+        self.assertEqual(collections.deque([b'ta2', b'3']), transport._buffer)
+        self.assertIsInstance(transport._buffer[0], memoryview)
+
+        self.sock.send.return_value = 1
+        self.sock.sendmsg.return_value = 3
+        transport._write_ready()
+        self.assertEqual(collections.deque([b'3']), transport._buffer)
+        transport._write_ready()
+        self.sock.send.assert_called_with(b'3')
+        self.assertFalse(transport._buffer)
+        self.assertFalse(self.loop.writers)
+
+    def test_writelines(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        self.sock.sendmsg.return_value = 5
+        transport.writelines([b'data', b'', b'more'])
+
+        self.assertEqual([b'data', b'more'],
+                         list(self.sock.sendmsg.call_args[0][0]))
+        self.assertEqual(collections.deque([b'ore']), transport._buffer)
+        self.loop.assert_writer(7, transport._write_ready)
+
+        transport.writelines([b'again'])
+        self.assertEqual(1, self.sock.sendmsg.call_count)
+        self.assertEqual(collections.deque([b'ore', b'again']),
+                         transport._buffer)
+
+    def test_writelines_all_sent(self):
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        self.sock.sendmsg.return_value = 8
+        transport.writelines([b'data', b'more'])
+        self.assertFalse(transport._buffer)
+        self.assertFalse(self.loop.writers)
+
+    def test_writelines_exception(self):
+        err = self.sock.sendmsg.side_effect = ConnectionResetError()
+        transport = _SelectorSocketTransport(
+            self.loop, self.sock, self.protocol)
+        transport._force_close = unittest.mock.Mock()
+        transport.writelines([b'data', b'more'])
+        transport._force_close.assert_called_with(err)
 
     def test_write_ready_exception(self):
         err = self.sock.send.side_effect = OSError()
@@ -949,6 +1576,123 @@ class SelectorSocketTransportTests(unittest.TestCase):
         transport._write_ready()
         remove_writer.assert_called_with(self.sock_fd)
 
+    def test_cork(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True)
+        tr.write(b'head')
+        tr.write(b'body')
+        tr.writelines([b'trai', b'ler'])
+        self.assertFalse(self.sock.send.called)
+        self.assertFalse(self.sock.sendmsg.called)
+        self.assertEqual(15, tr.get_write_buffer_size())
+        self.loop._flush_soon.assert_called_once_with(tr)
+
+        self.sock.sendmsg.return_value = 15
+        tr._flush_corked()
+        self.sock.sendmsg.assert_called_once_with(
+            [b'head', b'body', b'trai', b'ler'])
+        self.assertFalse(tr._buffer)
+        self.assertFalse(self.loop.writers)
+
+        # Flushing again does nothing.
+        tr._flush_corked()
+        self.assertEqual(1, self.sock.sendmsg.call_count)
+
+    def test_cork_partial(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True)
+        tr.write(b'data')
+        self.sock.send.return_value = 2
+        tr.flush()
+        self.sock.send.assert_called_with(b'data')
+        self.assertEqual([b'ta'], list(tr._buffer))
+        self.loop.assert_writer(7, tr._write_ready)
+
+        # While data is waiting for the writer, write() only buffers.
+        tr.write(b'more')
+        self.assertEqual(1, self.loop._flush_soon.call_count)
+        self.assertEqual(1, self.sock.send.call_count)
+
+    def test_cork_close(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True)
+        tr.write(b'data')
+        tr.close()
+        test_utils.run_briefly(self.loop)
+        self.assertFalse(self.protocol.connection_lost.called)
+
+        self.sock.send.return_value = 4
+        tr._flush_corked()
+        self.protocol.connection_lost.assert_called_with(None)
+
+    def test_cork_abort(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True)
+        tr.write(b'data')
+        tr.abort()
+        self.assertEqual(0, tr.get_write_buffer_size())
+        tr._flush_corked()
+        self.assertFalse(self.sock.send.called)
+
+    def test_flush_after_close(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True, tcp_cork=True)
+        tr.write(b'data')
+        tr.abort()
+        self.sock.setsockopt.reset_mock()
+        tr.flush()
+        test_utils.run_briefly(self.loop)
+        tr.flush()
+        self.assertFalse(self.sock.send.called)
+        self.assertFalse(self.sock.setsockopt.called)
+
+    def test_flush_tcp_cork_error(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True, tcp_cork=True)
+        self.sock.setsockopt.reset_mock()
+        self.sock.setsockopt.side_effect = OSError
+        tr.flush()
+        self.assertEqual(1, self.sock.setsockopt.call_count)
+
+    def test_cork_off_flushes(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True)
+        tr.write(b'data')
+        self.sock.send.return_value = 4
+        tr.set_cork(False)
+        self.sock.send.assert_called_with(b'data')
+        tr.write(b'more')
+        self.sock.send.assert_called_with(b'more')
+
+    def test_set_cork_sockopts(self):
+        self.loop._flush_soon = unittest.mock.Mock()
+        tr = _SelectorSocketTransport(self.loop, self.sock, self.protocol)
+        tr.set_cork(True, tcp_nodelay=True, tcp_cork=True)
+        self.assertEqual(
+            [unittest.mock.call(socket.IPPROTO_TCP, socket.TCP_NODELAY, True),
+             unittest.mock.call(socket.IPPROTO_TCP, socket.TCP_CORK, True)],
+            self.sock.setsockopt.call_args_list)
+
+        # flush() pushes out what the kernel holds back.
+        self.sock.setsockopt.reset_mock()
+        tr.flush()
+        self.assertEqual(
+            [unittest.mock.call(socket.IPPROTO_TCP, socket.TCP_CORK, 0),
+             unittest.mock.call(socket.IPPROTO_TCP, socket.TCP_CORK, 1)],
+            self.sock.setsockopt.call_args_list)
+
+        self.sock.setsockopt.reset_mock()
+        tr.set_cork(False)
+        self.sock.setsockopt.assert_called_once_with(
+            socket.IPPROTO_TCP, socket.TCP_CORK, False)
+
     def test_write_eof(self):
         tr = _SelectorSocketTransport(
             self.loop, self.sock, self.protocol)
@@ -976,274 +1720,174 @@ class SelectorSocketTransportTests(unittest.TestCase):
 
 
 @unittest.skipIf(ssl is None, 'No ssl module')
-class SelectorSslTransportTests(unittest.TestCase):
+class SelectorEdgeSocketTransportTests(unittest.TestCase):
 
     def setUp(self):
         self.loop = test_utils.TestLoop()
+        self.loop._add_edge_fd = unittest.mock.Mock()
+        self.loop._remove_edge_fd = unittest.mock.Mock()
+        self.loop._clear_fd_ready = unittest.mock.Mock()
+        self.loop._fd_is_ready = unittest.mock.Mock(return_value=True)
         self.protocol = test_utils.make_test_protocol(Protocol)
         self.sock = unittest.mock.Mock(socket.socket)
-        self.sock.fileno.return_value = 7
-        self.sslsock = unittest.mock.Mock()
-        self.sslsock.fileno.return_value = 1
-        self.sslcontext = unittest.mock.Mock()
-        self.sslcontext.wrap_socket.return_value = self.sslsock
-
-    def _make_one(self, create_waiter=None):
-        transport = _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext)
-        self.sock.reset_mock()
-        self.sslsock.reset_mock()
-        self.sslcontext.reset_mock()
-        self.loop.reset_counters()
-        return transport
-
-    def test_on_handshake(self):
-        waiter = futures.Future(loop=self.loop)
-        tr = _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext,
-            waiter=waiter)
-        self.assertTrue(self.sslsock.do_handshake.called)
-        self.loop.assert_reader(1, tr._on_ready)
-        self.loop.assert_writer(1, tr._on_ready)
-        test_utils.run_briefly(self.loop)
-        self.assertIsNone(waiter.result())
-
-    def test_on_handshake_reader_retry(self):
-        self.sslsock.do_handshake.side_effect = ssl.SSLWantReadError
-        transport = _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext)
-        transport._on_handshake()
-        self.loop.assert_reader(1, transport._on_handshake)
-
-    def test_on_handshake_writer_retry(self):
-        self.sslsock.do_handshake.side_effect = ssl.SSLWantWriteError
-        transport = _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext)
-        transport._on_handshake()
-        self.loop.assert_writer(1, transport._on_handshake)
-
-    def test_on_handshake_exc(self):
-        exc = ValueError()
-        self.sslsock.do_handshake.side_effect = exc
-        transport = _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext)
-        transport._waiter = futures.Future(loop=self.loop)
-        transport._on_handshake()
-        self.assertTrue(self.sslsock.close.called)
-        self.assertTrue(transport._waiter.done())
-        self.assertIs(exc, transport._waiter.exception())
-
-    def test_on_handshake_base_exc(self):
-        transport = _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext)
-        transport._waiter = futures.Future(loop=self.loop)
-        exc = BaseException()
-        self.sslsock.do_handshake.side_effect = exc
-        self.assertRaises(BaseException, transport._on_handshake)
-        self.assertTrue(self.sslsock.close.called)
-        self.assertTrue(transport._waiter.done())
-        self.assertIs(exc, transport._waiter.exception())
-
-    def test_pause_resume(self):
-        tr = self._make_one()
-        self.assertFalse(tr._paused)
-        self.loop.assert_reader(1, tr._on_ready)
-        tr.pause()
-        self.assertTrue(tr._paused)
-        self.assertFalse(1 in self.loop.readers)
-        tr.resume()
-        self.assertFalse(tr._paused)
-        self.loop.assert_reader(1, tr._on_ready)
-
-    def test_write_no_data(self):
-        transport = self._make_one()
-        transport._buffer.append(b'data')
-        transport.write(b'')
-        self.assertEqual(collections.deque([b'data']), transport._buffer)
-
-    def test_write_str(self):
-        transport = self._make_one()
-        self.assertRaises(AssertionError, transport.write, 'str')
-
-    def test_write_closing(self):
-        transport = self._make_one()
-        transport.close()
-        self.assertEqual(transport._conn_lost, 1)
-        transport.write(b'data')
-        self.assertEqual(transport._conn_lost, 2)
+        self.sock_fd = self.sock.fileno.return_value = 7
+        self.transport = _SelectorEdgeSocketTransport(
+            self.loop, self.sock, self.protocol)
 
-    @unittest.mock.patch('tulip.selector_events.tulip_log')
-    def test_write_exception(self, m_log):
-        transport = self._make_one()
-        transport._conn_lost = 1
-        transport.write(b'data')
-        self.assertEqual(transport._buffer, collections.deque())
-        transport.write(b'data')
-        transport.write(b'data')
-        transport.write(b'data')
-        transport.write(b'data')
-        m_log.warning.assert_called_with('socket.send() raised exception.')
+    def test_ctor(self):
+        tr = self.transport
+        self.loop._add_edge_fd.assert_called_with(
+            7, tr._read_ready, tr._write_ready)
+        test_utils.run_briefly(self.loop)
+        self.protocol.connection_made.assert_called_with(tr)
 
-    def test_on_ready_recv(self):
-        self.sslsock.recv.return_value = b'data'
-        transport = self._make_one()
-        transport._on_ready()
-        self.assertTrue(self.sslsock.recv.called)
-        self.assertEqual((b'data',), self.protocol.data_received.call_args[0])
+    def test_pause_resume_no_syscalls(self):
+        self.transport.pause()
+        self.transport._read_ready()
+        self.assertFalse(self.sock.recv.called)
+        self.loop._fd_is_ready.return_value = False
+        self.transport.resume()
+        test_utils.run_briefly(self.loop)
+        self.assertFalse(self.sock.recv.called)
 
-    def test_on_ready_recv_eof(self):
-        self.sslsock.recv.return_value = b''
-        transport = self._make_one()
-        transport.close = unittest.mock.Mock()
-        transport._on_ready()
-        transport.close.assert_called_with()
-        self.protocol.eof_received.assert_called_with()
+    def test_resume_reads_pending_data(self):
+        self.transport.pause()
+        self.sock.recv.side_effect = [b'data', BlockingIOError]
+        self.transport.resume()
+        self.loop._fd_is_ready.assert_called_with(7, selectors.EVENT_READ)
+        test_utils.run_briefly(self.loop)
+        self.protocol.data_received.assert_called_with(b'data')
 
-    def test_on_ready_recv_conn_reset(self):
-        err = self.sslsock.recv.side_effect = ConnectionResetError()
-        transport = self._make_one()
-        transport._force_close = unittest.mock.Mock()
-        transport._on_ready()
-        transport._force_close.assert_called_with(err)
+    def test_read_ready_drains(self):
+        self.sock.recv.side_effect = [b'ab', InterruptedError, b'cd',
+                                      BlockingIOError]
+        self.transport._read_ready()
+        self.assertEqual(
+            [unittest.mock.call(b'ab'), unittest.mock.call(b'cd')],
+            self.protocol.data_received.call_args_list)
+        self.loop._clear_fd_ready.assert_called_with(
+            7, selectors.EVENT_READ)
+
+    def test_read_ready_budget(self):
+        self.transport.read_budget = 3
+        self.sock.recv.return_value = b'x'
+        self.transport._read_ready()
+        self.assertEqual(3, self.sock.recv.call_count)
+        self.assertFalse(self.loop._clear_fd_ready.called)
+        # The rest is read in a later callback.
+        self.sock.recv.side_effect = [b'y', BlockingIOError]
+        test_utils.run_briefly(self.loop)
+        self.protocol.data_received.assert_called_with(b'y')
+        self.loop._clear_fd_ready.assert_called_with(
+            7, selectors.EVENT_READ)
 
-    def test_on_ready_recv_retry(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        transport = self._make_one()
-        transport._on_ready()
-        self.assertTrue(self.sslsock.recv.called)
-        self.assertFalse(self.protocol.data_received.called)
+    def test_read_ready_stops_when_paused(self):
+        self.sock.recv.return_value = b'x'
+        self.protocol.data_received.side_effect = (
+            lambda data: self.transport.pause())
+        self.transport._read_ready()
+        self.assertEqual(1, self.sock.recv.call_count)
 
-        self.sslsock.recv.side_effect = ssl.SSLWantWriteError
-        transport._on_ready()
-        self.assertFalse(self.protocol.data_received.called)
+    def test_read_ready_eof(self):
+        self.sock.recv.return_value = b''
+        self.protocol.eof_received.return_value = True
+        self.transport._read_ready()
+        self.transport._read_ready()
+        self.protocol.eof_received.assert_called_once_with()
+
+    def test_read_ready_conn_reset(self):
+        self.sock.recv.side_effect = ConnectionResetError()
+        self.transport._force_close = unittest.mock.Mock()
+        self.transport._read_ready()
+        self.assertTrue(self.transport._force_close.called)
+
+    def test_read_ready_byte_budget(self):
+        self.transport.read_byte_budget = 5
+        self.sock.recv.return_value = b'abc'
+        self.transport._read_ready()
+        self.assertEqual(2, self.sock.recv.call_count)
+        self.assertFalse(self.loop._clear_fd_ready.called)
+        self.sock.recv.side_effect = [b'y', BlockingIOError]
+        test_utils.run_briefly(self.loop)
+        self.protocol.data_received.assert_called_with(b'y')
+
+    def test_read_ready_buffered(self):
+        protocol = test_utils.make_test_protocol(BufferedProtocol)
+        protocol.get_buffer.return_value = bytearray(10)
+        transport = _SelectorEdgeSocketTransport(
+            self.loop, self.sock, protocol)
+        self.sock.recv_into.side_effect = [2, 3, BlockingIOError]
+        transport._read_ready()
+        self.assertEqual(
+            [unittest.mock.call(2), unittest.mock.call(3)],
+            protocol.buffer_updated.call_args_list)
+        self.assertEqual(3, protocol.get_buffer.call_count)
+        self.assertFalse(self.sock.recv.called)
+
+    def test_write_not_writable(self):
+        self.loop._fd_is_ready.return_value = False
+        self.transport.write(b'data')
+        self.assertFalse(self.sock.send.called)
+        self.assertEqual(collections.deque([b'data']),
+                         self.transport._buffer)
 
-        self.sslsock.recv.side_effect = BlockingIOError
-        transport._on_ready()
-        self.assertFalse(self.protocol.data_received.called)
+    def test_write_tryagain(self):
+        self.sock.send.side_effect = BlockingIOError
+        self.transport.write(b'data')
+        self.loop._clear_fd_ready.assert_called_with(
+            7, selectors.EVENT_WRITE)
+        self.assertEqual(collections.deque([b'data']),
+                         self.transport._buffer)
 
-        self.sslsock.recv.side_effect = InterruptedError
-        transport._on_ready()
-        self.assertFalse(self.protocol.data_received.called)
+    def test_write_partial(self):
+        self.sock.send.side_effect = [2, BlockingIOError]
+        self.transport.write(b'data')
+        self.assertEqual(collections.deque([b'ta']), self.transport._buffer)
+        # Keeps sending until EAGAIN.
+        test_utils.run_briefly(self.loop)
+        self.assertEqual(2, self.sock.send.call_count)
+        self.loop._clear_fd_ready.assert_called_with(
+            7, selectors.EVENT_WRITE)
+        self.assertEqual(collections.deque([b'ta']), self.transport._buffer)
+
+    def test_write_ready_drains(self):
+        self.transport._buffer.extend([b'ab', b'cd'])
+        self.sock.sendmsg.side_effect = [1, 2]
+        self.sock.send.side_effect = [1]
+        self.transport._write_ready()
+        self.assertEqual(2, self.sock.sendmsg.call_count)
+        self.sock.send.assert_called_with(b'd')
+        self.assertFalse(self.transport._buffer)
+
+    def test_write_ready_budget(self):
+        self.transport.write_budget = 2
+        self.transport._buffer.append(b'data')
+        self.sock.send.return_value = 1
+        self.transport._write_ready()
+        self.assertEqual(collections.deque([b'ta']), self.transport._buffer)
+        self.sock.send.side_effect = [2]
+        test_utils.run_briefly(self.loop)
+        self.assertFalse(self.transport._buffer)
 
-    def test_on_ready_recv_exc(self):
-        err = self.sslsock.recv.side_effect = OSError()
-        transport = self._make_one()
-        transport._fatal_error = unittest.mock.Mock()
-        transport._on_ready()
-        transport._fatal_error.assert_called_with(err)
+    def test_write_ready_nothing_to_write(self):
+        self.transport._write_ready()
+        self.assertFalse(self.sock.send.called)
 
-    def test_on_ready_send(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        self.sslsock.send.return_value = 4
-        transport = self._make_one()
-        transport._buffer = collections.deque([b'data'])
-        transport._on_ready()
-        self.assertEqual(collections.deque(), transport._buffer)
-        self.assertTrue(self.sslsock.send.called)
-
-    def test_on_ready_send_none(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        self.sslsock.send.return_value = 0
-        transport = self._make_one()
-        transport._buffer = collections.deque([b'data1', b'data2'])
-        transport._on_ready()
-        self.assertTrue(self.sslsock.send.called)
-        self.assertEqual(collections.deque([b'data1data2']), transport._buffer)
-
-    def test_on_ready_send_partial(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        self.sslsock.send.return_value = 2
-        transport = self._make_one()
-        transport._buffer = collections.deque([b'data1', b'data2'])
-        transport._on_ready()
-        self.assertTrue(self.sslsock.send.called)
-        self.assertEqual(collections.deque([b'ta1data2']), transport._buffer)
-
-    def test_on_ready_send_closing_partial(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        self.sslsock.send.return_value = 2
-        transport = self._make_one()
-        transport._buffer = collections.deque([b'data1', b'data2'])
-        transport._on_ready()
-        self.assertTrue(self.sslsock.send.called)
-        self.assertFalse(self.sslsock.close.called)
-
-    def test_on_ready_send_closing(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        self.sslsock.send.return_value = 4
-        transport = self._make_one()
-        transport.close()
-        transport._buffer = collections.deque([b'data'])
-        transport._on_ready()
-        self.assertFalse(self.loop.writers)
+    def test_write_ready_closing(self):
+        self.transport._buffer.append(b'data')
+        self.transport.close()
+        self.sock.send.return_value = 4
+        self.transport._write_ready()
         self.protocol.connection_lost.assert_called_with(None)
+        self.loop._remove_edge_fd.assert_called_with(7)
+        self.assertTrue(self.sock.close.called)
 
-    def test_on_ready_send_closing_empty_buffer(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        self.sslsock.send.return_value = 4
-        transport = self._make_one()
-        transport.close()
-        transport._buffer = collections.deque()
-        transport._on_ready()
-        self.assertFalse(self.loop.writers)
+    def test_close_unregisters(self):
+        self.transport.close()
+        test_utils.run_briefly(self.loop)
+        self.loop._remove_edge_fd.assert_called_with(7)
         self.protocol.connection_lost.assert_called_with(None)
 
-    def test_on_ready_send_retry(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-
-        transport = self._make_one()
-        transport._buffer = collections.deque([b'data'])
-
-        self.sslsock.send.side_effect = ssl.SSLWantReadError
-        transport._on_ready()
-        self.assertTrue(self.sslsock.send.called)
-        self.assertEqual(collections.deque([b'data']), transport._buffer)
-
-        self.sslsock.send.side_effect = ssl.SSLWantWriteError
-        transport._on_ready()
-        self.assertEqual(collections.deque([b'data']), transport._buffer)
-
-        self.sslsock.send.side_effect = BlockingIOError()
-        transport._on_ready()
-        self.assertEqual(collections.deque([b'data']), transport._buffer)
-
-    def test_on_ready_send_exc(self):
-        self.sslsock.recv.side_effect = ssl.SSLWantReadError
-        err = self.sslsock.send.side_effect = OSError()
-
-        transport = self._make_one()
-        transport._buffer = collections.deque([b'data'])
-        transport._fatal_error = unittest.mock.Mock()
-        transport._on_ready()
-        transport._fatal_error.assert_called_with(err)
-        self.assertEqual(collections.deque(), transport._buffer)
-
-    def test_write_eof(self):
-        tr = self._make_one()
-        self.assertFalse(tr.can_write_eof())
-        self.assertRaises(NotImplementedError, tr.write_eof)
-
-    def test_close(self):
-        tr = self._make_one()
-        tr.close()
-
-        self.assertTrue(tr._closing)
-        self.assertEqual(1, self.loop.remove_reader_count[1])
-        self.assertEqual(tr._conn_lost, 1)
-
-        tr.close()
-        self.assertEqual(tr._conn_lost, 1)
-        self.assertEqual(1, self.loop.remove_reader_count[1])
-
-    @unittest.skipIf(ssl is None or not ssl.HAS_SNI, 'No SNI support')
-    def test_server_hostname(self):
-        _SelectorSslTransport(
-            self.loop, self.sock, self.protocol, self.sslcontext,
-            server_hostname='localhost')
-        self.sslcontext.wrap_socket.assert_called_with(
-            self.sock, do_handshake_on_connect=False, server_side=False,
-            server_hostname='localhost')
-
 
 class SelectorDatagramTransportTests(unittest.TestCase):
 
@@ -1263,6 +1907,37 @@ class SelectorDatagramTransportTests(unittest.TestCase):
         self.protocol.datagram_received.assert_called_with(
             b'data', ('0.0.0.0', 1234))
 
+    def test_read_ready_budget(self):
+        transport = _SelectorDatagramTransport(
+            self.loop, self.sock, self.protocol)
+        transport.read_budget = 3
+        self.sock.recvfrom.side_effect = [
+            (b'data1', ('0.0.0.0', 1234)), (b'data2', ('0.0.0.0', 1235)),
+            BlockingIOError]
+        transport._read_ready()
+        self.assertEqual(
+            [unittest.mock.call(b'data1', ('0.0.0.0', 1234)),
+             unittest.mock.call(b'data2', ('0.0.0.0', 1235))],
+            self.protocol.datagram_received.call_args_list)
+
+    def test_read_ready_byte_budget(self):
+        transport = _SelectorDatagramTransport(
+            self.loop, self.sock, self.protocol)
+        transport.read_budget = 10
+        transport.read_byte_budget = 8
+        self.sock.recvfrom.return_value = (b'data', ('0.0.0.0', 1234))
+        transport._read_ready()
+        self.assertEqual(2, self.protocol.datagram_received.call_count)
+
+    def test_read_ready_recv_size(self):
+        transport = _SelectorDatagramTransport(
+            self.loop, self.sock, self.protocol)
+        self.sock.recvfrom.return_value = (b'data', ('0.0.0.0', 1234))
+        transport._read_ready()
+        self.sock.recvfrom.assert_called_with(transport.max_size)
+        self.assertEqual(transport.max_size,
+                         transport.get_extra_info('recv_size'))
+
     def test_read_ready_tryagain(self):
         transport = _SelectorDatagramTransport(
             self.loop, self.sock, self.protocol)
@@ -1391,6 +2066,33 @@ class SelectorDatagramTransportTests(unittest.TestCase):
         transport.sendto(b'data', (1,))
         self.assertEqual(transport._conn_lost, 2)
 
+    def test_sendto_bytearray_buffer_copies(self):
+        data = bytearray(b'data')
+        transport = _SelectorDatagramTransport(
+            self.loop, self.sock, self.protocol)
+        transport._buffer.append((b'data1', ('0.0.0.0', 12345)))
+        transport.sendto(data, ('0.0.0.0', 12345))
+        data[:] = b'xxxx'
+        self.assertEqual((b'data', ('0.0.0.0', 12345)), transport._buffer[1])
+        self.assertIsInstance(transport._buffer[1][0], bytes)
+
+    def test_sendto_pause_resume_writing(self):
+        self.sock.sendto.side_effect = BlockingIOError
+        transport = _SelectorDatagramTransport(
+            self.loop, self.sock, self.protocol)
+        transport.set_write_buffer_limits(high=5)
+        transport.sendto(b'data', ('0.0.0.0', 1))
+        self.assertFalse(self.protocol.pause_writing.called)
+        transport.sendto(b'data', ('0.0.0.0', 1))
+        self.assertEqual(8, transport.get_write_buffer_size())
+        self.protocol.pause_writing.assert_called_with()
+
+        self.sock.sendto.side_effect = None
+        transport._sendto_ready()
+        self.assertEqual(0, transport.get_write_buffer_size())
+        self.protocol.resume_writing.assert_called_with()
+        self.assertFalse(self.loop.writers)
+
     def test_sendto_ready(self):
         data = b'data'
         self.sock.sendto.return_value = len(data)
@@ -1483,3 +2185,239 @@ class SelectorDatagramTransportTests(unittest.TestCase):
         transport._fatal_error(err)
         self.protocol.connection_refused.assert_called_with(err)
         m_exc.assert_called_with('Fatal error for %s', transport)
+
+
+class SendfileTests(unittest.TestCase):
+
+    DATA = bytes(range(256)) * 4096
+
+    def setUp(self):
+        self.loop = tulip.new_event_loop()
+        tulip.set_event_loop(None)
+        self.sock, self.peer = test_utils.socketpair()
+        self.sock.setblocking(False)
+        self.file = tempfile.TemporaryFile()
+        self.file.write(self.DATA)
+        self.file.flush()
+        self.received = bytearray()
+
+    def tearDown(self):
+        self.file.close()
+        self.sock.close()
+        self.peer.close()
+        self.loop.close()
+
+    def recv_all(self, nbytes):
+        self.peer.settimeout(1.0)
+        while len(self.received) < nbytes:
+            self.received += self.peer.recv(65536)
+
+    def run_with_reader(self, coro, nbytes):
+        # The peer is read in a thread; the file is larger than the
+        # socket buffers.
+        thread = threading.Thread(target=self.recv_all, args=(nbytes,))
+        thread.start()
+        try:
+            result = self.loop.run_until_complete(coro)
+            # Let the transport send what it still has buffered.
+            while thread.is_alive():
+                test_utils.run_briefly(self.loop)
+            return result
+        finally:
+            thread.join()
+
+    def test_sock_sendfile(self):
+        total = self.run_with_reader(
+            self.loop.sock_sendfile(self.sock, self.file, 1000),
+            len(self.DATA) - 1000)
+        self.assertEqual(len(self.DATA) - 1000, total)
+        self.assertEqual(self.DATA[1000:], self.received)
+        self.assertEqual(len(self.DATA), self.file.tell())
+
+    def test_sock_sendfile_count(self):
+        total = self.run_with_reader(
+            self.loop.sock_sendfile(self.sock, self.file, 10, 100), 100)
+        self.assertEqual(100, total)
+        self.assertEqual(self.DATA[10:110], self.received)
+        self.assertEqual(110, self.file.tell())
+
+    def test_sock_sendfile_fallback(self):
+        file = io.BytesIO(self.DATA)
+        total = self.run_with_reader(
+            self.loop.sock_sendfile(self.sock, file, 1000, 300000), 300000)
+        self.assertEqual(300000, total)
+        self.assertEqual(self.DATA[1000:301000], self.received)
+        self.assertEqual(301000, file.tell())
+
+    def test_sock_sendfile_invalid(self):
+        self.assertRaises(
+            ValueError, self.loop.run_until_complete,
+            self.loop.sock_sendfile(self.sock, self.file, -1))
+        self.assertRaises(
+            ValueError, self.loop.run_until_complete,
+            self.loop.sock_sendfile(self.sock, self.file, 0, -1))
+
+    def make_transport(self, cls=_SelectorSocketTransport):
+        self.protocol = unittest.mock.Mock(Protocol)
+        return cls(self.loop, self.sock, self.protocol)
+
+    @tasks.coroutine
+    def send_file_between_writes(self, transport, file, *args):
+        transport.write(b'head')
+        fut = tasks.async(transport.sendfile(file, *args), loop=self.loop)
+        yield from tasks.sleep(0, loop=self.loop)
+        transport.write(b'tail')
+        total = yield from fut
+        transport.close()
+        return total
+
+    def check_sendfile(self, transport, file):
+        nbytes = len(self.DATA) - 1000 + 8
+        total = self.run_with_reader(
+            self.send_file_between_writes(transport, file, 1000), nbytes)
+        test_utils.run_briefly(self.loop)
+        self.assertEqual(len(self.DATA) - 1000, total)
+        self.assertEqual(b'head' + self.DATA[1000:] + b'tail',
+                         self.received)
+        self.protocol.connection_lost.assert_called_with(None)
+
+    def test_transport_sendfile(self):
+        transport = self.make_transport()
+        self.check_sendfile(transport, self.file)
+
+    def test_transport_sendfile_fallback(self):
+        transport = self.make_transport()
+        self.check_sendfile(transport, io.BytesIO(self.DATA))
+
+    def test_transport_sendfile_edge(self):
+        transport = self.make_transport(_SelectorEdgeSocketTransport)
+        self.check_sendfile(transport, self.file)
+
+    def test_transport_sendfile_write_eof(self):
+        transport = self.make_transport()
+        fut = tasks.async(transport.sendfile(self.file, 0, 100),
+                          loop=self.loop)
+        test_utils.run_briefly(self.loop)
+        transport.write_eof()
+        self.assertEqual(100, self.loop.run_until_complete(fut))
+        self.recv_all(100)
+        self.assertEqual(b'', self.peer.recv(100))
+        self.assertEqual(self.DATA[:100], self.received)
+
+    def test_transport_sendfile_peer_closed(self):
+        file = io.BytesIO(self.DATA * 10)
+        transport = self.make_transport()
+        self.peer.close()
+        self.assertRaises(ConnectionResetError,
+                          self.loop.run_until_complete,
+                          transport.sendfile(file))
+        self.assertLess(file.tell(), len(self.DATA))
+        test_utils.run_briefly(self.loop)
+        self.assertTrue(self.protocol.connection_lost.called)
+
+    def test_transport_sendfile_abort(self):
+        fd = self.sock.fileno()
+        transport = self.make_transport()
+        fut = tasks.async(transport.sendfile(self.file), loop=self.loop)
+        test_utils.run_briefly(self.loop)
+        transport.write(b'tail')
+        transport.abort()
+        self.assertRaises(ConnectionResetError,
+                          self.loop.run_until_complete, fut)
+        self.assertEqual(0, transport.get_write_buffer_size())
+        self.assertFalse(self.loop.remove_writer(fd))
+        self.protocol.connection_lost.assert_called_with(None)
+
+
+class LoopGroupTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = tulip.new_event_loop()
+        tulip.set_event_loop(None)
+        self.group = LoopGroup(self.loop, 2)
+
+    def tearDown(self):
+        if self.group._threads:
+            self.group.stop()
+        else:
+            for loop in self.group.loops:
+                loop.close()
+        self.loop.close()
+
+    def run_until(self, predicate, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            self.assertLess(time.monotonic(), deadline, 'timed out')
+            self.loop.run_until_complete(tasks.sleep(0.01, loop=self.loop))
+
+    def test_ctor(self):
+        self.assertEqual(2, len(self.group.loops))
+        self.assertEqual('round_robin', self.group.balance)
+        for loop in self.group.loops:
+            self.assertIsInstance(loop, BaseSelectorEventLoop)
+            self.assertIsNot(self.loop, loop)
+        self.assertRaises(ValueError, LoopGroup, self.loop, balance='random')
+        self.assertRaises(TypeError, LoopGroup, unittest.mock.Mock())
+
+    def test_serve(self):
+        threads = []
+
+        class Echo(Protocol):
+
+            def connection_made(self, transport):
+                threads.append((threading.current_thread(),
+                                tulip.get_event_loop()))
+                self.transport = transport
+
+            def data_received(self, data):
+                self.transport.write(data)
+
+        self.group.start()
+        server = self.loop.run_until_complete(
+            self.group.create_server(Echo, '127.0.0.1', 0))
+        address = server.sockets[0].getsockname()
+        clients = [socket.create_connection(address) for i in range(4)]
+        self.run_until(lambda: self.group.get_stats()['handoffs'] == 4)
+        self.assertEqual({'connections': [2, 2], 'handoffs': 4},
+                         self.group.get_stats())
+        self.assertEqual(4, server.active_count)
+        for client in clients:
+            client.settimeout(5)
+            client.sendall(b'ping')
+            self.assertEqual(b'ping', client.recv(10))
+        self.assertEqual(set(zip(self.group._threads, self.group.loops)),
+                         set(threads))
+
+        for client in clients:
+            client.close()
+        self.run_until(lambda: server.active_count == 0)
+        self.assertEqual([0, 0], self.group.get_stats()['connections'])
+        server.close()
+        self.loop.run_until_complete(server.wait_closed())
+
+    def test_least_connections(self):
+        group = LoopGroup(self.loop, 3, balance='least_connections')
+        self.addCleanup(lambda: [loop.close() for loop in group.loops])
+        group._connections = [2, 0, 1]
+        self.assertEqual(1, group._pick())
+        group._connections = [1, 1, 1]
+        self.assertEqual(0, group._pick())
+
+    def test_round_robin(self):
+        self.group._connections = [5, 0]
+        self.assertEqual([0, 1, 0], [self.group._pick() for i in range(3)])
+
+    @unittest.mock.patch('tulip.selector_events.tulip_log')
+    def test_start_connection_error(self, m_log):
+        server = unittest.mock.Mock()
+        self.group._connections = [0, 1]
+        conn = unittest.mock.Mock()
+        self.group._start_connection(
+            1, conn, ('127.0.0.1', 1),
+            unittest.mock.Mock(side_effect=ValueError), None,
+            selector_events._WorkerServer(self.group, 1, server))
+        self.assertTrue(conn.close.called)
+        self.assertTrue(m_log.exception.called)
+        test_utils.run_briefly(self.loop)
+        self.assertEqual([0, 0], self.group._connections)
+        server.detach.assert_called_with(None)
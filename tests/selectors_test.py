@@ -1,5 +1,6 @@
 """Tests for selectors.py."""
 
+import socket
 import unittest
 import unittest.mock
 
@@ -103,6 +104,18 @@ class BaseSelectorTests(unittest.TestCase):
             selectors.SelectorKey(fobj, 10, selectors.EVENT_READ, d2),
             s.get_key(fobj))
 
+    def test_modify_data_no_reregister(self):
+        fobj = unittest.mock.Mock()
+        fobj.fileno.return_value = 10
+
+        s = FakeSelector()
+        s.register(fobj, selectors.EVENT_READ, object())
+        s.unregister = unittest.mock.Mock()
+        s.register = unittest.mock.Mock()
+        s.modify(fobj, selectors.EVENT_READ, object())
+        self.assertFalse(s.unregister.called)
+        self.assertFalse(s.register.called)
+
     def test_modify_same(self):
         fobj = unittest.mock.Mock()
         fobj.fileno.return_value = 10
@@ -143,3 +156,144 @@ class BaseSelectorTests(unittest.TestCase):
     if hasattr(selectors.DefaultSelector, 'fileno'):
         def test_fileno(self):
             self.assertIsInstance(selectors.DefaultSelector().fileno(), int)
+
+
+class NativeModifyTestsMixin:
+
+    def setUp(self):
+        self.rsock, self.wsock = socket.socketpair()
+        self.sel = self.SELECTOR()
+
+    def tearDown(self):
+        self.sel.close()
+        self.rsock.close()
+        self.wsock.close()
+
+    def test_select_raw(self):
+        self.sel.register(self.rsock, selectors.EVENT_READ)
+        self.sel.register(self.wsock, selectors.EVENT_WRITE)
+        self.wsock.send(b'x')
+        ready = dict(self.sel.select_raw(0))
+        self.assertEqual({self.rsock.fileno(), self.wsock.fileno()},
+                         set(ready))
+        self.assertTrue(
+            ready[self.rsock.fileno()] & self.sel.raw_read_events)
+        self.assertTrue(
+            ready[self.wsock.fileno()] & self.sel.raw_write_events)
+        self.assertFalse(
+            ready[self.wsock.fileno()] & self.sel.raw_read_events)
+
+    def test_modify_events(self):
+        d1 = object()
+        d2 = object()
+        self.sel.register(self.wsock, selectors.EVENT_READ, d1)
+        self.assertEqual([], self.sel.select(0))
+
+        key = self.sel.modify(self.wsock, selectors.EVENT_WRITE, d2)
+        self.assertEqual(selectors.EVENT_WRITE, key.events)
+        self.assertIs(d2, key.data)
+        self.assertIs(key, self.sel.get_key(self.wsock))
+        self.assertEqual([(key, selectors.EVENT_WRITE)], self.sel.select(0))
+
+        key = self.sel.modify(self.wsock,
+                              selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self.assertEqual([(key, selectors.EVENT_WRITE)], self.sel.select(0))
+
+        self.rsock.send(b'x')
+        key = self.sel.modify(self.wsock, selectors.EVENT_READ)
+        self.assertEqual([(key, selectors.EVENT_READ)], self.sel.select(0))
+
+        self.sel.unregister(self.wsock)
+        self.assertEqual([], self.sel.select(0))
+
+    def test_modify_invalid_events(self):
+        self.sel.register(self.wsock, selectors.EVENT_READ)
+        self.assertRaises(ValueError, self.sel.modify, self.wsock, 0)
+        self.assertEqual(selectors.EVENT_READ,
+                         self.sel.get_key(self.wsock).events)
+
+    def test_modify_no_reregister(self):
+        self.sel.register(self.wsock, selectors.EVENT_READ)
+        with unittest.mock.patch.object(self.sel, 'unregister') as m:
+            self.sel.modify(self.wsock, selectors.EVENT_WRITE)
+            self.assertFalse(m.called)
+
+
+class SelectSelectorTests(NativeModifyTestsMixin, unittest.TestCase):
+    SELECTOR = selectors.SelectSelector
+
+
+if hasattr(selectors, 'PollSelector'):
+    class PollSelectorTests(NativeModifyTestsMixin, unittest.TestCase):
+        SELECTOR = selectors.PollSelector
+
+        def test_modify_data_no_syscall(self):
+            self.sel.register(self.wsock, selectors.EVENT_READ, object())
+            self.sel._poll = unittest.mock.Mock()
+            self.sel.modify(self.wsock, selectors.EVENT_READ, object())
+            self.assertFalse(self.sel._poll.method_calls)
+
+
+if hasattr(selectors, 'EpollSelector'):
+    class EpollSelectorTests(NativeModifyTestsMixin, unittest.TestCase):
+        SELECTOR = selectors.EpollSelector
+
+        def test_modify_data_no_syscall(self):
+            self.sel.register(self.wsock, selectors.EVENT_READ, object())
+            epoll = self.sel._epoll
+            self.sel._epoll = unittest.mock.Mock()
+            try:
+                self.sel.modify(self.wsock, selectors.EVENT_READ, object())
+                self.assertFalse(self.sel._epoll.method_calls)
+                self.sel.modify(self.wsock, selectors.EVENT_WRITE)
+                self.sel._epoll.modify.assert_called_with(
+                    self.wsock.fileno(), selectors.select.EPOLLOUT)
+                self.assertFalse(self.sel._epoll.unregister.called)
+            finally:
+                self.sel._epoll = epoll
+
+        def test_modify_error_restores_key(self):
+            key = self.sel.register(self.wsock, selectors.EVENT_READ)
+            epoll = self.sel._epoll
+            self.sel._epoll = unittest.mock.Mock()
+            self.sel._epoll.modify.side_effect = OSError
+            try:
+                self.assertRaises(OSError, self.sel.modify,
+                                  self.wsock, selectors.EVENT_WRITE)
+                self.assertIs(key, self.sel.get_key(self.wsock))
+            finally:
+                self.sel._epoll = epoll
+
+        def test_edge_triggered(self):
+            epoll = self.sel._epoll
+            self.sel._epoll = unittest.mock.Mock()
+            try:
+                fd = self.wsock.fileno()
+                self.sel.register(self.wsock, selectors.EVENT_READ,
+                                  edge_triggered=True)
+                self.sel._epoll.register.assert_called_with(
+                    fd, selectors.select.EPOLLIN | selectors.select.EPOLLET)
+                self.sel.modify(self.wsock, selectors.EVENT_WRITE)
+                self.sel._epoll.modify.assert_called_with(
+                    fd, selectors.select.EPOLLOUT | selectors.select.EPOLLET)
+                self.sel.unregister(self.wsock)
+                self.sel.register(self.wsock, selectors.EVENT_READ)
+                self.sel._epoll.register.assert_called_with(
+                    fd, selectors.select.EPOLLIN)
+            finally:
+                self.sel._epoll = epoll
+
+        def test_edge_triggered_reports_once(self):
+            self.sel.register(self.rsock, selectors.EVENT_READ,
+                              edge_triggered=True)
+            self.wsock.send(b'x')
+            self.assertEqual(1, len(self.sel.select(0)))
+            # Still readable, but not reported again without new data.
+            self.assertEqual([], self.sel.select(0))
+            self.wsock.send(b'y')
+            self.assertEqual(1, len(self.sel.select(0)))
+
+
+if hasattr(selectors, 'KqueueSelector'):
+    class KqueueSelectorTests(NativeModifyTestsMixin, unittest.TestCase):
+        SELECTOR = selectors.KqueueSelector
@@ -0,0 +1,454 @@
+"""Tests for sslproto.py"""
+
+import io
+import time
+import unittest
+import unittest.mock
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+from tulip import futures
+from tulip import tasks
+from tulip import test_utils
+from tulip.protocols import BufferedProtocol, Protocol
+
+if ssl is not None:
+    from tulip import sslproto
+
+
+def make_session(timeout=300):
+    session = unittest.mock.Mock()
+    session.time = int(time.time())
+    session.timeout = timeout
+    return session
+
+
+@unittest.skipIf(ssl is None, 'No ssl module')
+class SSLProtocolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = test_utils.TestLoop()
+        self.protocol = test_utils.make_test_protocol(Protocol)
+        self.sslobj = unittest.mock.Mock()
+        self.sslobj.read.side_effect = ssl.SSLWantReadError
+        self.sslobj.write.side_effect = len
+        self.sslcontext = unittest.mock.Mock(ssl.SSLContext)
+        self.sslcontext.verify_mode = ssl.CERT_NONE
+        self.sslcontext.wrap_bio.return_value = self.sslobj
+        self.transport = unittest.mock.Mock()
+        self.transport.get_write_buffer_size.return_value = 0
+        self.transport._conn_lost = 0
+
+    def _make_one(self, waiter=None, handshake=True):
+        proto = sslproto.SSLProtocol(self.loop, self.protocol,
+                                     self.sslcontext, waiter)
+        if not handshake:
+            self.sslobj.do_handshake.side_effect = ssl.SSLWantReadError
+        proto.connection_made(self.transport)
+        return proto
+
+    def _feed(self, proto, data=b'ciphertext'):
+        buf = proto.get_buffer(len(data))
+        buf[:len(data)] = data
+        proto.buffer_updated(len(data))
+
+    def _produce(self, proto, data):
+        # Make the SSL object produce data to send.
+        def produce(*args):
+            proto._outgoing.write(data)
+            return len(args[0]) if args else None
+        return produce
+
+    def test_handshake(self):
+        waiter = futures.Future(loop=self.loop)
+        proto = self._make_one(waiter, handshake=False)
+        self.assertFalse(waiter.done())
+        self.assertFalse(self.protocol.connection_made.called)
+
+        self.sslobj.do_handshake.side_effect = self._produce(
+            proto, b'finished')
+        self.sslobj.cipher.return_value = ('CIPHER', 'TLSv1.2', 256)
+        self._feed(proto)
+        self.assertEqual(b'ciphertext', proto._incoming.read())
+        self.transport.write.assert_called_with(b'finished')
+        self.protocol.connection_made.assert_called_with(
+            proto._app_transport)
+        self.assertIsNone(waiter.result())
+
+        tr = proto._app_transport
+        self.assertEqual(('CIPHER', 'TLSv1.2', 256),
+                         tr.get_extra_info('cipher'))
+        self.assertIs(self.sslcontext, tr.get_extra_info('sslcontext'))
+        self.transport.get_extra_info.return_value = ('1.2.3.4', 443)
+        self.assertEqual(('1.2.3.4', 443), tr.get_extra_info('peername'))
+
+    def test_handshake_failed(self):
+        waiter = futures.Future(loop=self.loop)
+        exc = self.sslobj.do_handshake.side_effect = ssl.SSLError()
+        proto = self._make_one(waiter)
+        self.assertIs(exc, waiter.exception())
+        self.transport.abort.assert_called_with()
+        proto.connection_lost(None)
+        self.assertFalse(self.protocol.connection_made.called)
+        self.assertFalse(self.protocol.connection_lost.called)
+
+    def test_hostname_mismatch(self):
+        self.sslcontext.verify_mode = ssl.CERT_REQUIRED
+        self.sslobj.getpeercert.return_value = {
+            'subject': ((('commonName', 'example.com'),),)}
+        waiter = futures.Future(loop=self.loop)
+        sslproto.SSLProtocol(
+            self.loop, self.protocol, self.sslcontext, waiter,
+            server_hostname='example.org').connection_made(self.transport)
+        self.assertIsInstance(waiter.exception(), ssl.CertificateError)
+        self.transport.abort.assert_called_with()
+
+    def test_eof_during_handshake(self):
+        waiter = futures.Future(loop=self.loop)
+        proto = self._make_one(waiter, handshake=False)
+        self.assertTrue(proto.eof_received())
+        self.assertIsInstance(waiter.exception(), ConnectionResetError)
+        self.transport.abort.assert_called_with()
+
+    def test_connection_lost_during_handshake(self):
+        waiter = futures.Future(loop=self.loop)
+        proto = self._make_one(waiter, handshake=False)
+        proto.connection_lost(None)
+        self.assertIsInstance(waiter.exception(), ConnectionResetError)
+        self.assertFalse(self.protocol.connection_lost.called)
+
+    def test_session_cache(self):
+        cache = sslproto.SSLSessionCache()
+        old, new, ticket = make_session(), make_session(), make_session()
+        cache.put('key', old)
+        self.sslobj.session_reused = True
+        self.sslobj.session = new
+        proto = sslproto.SSLProtocol(
+            self.loop, self.protocol, self.sslcontext, None,
+            session_cache=cache, session_key='key')
+        self.assertIs(old, self.sslcontext.wrap_bio.call_args[1]['session'])
+        proto.connection_made(self.transport)
+        self.assertIs(new, cache.get('key'))
+        self.assertEqual(1, cache.client_handshakes)
+        self.assertEqual(1, cache.client_reused)
+
+        # The session may have been updated by a ticket since.
+        self.sslobj.session = ticket
+        proto.connection_lost(None)
+        self.assertIs(ticket, cache.get('key'))
+
+    @unittest.mock.patch('tulip.sslproto._HAS_SESSIONS', False)
+    def test_session_cache_no_sessions(self):
+        # Before Python 3.6 sessions can't be resumed.
+        cache = sslproto.SSLSessionCache()
+        cache.put('key', make_session())
+        del self.sslobj.session_reused
+        proto = sslproto.SSLProtocol(
+            self.loop, self.protocol, self.sslcontext, None,
+            session_cache=cache, session_key='key')
+        self.assertNotIn('session', self.sslcontext.wrap_bio.call_args[1])
+        proto.connection_made(self.transport)
+        self.assertEqual(1, cache.client_handshakes)
+        self.assertEqual(0, cache.client_reused)
+        self.assertEqual(0, cache.hits)
+
+    def test_session_cache_server(self):
+        cache = sslproto.SSLSessionCache()
+        self.sslobj.session_reused = False
+        proto = sslproto.SSLProtocol(
+            self.loop, self.protocol, self.sslcontext, None,
+            server_side=True, session_cache=cache, session_key='key')
+        proto.connection_made(self.transport)
+        self.assertIsNone(self.sslcontext.wrap_bio.call_args[1]['session'])
+        self.assertEqual(1, cache.server_handshakes)
+        self.assertEqual(0, cache.server_reused)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.hits + cache.misses)
+
+    def test_session_cache_handshake_failed(self):
+        cache = sslproto.SSLSessionCache()
+        cache.put('key', make_session())
+        self.sslobj.do_handshake.side_effect = ssl.SSLError()
+        sslproto.SSLProtocol(
+            self.loop, self.protocol, self.sslcontext, None,
+            session_cache=cache, session_key='key').connection_made(
+                self.transport)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.client_handshakes)
+
+    def test_get_buffer_reused(self):
+        proto = self._make_one()
+        buf = proto.get_buffer(100)
+        self.assertEqual(100, len(buf))
+        self.assertIs(buf.obj, proto.get_buffer(50).obj)
+        self.assertEqual(200, len(proto.get_buffer(200)))
+
+    def test_read(self):
+        proto = self._make_one()
+        self.sslobj.read.side_effect = [b'data1', b'data2',
+                                        ssl.SSLWantReadError]
+        self._feed(proto)
+        self.assertEqual(
+            [unittest.mock.call(b'data1'), unittest.mock.call(b'data2')],
+            self.protocol.data_received.call_args_list)
+
+    def test_read_buffered(self):
+        self.protocol = test_utils.make_test_protocol(BufferedProtocol)
+        self.protocol.get_buffer.return_value = bytearray(10)
+        proto = self._make_one()
+        self.sslobj.read.side_effect = [4, ssl.SSLWantReadError]
+        self._feed(proto)
+        self.assertEqual(10, self.sslobj.read.call_args[0][0])
+        self.protocol.buffer_updated.assert_called_once_with(4)
+
+    def test_read_error(self):
+        proto = self._make_one()
+        exc = self.sslobj.read.side_effect = ssl.SSLError()
+        with unittest.mock.patch('tulip.sslproto.tulip_log'):
+            self._feed(proto)
+        self.transport._force_close.assert_called_with(exc)
+
+    def test_close_notify(self):
+        proto = self._make_one()
+        self.sslobj.read.side_effect = [b'data', b'']
+        self.sslobj.unwrap.side_effect = self._produce(proto, b'notify')
+        self._feed(proto)
+        self.protocol.data_received.assert_called_with(b'data')
+        self.protocol.eof_received.assert_called_with()
+        # The protocol did not keep the connection open.
+        self.transport.write.assert_called_with(b'notify')
+        self.transport.close.assert_called_with()
+
+        proto.connection_lost(None)
+        self.protocol.connection_lost.assert_called_with(None)
+
+    def test_ragged_eof(self):
+        proto = self._make_one()
+        self.protocol.eof_received.return_value = True
+        self.sslobj.read.side_effect = ssl.SSLEOFError
+        self.assertTrue(proto.eof_received())
+        self.assertTrue(proto._incoming.eof)
+        self.protocol.eof_received.assert_called_once_with()
+        self.assertFalse(self.transport.close.called)
+
+        # The protocol kept the connection open; write_eof() closes it.
+        proto._app_transport.write(b'data')
+        proto._app_transport.write_eof()
+        self.sslobj.write.assert_called_with(b'data')
+        self.transport.write_eof.assert_called_with()
+        self.transport.close.assert_called_with()
+
+    def test_write(self):
+        proto = self._make_one()
+        self.sslobj.write.side_effect = self._produce(proto, b'record')
+        proto._app_transport.write(bytearray(b'data'))
+        self.transport.write.assert_called_with(b'record')
+        proto._app_transport.write(b'')
+        self.assertEqual(1, self.sslobj.write.call_count)
+
+    def test_write_renegotiation(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        data = bytearray(b'data')
+        self.sslobj.write.side_effect = ssl.SSLWantReadError
+        tr.write(data)
+        tr.write(b'more')
+        data[:] = b'XXXX'
+        self.assertEqual(1, self.sslobj.write.call_count)
+        self.assertEqual(8, tr.get_write_buffer_size())
+
+        # The peer's reply completes the renegotiation.
+        self.sslobj.write.reset_mock()
+        self.sslobj.write.side_effect = len
+        self._feed(proto)
+        self.assertEqual(
+            [unittest.mock.call(b'data'), unittest.mock.call(b'more')],
+            self.sslobj.write.call_args_list)
+        self.assertEqual(0, tr.get_write_buffer_size())
+
+    def test_write_after_close(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        tr.close()
+        self.sslobj.unwrap.assert_called_with()
+        self.transport.close.assert_called_with()
+        tr.write(b'data')
+        self.assertFalse(self.sslobj.write.called)
+
+    def test_close_with_backlog(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        self.sslobj.write.side_effect = ssl.SSLWantReadError
+        tr.write(b'data')
+        tr.close()
+        self.assertFalse(self.transport.close.called)
+
+        self.sslobj.write.side_effect = len
+        self._feed(proto)
+        self.sslobj.write.assert_called_with(b'data')
+        self.transport.close.assert_called_with()
+
+    def test_write_eof(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        self.assertTrue(tr.can_write_eof())
+        self.sslobj.unwrap.side_effect = ssl.SSLWantReadError
+        tr.write_eof()
+        self.assertRaises(AssertionError, tr.write, b'data')
+        self.sslobj.unwrap.assert_called_once_with()
+        self.transport.write_eof.assert_called_with()
+        self.assertFalse(self.transport.close.called)
+
+        # Data still arrives until the peer closes its side.
+        self.sslobj.read.side_effect = [b'data', b'']
+        self._feed(proto)
+        self.protocol.data_received.assert_called_with(b'data')
+        self.protocol.eof_received.assert_called_with()
+        self.transport.close.assert_called_with()
+        self.assertEqual(1, self.sslobj.unwrap.call_count)
+
+    def test_pause_resume(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        self.protocol.data_received.side_effect = lambda data: tr.pause()
+        self.sslobj.read.side_effect = [b'data1', b'data2',
+                                        ssl.SSLWantReadError]
+        self._feed(proto)
+        self.protocol.data_received.assert_called_once_with(b'data1')
+        self.transport.pause.assert_called_with()
+
+        self.protocol.data_received.side_effect = None
+        tr.resume()
+        self.transport.resume.assert_called_with()
+        test_utils.run_briefly(self.loop)
+        self.protocol.data_received.assert_called_with(b'data2')
+
+    def test_flow_control(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        tr.set_write_buffer_limits(high=100)
+        self.transport.set_write_buffer_limits.assert_called_with(100, None)
+        self.transport.get_write_buffer_size.return_value = 10
+        self.assertEqual(10, tr.get_write_buffer_size())
+        proto.pause_writing()
+        self.protocol.pause_writing.assert_called_with()
+        proto.resume_writing()
+        self.protocol.resume_writing.assert_called_with()
+
+    def test_set_cork(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        tr.set_cork(True, tcp_nodelay=True)
+        self.transport.set_cork.assert_called_with(
+            True, tcp_nodelay=True, tcp_cork=False)
+        tr.flush()
+        self.transport.flush.assert_called_with()
+
+    def test_abort(self):
+        proto = self._make_one()
+        proto._app_transport.abort()
+        self.transport.abort.assert_called_with()
+
+    def test_sendfile(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        file = io.BytesIO(b'0123456789')
+        proto.pause_writing()
+        with unittest.mock.patch('tulip.base_events._SENDFILE_CHUNK_SIZE', 3):
+            fut = tasks.async(tr.sendfile(file, 2, 5), loop=self.loop)
+            test_utils.run_briefly(self.loop)
+            self.assertFalse(fut.done())
+            # Sent after the file.
+            tr.write(b'after')
+            proto.resume_writing()
+            self.assertEqual(5, self.loop.run_until_complete(fut))
+        self.assertEqual(
+            [unittest.mock.call(b'234'), unittest.mock.call(b'56'),
+             unittest.mock.call(b'after')],
+            self.sslobj.write.call_args_list)
+        self.assertEqual(7, file.tell())
+
+    def test_sendfile_connection_lost(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        proto.pause_writing()
+        fut = tasks.async(tr.sendfile(io.BytesIO(b'data')), loop=self.loop)
+        test_utils.run_briefly(self.loop)
+        proto.connection_lost(None)
+        self.assertRaises(ConnectionResetError,
+                          self.loop.run_until_complete, fut)
+
+
+    def test_sendfile_transport_lost(self):
+        proto = self._make_one()
+        tr = proto._app_transport
+        file = io.BytesIO(b'0123456789')
+
+        def write(data):
+            # The connection is lost while the first chunk is sent.
+            self.transport._conn_lost = 1
+            return len(data)
+
+        self.sslobj.write.side_effect = write
+        with unittest.mock.patch('tulip.base_events._SENDFILE_CHUNK_SIZE', 3):
+            self.assertRaises(ConnectionResetError,
+                              self.loop.run_until_complete, tr.sendfile(file))
+        self.assertEqual(1, self.sslobj.write.call_count)
+        self.assertEqual(3, file.tell())
+
+
+class SSLSessionCacheTests(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = sslproto.SSLSessionCache()
+        self.assertIsNone(cache.get('key'))
+        session = make_session()
+        cache.put('key', session)
+        cache.put('other', None)
+        self.assertEqual(1, len(cache))
+        self.assertIs(session, cache.get('key'))
+        self.assertEqual(
+            {'cached': 1, 'hits': 1, 'misses': 1,
+             'client_handshakes': 0, 'client_reused': 0,
+             'server_handshakes': 0, 'server_reused': 0},
+            cache.get_stats())
+
+        cache.discard('key')
+        cache.discard('key')
+        self.assertIsNone(cache.get('key'))
+
+    def test_maxsize(self):
+        cache = sslproto.SSLSessionCache(maxsize=2)
+        cache.put('a', make_session())
+        cache.put('b', make_session())
+        cache.get('a')
+        cache.put('c', make_session())
+        # 'b' was the least recently used.
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+
+        cache = sslproto.SSLSessionCache(maxsize=0)
+        cache.put('a', make_session())
+        self.assertEqual(0, len(cache))
+
+    def test_expired(self):
+        cache = sslproto.SSLSessionCache()
+        cache.put('key', make_session(timeout=0))
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(0, len(cache))
+        self.assertEqual(1, cache.misses)
+
+    def test_clear(self):
+        cache = sslproto.SSLSessionCache()
+        cache.put('key', make_session())
+        cache.get('key')
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(1, cache.hits)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -89,6 +89,25 @@ class StreamReaderTests(unittest.TestCase):
         stream.feed_data(self.DATA)
         self.assertEqual(len(self.DATA), stream.byte_count)
 
+    def test_get_buffer(self):
+        stream = streams.StreamReader(loop=self.loop)
+
+        buf = stream.get_buffer(100)
+        self.assertEqual(100, len(buf))
+        buf[:5] = b'line1'
+        stream.buffer_updated(5)
+        self.assertIs(buf, stream.get_buffer(10))
+        buf[:2] = b'\nx'
+        stream.buffer_updated(2)
+        self.assertEqual(7, stream.byte_count)
+
+        line = self.loop.run_until_complete(stream.readline())
+        self.assertEqual(b'line1\n', line)
+        self.assertIsInstance(line, bytes)
+        self.assertEqual([b'x'], list(stream.buffer))
+
+        self.assertEqual(200, len(stream.get_buffer(200)))
+
     def test_read_zero(self):
         # Read zero bytes.
         stream = streams.StreamReader(loop=self.loop)
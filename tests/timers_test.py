@@ -0,0 +1,135 @@
+"""Tests for timers.py"""
+
+import heapq
+import random
+import unittest
+
+from tulip import events
+from tulip import timers
+
+
+def noop():
+    pass
+
+
+class TimerWheelTests(unittest.TestCase):
+
+    def setUp(self):
+        self.wheel = timers.TimerWheel(resolution=0.01)
+        self.wheel.reset(0.0)
+
+    def push(self, when):
+        handle = events.TimerHandle(when, noop, ())
+        self.wheel.push(handle)
+        return handle
+
+    def test_bad_resolution(self):
+        self.assertRaises(ValueError, timers.TimerWheel, 0)
+
+    def test_push_pop(self):
+        h1 = self.push(0.05)
+        h2 = self.push(0.02)
+        self.assertEqual(2, len(self.wheel))
+        self.assertEqual([], self.wheel.pop_expired(0.01))
+        self.assertEqual([h2], self.wheel.pop_expired(0.03))
+        self.assertEqual([h1], self.wheel.pop_expired(0.05))
+        self.assertEqual(0, len(self.wheel))
+
+    def test_pop_is_exact_within_tick(self):
+        h = self.push(0.055)
+        self.assertEqual([], self.wheel.pop_expired(0.054))
+        self.assertEqual([h], self.wheel.pop_expired(0.055))
+
+    def test_pop_sorted(self):
+        handles = [self.push(when) for when in (3.0, 0.5, 2.0, 0.01, 90.0)]
+        expired = self.wheel.pop_expired(100.0)
+        self.assertEqual(sorted(handles), expired)
+
+    def test_past_deadline(self):
+        self.wheel.pop_expired(1.0)
+        h = self.push(0.5)
+        self.assertEqual(0.5, self.wheel.next_deadline())
+        self.assertEqual([h], self.wheel.pop_expired(1.0))
+
+    def test_discard(self):
+        h1 = self.push(0.05)
+        h2 = self.push(50.0)
+        self.assertTrue(self.wheel.discard(h1))
+        self.assertFalse(self.wheel.discard(h1))
+        self.assertTrue(self.wheel.discard(h2))
+        self.assertEqual(0, len(self.wheel))
+        self.assertIsNone(self.wheel.next_deadline())
+        self.assertEqual([], self.wheel.pop_expired(100.0))
+
+    def test_next_deadline(self):
+        self.assertIsNone(self.wheel.next_deadline())
+        self.push(0.3)
+        self.assertEqual(0.3, self.wheel.next_deadline())
+        # A far timer only reports when its slot must be cascaded.
+        wheel = timers.TimerWheel(resolution=0.01)
+        wheel.reset(0.0)
+        wheel.push(events.TimerHandle(100.0, noop, ()))
+        deadline = wheel.next_deadline()
+        self.assertLessEqual(deadline, 100.0)
+        self.assertEqual([], wheel.pop_expired(deadline))
+
+    def test_next_deadline_rounding(self):
+        # 66854912 * 0.001 is a hair below tick 66854912 in floating
+        # point; the cascade deadline must still reach that tick.
+        wheel = timers.TimerWheel(resolution=0.001)
+        wheel.reset(66850.0)
+        h = events.TimerHandle(66855.0, noop, ())
+        wheel.push(h)
+        deadline = wheel.next_deadline()
+        self.assertLessEqual(deadline, 66855.0)
+        self.assertEqual([], wheel.pop_expired(deadline))
+        self.assertGreater(wheel.next_deadline(), deadline)
+        self.assertEqual([h], wheel.pop_expired(66855.0))
+
+    def test_far_future(self):
+        # Beyond the span of all levels.
+        h = self.push(10 ** 7)
+        self.assertEqual([], self.wheel.pop_expired(10 ** 6))
+        self.assertEqual([h], self.wheel.pop_expired(10 ** 7))
+
+    def test_clear(self):
+        h1 = self.push(0.05)
+        h2 = self.push(500.0)
+        self.assertEqual({h1, h2}, set(self.wheel.clear()))
+        self.assertEqual(0, len(self.wheel))
+
+    def test_matches_heap(self):
+        rnd = random.Random(42)
+        heap = []
+        now = 0.0
+        for step in range(200):
+            for i in range(rnd.randrange(20)):
+                when = now + rnd.choice([0.001, 0.1, 1.0, 30.0, 1000.0]) * \
+                    rnd.random()
+                handle = events.TimerHandle(when, noop, ())
+                self.wheel.push(handle)
+                heapq.heappush(heap, handle)
+            for handle in rnd.sample(heap, len(heap) // 10):
+                handle.cancel()
+                self.wheel.discard(handle)
+            # Wake up no later than the wheel asks for.
+            deadline = self.wheel.next_deadline()
+            live = [h._when for h in heap if not h._cancelled]
+            if live:
+                self.assertLessEqual(deadline, min(live))
+            if deadline is None or deadline > now + 5.0:
+                now += rnd.random() * 5.0
+            else:
+                now = max(now, deadline)
+            expected = []
+            while heap and heap[0]._when <= now:
+                handle = heapq.heappop(heap)
+                if not handle._cancelled:
+                    expected.append(handle)
+            self.assertEqual(expected, self.wheel.pop_expired(now))
+            self.assertEqual(
+                len([h for h in heap if not h._cancelled]), len(self.wheel))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 """Tests for transports.py."""
 
+import array
 import unittest
 import unittest.mock
 
@@ -37,12 +38,93 @@ class TransportTests(unittest.TestCase):
         self.assertRaises(NotImplementedError, transport.resume)
         self.assertRaises(NotImplementedError, transport.close)
         self.assertRaises(NotImplementedError, transport.abort)
+        self.assertRaises(NotImplementedError,
+                          transport.get_write_buffer_size)
+        self.assertRaises(NotImplementedError,
+                          transport.set_write_buffer_limits)
 
     def test_dgram_not_implemented(self):
         transport = transports.DatagramTransport()
 
         self.assertRaises(NotImplementedError, transport.sendto, 'data')
         self.assertRaises(NotImplementedError, transport.abort)
+        self.assertRaises(NotImplementedError,
+                          transport.get_write_buffer_size)
+
+    def test_flowcontrol_mixin_set_write_limits(self):
+
+        class MyTransport(transports._FlowControlMixin,
+                          transports.Transport):
+
+            def get_write_buffer_size(self):
+                return 512
+
+        transport = MyTransport()
+        transport._protocol = unittest.mock.Mock()
+
+        self.assertFalse(transport._protocol_paused)
+
+        with self.assertRaisesRegex(ValueError, 'high.*must be >= low'):
+            transport.set_write_buffer_limits(high=0, low=1)
+
+        transport.set_write_buffer_limits(high=1024, low=128)
+        self.assertEqual(transport._high_water, 1024)
+        self.assertEqual(transport._low_water, 128)
+
+        transport.set_write_buffer_limits(low=100)
+        self.assertEqual(transport._high_water, 400)
+
+        transport.set_write_buffer_limits(high=256)
+        self.assertEqual(transport._low_water, 64)
+
+        transport._maybe_pause_protocol()
+        self.assertTrue(transport._protocol_paused)
+        transport._protocol.pause_writing.assert_called_with()
+        transport._maybe_pause_protocol()
+        self.assertEqual(1, transport._protocol.pause_writing.call_count)
+
+        transport._maybe_resume_protocol()
+        self.assertFalse(transport._protocol.resume_writing.called)
+        transport.set_write_buffer_limits(high=1024, low=512)
+        transport._maybe_resume_protocol()
+        self.assertFalse(transport._protocol_paused)
+        transport._protocol.resume_writing.assert_called_with()
+
+    def test_byte_view(self):
+        data = b'data'
+        self.assertIs(data, transports._byte_view(data))
+
+        data = bytearray(b'data')
+        view = transports._byte_view(data)
+        self.assertIsInstance(view, memoryview)
+        self.assertIs(data, view.obj)
+
+        view = transports._byte_view(array.array('i', [1, 2]))
+        self.assertEqual(2 * array.array('i').itemsize, len(view))
+        self.assertEqual('B', view.format)
+
+        self.assertRaises(AssertionError, transports._byte_view, 'str')
+        self.assertRaises(TypeError, transports._byte_view, 1)
+
+    def test_flowcontrol_mixin_snapshot(self):
+
+        class MyTransport(transports._FlowControlMixin,
+                          transports.Transport):
+            pass
+
+        transport = MyTransport()
+        data = b'data'
+        self.assertIs(data, transport._snapshot(data))
+        view = memoryview(data)[1:]
+        self.assertIs(view, transport._snapshot(view))
+
+        view = memoryview(bytearray(b'data'))[1:]
+        copy = transport._snapshot(view)
+        self.assertIsInstance(copy, bytes)
+        self.assertEqual(b'ata', copy)
+
+        transport.set_write_copy(False)
+        self.assertIs(view, transport._snapshot(view))
 
     def test_subprocess_transport_not_implemented(self):
         transport = transports.SubprocessTransport()
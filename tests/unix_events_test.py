@@ -3,10 +3,12 @@
 import gc
 import errno
 import io
+import os
 import pprint
 import signal
 import stat
 import sys
+import threading
 import unittest
 import unittest.mock
 
@@ -300,6 +302,101 @@ class SelectorEventLoopTests(unittest.TestCase):
         self.assertTrue(m_waitpid.called)
 
 
+class WorkerSupervisorTests(unittest.TestCase):
+
+    def test_run(self):
+        rfd, wfd = os.pipe()
+        self.addCleanup(os.close, rfd)
+
+        def worker(loop, index):
+            self.assertIsInstance(loop, unix_events.SelectorEventLoop)
+            self.assertIs(loop, events.get_event_loop())
+            os.write(wfd, bytes([index]))
+
+        supervisor = unix_events.WorkerSupervisor(worker, 3)
+        self.assertEqual([0, 0, 0], supervisor.run())
+        os.close(wfd)
+        self.assertEqual(b'\x00\x01\x02', bytes(sorted(os.read(rfd, 10))))
+        self.assertEqual([0, 0, 0], supervisor.restarts)
+        self.assertEqual({}, supervisor.pids)
+
+    def test_default_workers(self):
+        supervisor = unix_events.WorkerSupervisor(None)
+        self.assertEqual(os.cpu_count() or 1, supervisor.workers)
+        self.assertRaises(ValueError, unix_events.WorkerSupervisor, None, 0)
+
+    @unittest.mock.patch('tulip.unix_events.tulip_log')
+    def test_restart(self, m_log):
+
+        def worker(loop, index):
+            if index == 1:
+                raise SystemExit(3)
+
+        supervisor = unix_events.WorkerSupervisor(
+            worker, 2, restart_delay=0, max_restarts=2)
+        self.assertEqual([0, 3], supervisor.run())
+        self.assertEqual([0, 2], supervisor.restarts)
+        self.assertEqual(2, m_log.warning.call_count)
+
+    @unittest.mock.patch('tulip.unix_events.tulip_log')
+    def test_worker_error(self, m_log):
+
+        def worker(loop, index):
+            raise ValueError
+
+        def killed(loop, index):
+            os.kill(os.getpid(), signal.SIGKILL)
+
+        supervisor = unix_events.WorkerSupervisor(
+            worker, 1, max_restarts=0)
+        self.assertEqual([1], supervisor.run())
+        supervisor = unix_events.WorkerSupervisor(
+            killed, 1, max_restarts=0)
+        self.assertEqual([-signal.SIGKILL], supervisor.run())
+
+    @unittest.mock.patch('os.kill')
+    def test_stop(self, m_kill):
+        supervisor = unix_events.WorkerSupervisor(None, 2)
+        supervisor.pids = {101: 0, 102: 1}
+        m_kill.side_effect = [None, ProcessLookupError]
+        supervisor.stop()
+        self.assertTrue(supervisor._stopping)
+        m_kill.assert_has_calls([unittest.mock.call(101, signal.SIGTERM),
+                                 unittest.mock.call(102, signal.SIGTERM)],
+                                any_order=True)
+
+    def test_stop_running(self):
+        rfd, wfd = os.pipe()
+        self.addCleanup(os.close, rfd)
+        main = threading.get_ident()
+
+        def worker(loop, index):
+            os.write(wfd, b'x')
+            loop.run_forever()
+
+        def stop_when_ready():
+            # Signal the supervisor's thread once every worker is up;
+            # it blocks SIGTERM until the new pid is recorded.
+            ready = 0
+            while ready < 2:
+                data = os.read(rfd, 2 - ready)
+                if not data:
+                    return
+                ready += len(data)
+            signal.pthread_kill(main, signal.SIGTERM)
+
+        thread = threading.Thread(target=stop_when_ready)
+        thread.start()
+        try:
+            supervisor = unix_events.WorkerSupervisor(worker, 2)
+            returncodes = supervisor.run()
+        finally:
+            os.close(wfd)
+            thread.join()
+        self.assertEqual([-signal.SIGTERM] * 2, returncodes)
+        self.assertEqual([0, 0], supervisor.restarts)
+
+
 class UnixReadPipeTransportTests(unittest.TestCase):
 
     def setUp(self):
@@ -336,6 +433,36 @@ class UnixReadPipeTransportTests(unittest.TestCase):
         m_read.assert_called_with(5, tr.max_size)
         self.protocol.data_received.assert_called_with(b'data')
 
+    @unittest.mock.patch('os.readv')
+    def test__read_ready_buffered(self, m_readv):
+        protocol = test_utils.make_test_protocol(protocols.BufferedProtocol)
+        buf = bytearray(10)
+        protocol.get_buffer.return_value = buf
+        tr = unix_events._UnixReadPipeTransport(self.loop, self.pipe, protocol)
+        m_readv.return_value = 4
+        tr._read_ready()
+
+        protocol.get_buffer.assert_called_with(tr.max_size)
+        fd, (view,) = m_readv.call_args[0]
+        self.assertEqual(5, fd)
+        self.assertIs(buf, view.obj)
+        protocol.buffer_updated.assert_called_with(4)
+
+    @unittest.mock.patch('tulip.log.tulip_log.exception')
+    @unittest.mock.patch('os.readv')
+    def test__read_ready_buffered_error(self, m_readv, m_logexc):
+        protocol = test_utils.make_test_protocol(protocols.BufferedProtocol)
+        protocol.get_buffer.return_value = bytearray()
+        tr = unix_events._UnixReadPipeTransport(self.loop, self.pipe, protocol)
+        tr._read_ready()
+
+        self.assertFalse(m_readv.called)
+        self.assertTrue(tr._closing)
+        self.assertFalse(self.loop.readers)
+        test_utils.run_briefly(self.loop)
+        exc = protocol.connection_lost.call_args[0][0]
+        self.assertIsInstance(exc, RuntimeError)
+
     @unittest.mock.patch('os.read')
     def test__read_ready_eof(self, m_read):
         tr = unix_events._UnixReadPipeTransport(
@@ -539,6 +666,40 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         self.loop.assert_writer(5, tr._write_ready)
         self.assertEqual([b'previous', b'data'], tr._buffer)
 
+    @unittest.mock.patch('os.write')
+    def test_write_bytearray_partial(self, m_write):
+        tr = unix_events._UnixWritePipeTransport(
+            self.loop, self.pipe, self.protocol)
+
+        data = bytearray(b'data')
+        m_write.return_value = 1
+        tr.write(data)
+        self.assertIs(data, m_write.call_args[0][1].obj)
+        data[:] = b'xxxx'
+        self.assertEqual([b'ata'], tr._buffer)
+        self.assertIsInstance(tr._buffer[0], bytes)
+
+    @unittest.mock.patch('os.write')
+    def test_write_pause_resume_writing(self, m_write):
+        tr = unix_events._UnixWritePipeTransport(
+            self.loop, self.pipe, self.protocol)
+        tr.set_write_buffer_limits(high=3, low=1)
+
+        m_write.return_value = 0
+        tr.write(b'data')
+        self.assertEqual(4, tr.get_write_buffer_size())
+        self.protocol.pause_writing.assert_called_with()
+
+        m_write.return_value = 2
+        tr._write_ready()
+        self.assertEqual(2, tr.get_write_buffer_size())
+        self.assertFalse(self.protocol.resume_writing.called)
+
+        tr._write_ready()
+        self.assertEqual(0, tr.get_write_buffer_size())
+        self.protocol.resume_writing.assert_called_with()
+        self.assertFalse(self.loop.writers)
+
     @unittest.mock.patch('os.write')
     def test_write_again(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
@@ -597,7 +758,7 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         test_utils.run_briefly(self.loop)
         self.protocol.connection_lost.assert_called_with(None)
 
-    @unittest.mock.patch('os.write')
+    @unittest.mock.patch('os.writev')
     def test__write_ready(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
             self.loop, self.pipe, self.protocol)
@@ -605,11 +766,11 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         tr._buffer = [b'da', b'ta']
         m_write.return_value = 4
         tr._write_ready()
-        m_write.assert_called_with(5, b'data')
+        m_write.assert_called_with(5, [b'da', b'ta'])
         self.assertFalse(self.loop.writers)
         self.assertEqual([], tr._buffer)
 
-    @unittest.mock.patch('os.write')
+    @unittest.mock.patch('os.writev')
     def test__write_ready_partial(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
             self.loop, self.pipe, self.protocol)
@@ -618,11 +779,11 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         tr._buffer = [b'da', b'ta']
         m_write.return_value = 3
         tr._write_ready()
-        m_write.assert_called_with(5, b'data')
+        m_write.assert_called_with(5, [b'da', b'ta'])
         self.loop.assert_writer(5, tr._write_ready)
         self.assertEqual([b'a'], tr._buffer)
 
-    @unittest.mock.patch('os.write')
+    @unittest.mock.patch('os.writev')
     def test__write_ready_again(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
             self.loop, self.pipe, self.protocol)
@@ -631,11 +792,11 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         tr._buffer = [b'da', b'ta']
         m_write.side_effect = BlockingIOError()
         tr._write_ready()
-        m_write.assert_called_with(5, b'data')
+        m_write.assert_called_with(5, [b'da', b'ta'])
         self.loop.assert_writer(5, tr._write_ready)
-        self.assertEqual([b'data'], tr._buffer)
+        self.assertEqual([b'da', b'ta'], tr._buffer)
 
-    @unittest.mock.patch('os.write')
+    @unittest.mock.patch('os.writev')
     def test__write_ready_empty(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
             self.loop, self.pipe, self.protocol)
@@ -644,12 +805,12 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         tr._buffer = [b'da', b'ta']
         m_write.return_value = 0
         tr._write_ready()
-        m_write.assert_called_with(5, b'data')
+        m_write.assert_called_with(5, [b'da', b'ta'])
         self.loop.assert_writer(5, tr._write_ready)
-        self.assertEqual([b'data'], tr._buffer)
+        self.assertEqual([b'da', b'ta'], tr._buffer)
 
     @unittest.mock.patch('tulip.log.tulip_log.exception')
-    @unittest.mock.patch('os.write')
+    @unittest.mock.patch('os.writev')
     def test__write_ready_err(self, m_write, m_logexc):
         tr = unix_events._UnixWritePipeTransport(
             self.loop, self.pipe, self.protocol)
@@ -658,7 +819,7 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         tr._buffer = [b'da', b'ta']
         m_write.side_effect = err = OSError()
         tr._write_ready()
-        m_write.assert_called_with(5, b'data')
+        m_write.assert_called_with(5, [b'da', b'ta'])
         self.assertFalse(self.loop.writers)
         self.assertFalse(self.loop.readers)
         self.assertEqual([], tr._buffer)
@@ -668,7 +829,7 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         test_utils.run_briefly(self.loop)
         self.protocol.connection_lost.assert_called_with(err)
 
-    @unittest.mock.patch('os.write')
+    @unittest.mock.patch('os.writev')
     def test__write_ready_closing(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
             self.loop, self.pipe, self.protocol)
@@ -678,13 +839,30 @@ class UnixWritePipeTransportTests(unittest.TestCase):
         tr._buffer = [b'da', b'ta']
         m_write.return_value = 4
         tr._write_ready()
-        m_write.assert_called_with(5, b'data')
+        m_write.assert_called_with(5, [b'da', b'ta'])
         self.assertFalse(self.loop.writers)
         self.assertFalse(self.loop.readers)
         self.assertEqual([], tr._buffer)
         self.protocol.connection_lost.assert_called_with(None)
         self.pipe.close.assert_called_with()
 
+    @unittest.mock.patch('os.writev')
+    def test_writelines(self, m_writev):
+        tr = unix_events._UnixWritePipeTransport(
+            self.loop, self.pipe, self.protocol)
+
+        m_writev.return_value = 5
+        tr.writelines([b'data', b'', b'more'])
+        m_writev.assert_called_with(5, [b'data', b'more'])
+        self.loop.assert_writer(5, tr._write_ready)
+        self.assertEqual([b'ore'], tr._buffer)
+        self.assertEqual(3, tr.get_write_buffer_size())
+
+        tr.writelines([b'again'])
+        self.assertEqual(1, m_writev.call_count)
+        self.assertEqual([b'ore', b'again'], tr._buffer)
+        self.assertEqual(8, tr.get_write_buffer_size())
+
     @unittest.mock.patch('os.write')
     def test_abort(self, m_write):
         tr = unix_events._UnixWritePipeTransport(
@@ -0,0 +1,153 @@
+"""Tests for uring_events.py"""
+
+import os
+import socket
+import struct
+import unittest
+import unittest.mock
+
+import tulip
+
+from tulip import uring_events
+from tulip import protocols
+from tulip import test_utils
+
+try:
+    uring_events.UringProactor().close()
+except OSError as exc:  # pragma: no cover
+    raise unittest.SkipTest('io_uring not available: {}'.format(exc))
+
+
+class SockaddrTests(unittest.TestCase):
+
+    def test_inet(self):
+        addr = uring_events._sockaddr(socket.AF_INET, ('127.0.0.1', 80))
+        self.assertEqual(16, len(addr))
+        self.assertEqual(struct.pack('!H', 80), addr[2:4])
+        self.assertEqual(b'\x7f\0\0\1', addr[4:8])
+
+    def test_inet6(self):
+        addr = uring_events._sockaddr(socket.AF_INET6, ('::1%lo', 80, 0, 1))
+        self.assertEqual(28, len(addr))
+        self.assertEqual(socket.inet_pton(socket.AF_INET6, '::1'),
+                         addr[8:24])
+
+    def test_unix(self):
+        addr = uring_events._sockaddr(socket.AF_UNIX, '/tmp/sock')
+        self.assertEqual(b'/tmp/sock\0', addr[2:])
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, uring_events._sockaddr, -1, ())
+
+
+class ProactorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = uring_events.ProactorEventLoop()
+        tulip.set_event_loop(None)
+
+    def tearDown(self):
+        self.loop.close()
+        self.loop = None
+
+    def test_close(self):
+        a, b = self.loop._socketpair()
+        trans = self.loop._make_socket_transport(a, protocols.Protocol())
+        f = tulip.async(self.loop.sock_recv(b, 100), loop=self.loop)
+        trans.close()
+        self.loop.run_until_complete(f)
+        self.assertEqual(f.result(), b'')
+        b.close()
+
+    def test_recv_into(self):
+        a, b = self.loop._socketpair()
+        buf = bytearray(10)
+        f = self.loop._proactor.recv_into(a, memoryview(buf)[2:])
+        b.send(b'data')
+        self.assertEqual(4, self.loop.run_until_complete(f))
+        self.assertEqual(b'\0\0data\0\0\0\0', buf)
+        a.close()
+        b.close()
+
+    def test_send_partial(self):
+        # More than fits in the socket buffers: send() resubmits the
+        # rest until everything is written.
+        a, b = self.loop._socketpair()
+        a.setblocking(False)
+        b.setblocking(False)
+        data = os.urandom(4 * 1024 * 1024)
+        f = self.loop.sock_sendall(a, data)
+        received = []
+        while not f.done() or sum(map(len, received)) < len(data):
+            received.append(self.loop.run_until_complete(
+                self.loop.sock_recv(b, 1024 * 1024)))
+        self.assertEqual(len(data), f.result())
+        self.assertEqual(data, b''.join(received))
+        a.close()
+        b.close()
+
+    def test_cancel(self):
+        a, b = self.loop._socketpair()
+        f = self.loop.sock_recv(a, 100)
+        test_utils.run_briefly(self.loop)
+        self.assertEqual(2, len(self.loop._proactor._cache))
+        f.cancel()
+        test_utils.run_briefly(self.loop)
+        # The kernel has let go of the buffer.
+        self.assertEqual(1, len(self.loop._proactor._cache))
+        a.close()
+        b.close()
+
+    def test_cancel_after_accept(self):
+        # The accept completes before the kernel sees the cancel
+        # request: the accepted fd must not leak.
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        client = socket.create_connection(listener.getsockname())
+        proactor = self.loop._proactor
+        with unittest.mock.patch('os.close', wraps=os.close) as m_close:
+            f = proactor.accept(listener)
+            f.cancel()
+            while proactor._cache:
+                proactor.select(1)
+        self.assertTrue(f.cancelled())
+        self.assertEqual(1, m_close.call_count)
+        client.close()
+        listener.close()
+
+    def test_connect_refused(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        address = listener.getsockname()
+        listener.close()
+        sock = socket.socket()
+        sock.setblocking(False)
+        self.assertRaises(ConnectionRefusedError, self.loop.run_until_complete,
+                          self.loop.sock_connect(sock, address))
+        sock.close()
+
+    def test_stop_serving(self):
+        listener = socket.socket()
+        listener.setblocking(False)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        f = self.loop.sock_accept(listener)
+        test_utils.run_briefly(self.loop)
+        self.loop._stop_serving(listener)
+        self.assertTrue(f.cancelled())
+        test_utils.run_briefly(self.loop)
+        self.assertEqual(1, len(self.loop._proactor._cache))
+
+    def test_close_with_pending(self):
+        a, b = self.loop._socketpair()
+        f = self.loop.sock_recv(a, 100)
+        self.loop.close()
+        self.assertTrue(f.cancelled())
+        self.loop = uring_events.ProactorEventLoop()
+        a.close()
+        b.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+"""Minimal ctypes binding for Linux io_uring.
+
+Only what UringProactor needs: set up a ring, queue submission queue
+entries, submit them and wait for completions with a timeout, and
+read the completion queue.  Requires Linux 5.11 or later (for
+IORING_ENTER_EXT_ARG and the socket opcodes).
+
+The ring memory is shared with the kernel.  Stores to it are ordered
+by the CPU on x86; this binding does not issue explicit memory
+barriers, so it is not suitable for weakly ordered architectures.
+"""
+
+import sys
+
+if not sys.platform.startswith('linux'):  # pragma: no cover
+    raise ImportError('io_uring is Linux only')
+
+import ctypes
+import errno
+import mmap
+import os
+import platform
+
+
+__all__ = ['IoUring', 'sqe_address']
+
+
+if platform.machine() not in ('x86_64', 'i686', 'i386'):
+    raise ImportError('io_uring binding needs a strongly ordered CPU')
+
+# The io_uring system call numbers are the same on all architectures.
+NR_io_uring_setup = 425
+NR_io_uring_enter = 426
+
+IORING_OFF_SQ_RING = 0
+IORING_OFF_CQ_RING = 0x8000000
+IORING_OFF_SQES = 0x10000000
+
+IORING_ENTER_GETEVENTS = 1 << 0
+IORING_ENTER_EXT_ARG = 1 << 3
+IORING_FEAT_EXT_ARG = 1 << 8
+
+IORING_OP_NOP = 0
+IORING_OP_ACCEPT = 13
+IORING_OP_ASYNC_CANCEL = 14
+IORING_OP_CONNECT = 16
+IORING_OP_READ = 22
+IORING_OP_WRITE = 23
+IORING_OP_SEND = 26
+IORING_OP_RECV = 27
+
+_u8 = ctypes.c_uint8
+_u16 = ctypes.c_uint16
+_u32 = ctypes.c_uint32
+_u64 = ctypes.c_uint64
+_s32 = ctypes.c_int32
+
+
+class _SQRingOffsets(ctypes.Structure):
+    _fields_ = [('head', _u32), ('tail', _u32), ('ring_mask', _u32),
+                ('ring_entries', _u32), ('flags', _u32), ('dropped', _u32),
+                ('array', _u32), ('resv1', _u32), ('user_addr', _u64)]
+
+
+class _CQRingOffsets(ctypes.Structure):
+    _fields_ = [('head', _u32), ('tail', _u32), ('ring_mask', _u32),
+                ('ring_entries', _u32), ('overflow', _u32), ('cqes', _u32),
+                ('flags', _u32), ('resv1', _u32), ('user_addr', _u64)]
+
+
+class _Params(ctypes.Structure):
+    _fields_ = [('sq_entries', _u32), ('cq_entries', _u32), ('flags', _u32),
+                ('sq_thread_cpu', _u32), ('sq_thread_idle', _u32),
+                ('features', _u32), ('wq_fd', _u32), ('resv', _u32 * 3),
+                ('sq_off', _SQRingOffsets), ('cq_off', _CQRingOffsets)]
+
+
+class _SQE(ctypes.Structure):
+    _fields_ = [('opcode', _u8), ('flags', _u8), ('ioprio', _u16),
+                ('fd', _s32), ('off', _u64), ('addr', _u64), ('len', _u32),
+                ('op_flags', _u32), ('user_data', _u64), ('buf_index', _u16),
+                ('personality', _u16), ('splice_fd_in', _s32),
+                ('pad', _u64 * 2)]
+
+
+class _CQE(ctypes.Structure):
+    _fields_ = [('user_data', _u64), ('res', _s32), ('flags', _u32)]
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_int64), ('tv_nsec', ctypes.c_longlong)]
+
+
+class _GeteventsArg(ctypes.Structure):
+    _fields_ = [('sigmask', _u64), ('sigmask_sz', _u32), ('pad', _u32),
+                ('ts', _u64)]
+
+
+assert ctypes.sizeof(_Params) == 120
+assert ctypes.sizeof(_SQE) == 64
+assert ctypes.sizeof(_CQE) == 16
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_syscall = _libc.syscall
+_syscall.restype = ctypes.c_long
+
+
+def sqe_address(obj):
+    """Return the address of the data of a bytes-like object.
+
+    The object must stay alive, and must not be resized, until the
+    operation using the address has completed.
+    """
+    if isinstance(obj, bytes):
+        return ctypes.cast(ctypes.c_char_p(obj), ctypes.c_void_p).value or 0
+    return ctypes.addressof(ctypes.c_char.from_buffer(obj))
+
+
+class IoUring:
+    """An io_uring instance with a submission and completion queue.
+
+    prepare() returns a zeroed submission queue entry to fill in; the
+    entries are passed to the kernel by the next submit() call.
+    """
+
+    def __init__(self, entries=256):
+        params = _Params()
+        fd = _syscall(NR_io_uring_setup, _u32(entries), ctypes.byref(params))
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        try:
+            if not params.features & IORING_FEAT_EXT_ARG:
+                raise OSError(errno.ENOSYS,
+                              'io_uring without IORING_FEAT_EXT_ARG')
+            self._map(params)
+        except:
+            os.close(fd)
+            raise
+        self._pending = 0  # Prepared but not yet submitted entries.
+        self._arg = _GeteventsArg()
+        self._ts = _Timespec()
+        self._arg.ts = ctypes.addressof(self._ts)
+
+    def _map(self, p):
+        prot = mmap.PROT_READ | mmap.PROT_WRITE
+        sq_size = p.sq_off.array + p.sq_entries * 4
+        cq_size = p.cq_off.cqes + p.cq_entries * ctypes.sizeof(_CQE)
+        self._sq_mm = mmap.mmap(self._fd, sq_size, mmap.MAP_SHARED, prot,
+                                offset=IORING_OFF_SQ_RING)
+        self._cq_mm = mmap.mmap(self._fd, cq_size, mmap.MAP_SHARED, prot,
+                                offset=IORING_OFF_CQ_RING)
+        sqe_size = p.sq_entries * ctypes.sizeof(_SQE)
+        self._sqe_mm = mmap.mmap(self._fd, sqe_size, mmap.MAP_SHARED, prot,
+                                 offset=IORING_OFF_SQES)
+        self._sq_entries = p.sq_entries
+        self._sq_mask = _u32.from_buffer(self._sq_mm, p.sq_off.ring_mask).value
+        self._sq_head = _u32.from_buffer(self._sq_mm, p.sq_off.head)
+        self._sq_tail = _u32.from_buffer(self._sq_mm, p.sq_off.tail)
+        self._sq_array = (_u32 * p.sq_entries).from_buffer(
+            self._sq_mm, p.sq_off.array)
+        self._sqes = (_SQE * p.sq_entries).from_buffer(self._sqe_mm)
+        self._cq_mask = _u32.from_buffer(self._cq_mm, p.cq_off.ring_mask).value
+        self._cq_head = _u32.from_buffer(self._cq_mm, p.cq_off.head)
+        self._cq_tail = _u32.from_buffer(self._cq_mm, p.cq_off.tail)
+        self._cqes = (_CQE * p.cq_entries).from_buffer(
+            self._cq_mm, p.cq_off.cqes)
+        self._tail = self._sq_tail.value
+
+    def fileno(self):
+        return self._fd
+
+    def prepare(self, opcode, fd, user_data, *,
+                addr=0, length=0, off=0, op_flags=0):
+        """Queue a submission queue entry; return it.
+
+        If the submission queue is full, the queued entries are
+        submitted first.
+        """
+        if ((self._tail - self._sq_head.value) & 0xffffffff >=
+                self._sq_entries):
+            self.submit()
+        index = self._tail & self._sq_mask
+        sqe = self._sqes[index]
+        ctypes.memset(ctypes.addressof(sqe), 0, ctypes.sizeof(_SQE))
+        sqe.opcode = opcode
+        sqe.fd = fd
+        sqe.user_data = user_data
+        sqe.addr = addr
+        sqe.len = length
+        sqe.off = off
+        sqe.op_flags = op_flags
+        self._sq_array[index] = index
+        self._tail = (self._tail + 1) & 0xffffffff
+        self._sq_tail.value = self._tail
+        self._pending += 1
+        return sqe
+
+    def submit(self, wait=False, timeout=None):
+        """Submit the queued entries.
+
+        If wait is true, also wait until at least one completion is
+        available or timeout seconds have passed (forever if timeout
+        is None).  Return the number of entries submitted.
+        """
+        flags = 0
+        min_complete = 0
+        arg = None
+        argsize = 0
+        if wait:
+            flags |= IORING_ENTER_GETEVENTS
+            min_complete = 1
+            if timeout is not None:
+                flags |= IORING_ENTER_EXT_ARG
+                sec = int(timeout)
+                self._ts.tv_sec = sec
+                self._ts.tv_nsec = int((timeout - sec) * 1e9)
+                arg = ctypes.byref(self._arg)
+                argsize = ctypes.sizeof(_GeteventsArg)
+        elif not self._pending:
+            return 0
+        res = _syscall(NR_io_uring_enter, ctypes.c_int(self._fd),
+                       _u32(self._pending), _u32(min_complete),
+                       _u32(flags), arg, ctypes.c_size_t(argsize))
+        if res < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EINTR, errno.ETIME, errno.EBUSY):
+                # Some entries may still have been consumed.
+                res = self._pending - (
+                    (self._tail - self._sq_head.value) & 0xffffffff)
+            else:
+                raise OSError(err, os.strerror(err))
+        self._pending -= res
+        return res
+
+    def completions(self):
+        """Return and consume the available (user_data, res) pairs."""
+        result = []
+        head = self._cq_head.value
+        tail = self._cq_tail.value
+        while head != tail:
+            cqe = self._cqes[head & self._cq_mask]
+            result.append((cqe.user_data, cqe.res))
+            head = (head + 1) & 0xffffffff
+        self._cq_head.value = head
+        return result
+
+    def close(self):
+        if self._fd < 0:
+            return
+        # Drop the views into the mappings before unmapping them.
+        self._sq_head = self._sq_tail = self._sq_array = self._sqes = None
+        self._cq_head = self._cq_tail = self._cqes = None
+        self._sq_mm.close()
+        self._cq_mm.close()
+        self._sqe_mm.close()
+        os.close(self._fd)
+        self._fd = -1
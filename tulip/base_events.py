@@ -16,8 +16,9 @@ to modify the meaning of the API call itself.
 
 import collections
 import concurrent.futures
+import errno
 import heapq
-import logging
+import itertools
 import socket
 import subprocess
 import time
@@ -26,16 +27,27 @@ import sys
 
 from . import events
 from . import futures
+from . import monitor
 from . import tasks
+from . import timers
 from .log import tulip_log
 
 
-__all__ = ['BaseEventLoop', 'Server']
+__all__ = ['BaseEventLoop', 'Server', 'ResolverCache']
 
 
 # Argument for default thread pool executor creation.
 _MAX_WORKERS = 5
 
+# Rebuild the timer heap when more than this fraction of it consists
+# of cancelled TimerHandles, but don't bother for tiny heaps.
+_CANCELLED_TIMER_FRACTION = 0.5
+_MIN_TIMERS_TO_PURGE = 100
+
+# Size of the chunks in which a file is read when it cannot be sent
+# with os.sendfile().
+_SENDFILE_CHUNK_SIZE = 256 * 1024
+
 
 class _StopError(BaseException):
     """Raised to stop the event loop."""
@@ -45,33 +57,237 @@ def _raise_stop_error(*args):
     raise _StopError
 
 
+class _SendfileNotAvailable(RuntimeError):
+    """Raised when a file cannot be sent with os.sendfile()."""
+
+
+def _interleave_addrinfos(addrinfos, first_family_count=1):
+    """Reorder getaddrinfo() results to alternate address families.
+
+    The first first_family_count addresses of the first family come
+    first, as recommended by RFC 8305.
+    """
+    by_family = collections.OrderedDict()
+    for info in addrinfos:
+        by_family.setdefault(info[0], []).append(info)
+    lists = list(by_family.values())
+    reordered = lists[0][:first_family_count - 1]
+    del lists[0][:first_family_count - 1]
+    reordered.extend(
+        info for info in itertools.chain.from_iterable(
+            itertools.zip_longest(*lists))
+        if info is not None)
+    return reordered
+
+
+def _copy_exception(exc):
+    # A new instance for each Future that gets the error, so that
+    # raising it in one task does not add to the traceback and
+    # context seen by the others.
+    try:
+        return type(exc)(*exc.args)
+    except Exception:
+        return exc
+
+
+def _check_reuse_port():
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise ValueError('reuse_port not supported by socket module')
+
+
+class ResolverCache:
+    """Cache of getaddrinfo() results.
+
+    Results are stored under the getaddrinfo() arguments for ttl
+    seconds, and errors (and empty results) for negative_ttl seconds;
+    at most maxsize entries are kept, the least recently used one is
+    dropped first.  The event loop also uses the cache to merge
+    identical lookups: while one is running in the executor, the
+    others wait for its result instead of starting their own.
+
+    hits and misses count lookups that did or did not find an entry,
+    merges the lookups that waited for a running one.
+    """
+
+    def __init__(self, maxsize=256, ttl=10.0, negative_ttl=1.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Maps a key to (expiry time, result, exception type and args).
+        self._entries = collections.OrderedDict()
+        # Maps the key of a running lookup to its waiting Futures.
+        self._waiters = {}
+        self.hits = 0
+        self.misses = 0
+        self.merges = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now):
+        """Return (result, exception) stored under key, or None."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        expiry, result, error = entry
+        if error is None:
+            return result, None
+        # A fresh exception each time; see _copy_exception().
+        exc_type, args = error
+        return result, exc_type(*args)
+
+    def put(self, key, now, result=None, exception=None):
+        """Store the result or the exception of a lookup under key."""
+        ttl = self.ttl if result else self.negative_ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        # Keep the type and args only, not the exception with its
+        # traceback.
+        if exception is not None:
+            exception = (type(exception), exception.args)
+        self._entries[key] = (now + ttl, result, exception)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget all entries; the counters are kept."""
+        self._entries.clear()
+
+    def get_stats(self):
+        """Return a dict with the size of the cache and the counters."""
+        return {'cached': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'merges': self.merges,
+                }
+
+
 class Server(events.AbstractServer):
 
-    def __init__(self, loop, sockets):
+    def __init__(self, loop, sockets, protocol_factory=None, ssl=None, *,
+                 max_connections=None, max_accept_rate=None):
         self.loop = loop
         self.sockets = sockets
         self.active_count = 0
         self.waiters = []
+        self._protocol_factory = protocol_factory
+        self._ssl = ssl
+        # Called with (conn, addr, protocol_factory, ssl) for each
+        # accepted socket instead of making a transport for it
+        # in this loop; see selector_events.LoopGroup.
+        self._handoff = None
+        # Admission control: accepting stops when max_connections
+        # transports are attached and starts again when the count has
+        # dropped to the low-water mark.  max_accept_rate is enforced
+        # with a token bucket holding up to one second's worth of
+        # connections.
+        self.max_connections = max_connections
+        if max_connections is not None:
+            self._low_water = max_connections * 9 // 10
+        self.max_accept_rate = max_accept_rate
+        if max_accept_rate is not None:
+            self._tokens = self._burst = max(1.0, max_accept_rate)
+            self._tokens_time = loop.time()
+        self._rate_timer = None
+        self._paused = False
+        self._paused_since = None
+        self._pauses = 0
+        self._paused_time = 0.0
 
     def attach(self, transport):
         assert self.sockets is not None
         self.active_count += 1
+        if self.max_accept_rate is not None:
+            self._refill()
+            self._tokens -= 1
+        self._maybe_pause()
 
     def detach(self, transport):
         assert self.active_count > 0
         self.active_count -= 1
         if self.active_count == 0 and self.sockets is None:
             self._wakeup()
+        elif self._paused:
+            self._maybe_resume()
 
     def close(self):
         sockets = self.sockets
         if sockets is not None:
             self.sockets = None
+            if self._rate_timer is not None:
+                self._rate_timer.cancel()
+                self._rate_timer = None
+            if self._paused:
+                self._paused = False
+                self._paused_time += self.loop.time() - self._paused_since
             for sock in sockets:
                 self.loop._stop_serving(sock)
             if self.active_count == 0:
                 self._wakeup()
 
+    def get_stats(self):
+        """Return a dict of admission control counters.
+
+        'pauses' is how often accepting was stopped because of
+        max_connections or max_accept_rate, and 'paused_time' the
+        total number of seconds it stayed stopped.
+        """
+        paused_time = self._paused_time
+        if self._paused:
+            paused_time += self.loop.time() - self._paused_since
+        return {'active_count': self.active_count,
+                'paused': self._paused,
+                'pauses': self._pauses,
+                'paused_time': paused_time,
+                }
+
+    def _refill(self):
+        now = self.loop.time()
+        self._tokens = min(self._burst, self._tokens + self.max_accept_rate *
+                           (now - self._tokens_time))
+        self._tokens_time = now
+
+    def _over_limit(self):
+        if (self.max_accept_rate is not None and self._tokens < 1 and
+                self._rate_timer is None):
+            self._rate_timer = self.loop.call_later(
+                (1 - self._tokens) / self.max_accept_rate, self._rate_ready)
+        if self._rate_timer is not None:
+            return True
+        if self.max_connections is None:
+            return False
+        if self._paused:
+            return self.active_count > self._low_water
+        return self.active_count >= self.max_connections
+
+    def _maybe_pause(self):
+        if self._paused or self.sockets is None or not self._over_limit():
+            return
+        self._paused = True
+        self._paused_since = self.loop.time()
+        self._pauses += 1
+        for sock in self.sockets:
+            self.loop._pause_serving(sock)
+
+    def _maybe_resume(self):
+        if not self._paused or self.sockets is None or self._over_limit():
+            return
+        self._paused = False
+        self._paused_time += self.loop.time() - self._paused_since
+        for sock in self.sockets:
+            self.loop._start_serving(self._protocol_factory, sock,
+                                     self._ssl, self)
+
+    def _rate_ready(self):
+        self._rate_timer = None
+        self._refill()
+        self._maybe_resume()
+
     def _wakeup(self):
         waiters = self.waiters
         self.waiters = None
@@ -93,15 +309,28 @@ class BaseEventLoop(events.AbstractEventLoop):
     def __init__(self):
         self._ready = collections.deque()
         self._scheduled = []
+        self._timer_wheel = None
+        self._timer_cancelled_count = 0
+        self._timer_purges = 0
+        self._instrument = None
         self._default_executor = None
         self._internal_fds = 0
         self._running = False
+        self._resolver_cache = ResolverCache()
 
     def _make_socket_transport(self, sock, protocol, waiter=None, *,
                                extra=None, server=None):
         """Create socket transport."""
         raise NotImplementedError
 
+    # Whether _pause_serving() is implemented, which create_server()
+    # needs for max_connections and max_accept_rate.
+    _can_pause_serving = False
+
+    def _pause_serving(self, sock):
+        """Stop accepting on sock until _start_serving() is called again."""
+        raise NotImplementedError
+
     def _make_ssl_transport(self, rawsock, protocol, sslcontext, waiter, *,
                             server_side=False, server_hostname=None,
                             extra=None, server=None):
@@ -138,6 +367,10 @@ class BaseEventLoop(events.AbstractEventLoop):
         """XXX"""
         raise NotImplementedError
 
+    def _poll_events(self, timeout):
+        """Wait for I/O; return the events for _process_events()."""
+        return self._selector.select(timeout)
+
     def _process_events(self, event_list):
         """Process selector events."""
         raise NotImplementedError
@@ -213,10 +446,92 @@ class BaseEventLoop(events.AbstractEventLoop):
 
     def call_at(self, when, callback, *args):
         """Like call_later(), but uses an absolute time."""
-        timer = events.TimerHandle(when, callback, args)
-        heapq.heappush(self._scheduled, timer)
+        timer = events.TimerHandle(when, callback, args, self)
+        if self._timer_wheel is not None:
+            self._timer_wheel.push(timer)
+        else:
+            timer._scheduled = True
+            heapq.heappush(self._scheduled, timer)
         return timer
 
+    def _timer_handle_cancelled(self, handle):
+        """Notification that a TimerHandle has been cancelled."""
+        if self._timer_wheel is not None:
+            self._timer_wheel.discard(handle)
+        elif handle._scheduled:
+            self._timer_cancelled_count += 1
+
+    def _purge_cancelled_timers(self):
+        """Rebuild the timer heap without the cancelled TimerHandles."""
+        scheduled = []
+        for handle in self._scheduled:
+            if handle._cancelled:
+                handle._scheduled = False
+            else:
+                scheduled.append(handle)
+        heapq.heapify(scheduled)
+        self._scheduled = scheduled
+        self._timer_cancelled_count = 0
+        self._timer_purges += 1
+
+    def set_timer_wheel(self, wheel):
+        """Schedule timers in a TimerWheel instead of a heap.
+
+        Pass a timers.TimerWheel instance, or None to switch back to
+        the heap.  Timers that are already scheduled are moved over.
+        """
+        assert wheel is None or isinstance(wheel, timers.TimerWheel), wheel
+        if self._timer_wheel is not None:
+            pending = self._timer_wheel.clear()
+        else:
+            pending = self._scheduled
+        pending = [handle for handle in pending if not handle._cancelled]
+        self._scheduled = []
+        self._timer_cancelled_count = 0
+        self._timer_wheel = wheel
+        if wheel is not None:
+            wheel.reset(self.time())
+            for handle in pending:
+                handle._scheduled = False
+                wheel.push(handle)
+        else:
+            for handle in pending:
+                handle._scheduled = True
+            heapq.heapify(pending)
+            self._scheduled = pending
+
+    def set_instrument(self, instrument):
+        """Report per-iteration measurements to a monitor.LoopInstrument.
+
+        Pass None to stop measuring.
+        """
+        assert (instrument is None or
+                isinstance(instrument, monitor.LoopInstrument)), instrument
+        self._instrument = instrument
+
+    def get_stats(self):
+        """Return a dict of counters describing the loop's state.
+
+        'timers' is the number of entries in the timer queue and
+        'timers_cancelled' how many of those are cancelled handles
+        waiting to be purged; 'timer_purges' counts how often the
+        heap has been rebuilt to get rid of them.  The 'resolver_*'
+        entries are those of the ResolverCache.get_stats().
+        """
+        if self._timer_wheel is not None:
+            size, cancelled = len(self._timer_wheel), 0
+        else:
+            size = len(self._scheduled)
+            cancelled = self._timer_cancelled_count
+        stats = {'timers': size,
+                 'timers_cancelled': cancelled,
+                 'timer_purges': self._timer_purges,
+                 }
+        if self._resolver_cache is not None:
+            for name, value in self._resolver_cache.get_stats().items():
+                stats['resolver_' + name] = value
+        return stats
+
     def call_soon(self, callback, *args):
         """Arrange for a callback to be called as soon as possible.
 
@@ -256,18 +571,114 @@ class BaseEventLoop(events.AbstractEventLoop):
     def set_default_executor(self, executor):
         self._default_executor = executor
 
+    def set_resolver_cache(self, cache):
+        """Set the cache of getaddrinfo() results.
+
+        Pass a ResolverCache instance, or None to turn caching off.
+        By default each loop caches up to 256 results for 10 seconds,
+        and errors for 1 second.
+        """
+        self._resolver_cache = cache
+
     def getaddrinfo(self, host, port, *,
-                    family=0, type=0, proto=0, flags=0):
-        return self.run_in_executor(None, socket.getaddrinfo,
-                                    host, port, family, type, proto, flags)
+                    family=0, type=0, proto=0, flags=0, cache=True):
+        resolver = self._resolver_cache if cache else None
+        if resolver is None:
+            return self.run_in_executor(None, socket.getaddrinfo, host,
+                                        port, family, type, proto, flags)
+        key = (host, port, family, type, proto, flags)
+        fut = futures.Future(loop=self)
+        entry = resolver.get(key, self.time())
+        if entry is not None:
+            resolver.hits += 1
+            result, exception = entry
+            if exception is None:
+                fut.set_result(list(result))
+            else:
+                fut.set_exception(exception)
+        elif key in resolver._waiters:
+            resolver.merges += 1
+            resolver._waiters[key].append(fut)
+        else:
+            resolver.misses += 1
+            resolver._waiters[key] = [fut]
+            lookup = self.run_in_executor(None, socket.getaddrinfo, host,
+                                          port, family, type, proto, flags)
+            lookup.add_done_callback(
+                lambda lookup: self._getaddrinfo_done(resolver, key, lookup))
+        return fut
+
+    def _getaddrinfo_done(self, cache, key, lookup):
+        waiters = cache._waiters.pop(key)
+        if lookup.cancelled():
+            exception = futures.CancelledError()
+            result = None
+        else:
+            exception = lookup.exception()
+            result = None if exception is not None else lookup.result()
+            if exception is None or isinstance(exception, OSError):
+                cache.put(key, self.time(), result, exception)
+        for fut in waiters:
+            if fut.cancelled():
+                continue
+            if exception is None:
+                fut.set_result(list(result))
+            else:
+                fut.set_exception(_copy_exception(exception))
 
     def getnameinfo(self, sockaddr, flags=0):
         return self.run_in_executor(None, socket.getnameinfo, sockaddr, flags)
 
+    @tasks.coroutine
+    def sock_sendfile(self, sock, file, offset=0, count=None):
+        """Send a file over a connected socket.
+
+        count bytes of file, which must be opened in binary mode, are
+        sent starting at offset; if count is None, the rest of the
+        file is sent.  os.sendfile() is used where the event loop and
+        the file support it, otherwise the file is read in chunks that
+        are passed to sock_sendall().  Afterwards the file position is
+        just past the last byte sent.  Return the number of bytes sent.
+        """
+        if offset < 0:
+            raise ValueError('offset must be >= 0')
+        if count is not None and count < 0:
+            raise ValueError('count must be None or >= 0')
+        try:
+            total = yield from self._sock_sendfile_native(
+                sock, file, offset, count)
+        except _SendfileNotAvailable:
+            total = yield from self._sock_sendfile_fallback(
+                sock, file, offset, count)
+        return total
+
+    @tasks.coroutine
+    def _sock_sendfile_native(self, sock, file, offset, count):
+        raise _SendfileNotAvailable(
+            '{} does not support os.sendfile()'.format(
+                self.__class__.__name__))
+
+    @tasks.coroutine
+    def _sock_sendfile_fallback(self, sock, file, offset, count):
+        file.seek(offset)
+        total = 0
+        while count is None or total < count:
+            size = _SENDFILE_CHUNK_SIZE
+            if count is not None:
+                size = min(size, count - total)
+            data = file.read(size)
+            if not data:
+                break
+            yield from self.sock_sendall(sock, data)
+            total += len(data)
+        return total
+
     @tasks.coroutine
     def create_connection(self, protocol_factory, host=None, port=None, *,
                           ssl=None, family=0, proto=0, flags=0, sock=None,
-                          local_addr=None):
+                          local_addr=None, happy_eyeballs_delay=None,
+                          interleave=None, connect_timeout=None,
+                          cache_addrinfo=True):
         """XXX"""
         if host is not None or port is not None:
             if sock is not None:
@@ -276,12 +687,14 @@ class BaseEventLoop(events.AbstractEventLoop):
 
             f1 = self.getaddrinfo(
                 host, port, family=family,
-                type=socket.SOCK_STREAM, proto=proto, flags=flags)
+                type=socket.SOCK_STREAM, proto=proto, flags=flags,
+                cache=cache_addrinfo)
             fs = [f1]
             if local_addr is not None:
                 f2 = self.getaddrinfo(
                     *local_addr, family=family,
-                    type=socket.SOCK_STREAM, proto=proto, flags=flags)
+                    type=socket.SOCK_STREAM, proto=proto, flags=flags,
+                    cache=cache_addrinfo)
                 fs.append(f2)
             else:
                 f2 = None
@@ -291,40 +704,29 @@ class BaseEventLoop(events.AbstractEventLoop):
             infos = f1.result()
             if not infos:
                 raise OSError('getaddrinfo() returned empty list')
+            laddr_infos = None
             if f2 is not None:
                 laddr_infos = f2.result()
                 if not laddr_infos:
                     raise OSError('getaddrinfo() returned empty list')
 
+            if interleave is None and happy_eyeballs_delay is not None:
+                interleave = 1
+            if interleave:
+                infos = _interleave_addrinfos(infos, interleave)
+
             exceptions = []
-            for family, type, proto, cname, address in infos:
-                try:
-                    sock = socket.socket(family=family, type=type, proto=proto)
-                    sock.setblocking(False)
-                    if f2 is not None:
-                        for _, _, _, _, laddr in laddr_infos:
-                            try:
-                                sock.bind(laddr)
-                                break
-                            except OSError as exc:
-                                exc = OSError(
-                                    exc.errno, 'error while '
-                                    'attempting to bind on address '
-                                    '{!r}: {}'.format(
-                                        laddr, exc.strerror.lower()))
-                                exceptions.append(exc)
-                        else:
-                            sock.close()
-                            sock = None
-                            continue
-                    yield from self.sock_connect(sock, address)
-                except OSError as exc:
+            if happy_eyeballs_delay is None:
+                for info in infos:
+                    sock = yield from self._connect_sock(
+                        exceptions, info, laddr_infos, connect_timeout)
                     if sock is not None:
-                        sock.close()
-                    exceptions.append(exc)
-                else:
-                    break
+                        break
             else:
+                sock = yield from self._connect_staggered(
+                    exceptions, infos, laddr_infos, happy_eyeballs_delay,
+                    connect_timeout)
+            if sock is None:
                 if len(exceptions) == 1:
                     raise exceptions[0]
                 else:
@@ -356,11 +758,105 @@ class BaseEventLoop(events.AbstractEventLoop):
         yield from waiter
         return transport, protocol
 
+    @tasks.coroutine
+    def _connect_sock(self, exceptions, addr_info, laddr_infos=None,
+                      timeout=None):
+        """Create a socket and connect it to the address in addr_info.
+
+        Return the connected socket, or None after adding the errors
+        to exceptions.
+        """
+        family, type, proto, _, address = addr_info
+        sock = connect_fut = None
+        try:
+            sock = socket.socket(family=family, type=type, proto=proto)
+            sock.setblocking(False)
+            if laddr_infos is not None:
+                for _, _, _, _, laddr in laddr_infos:
+                    try:
+                        sock.bind(laddr)
+                        break
+                    except OSError as exc:
+                        exc = OSError(
+                            exc.errno, 'error while '
+                            'attempting to bind on address '
+                            '{!r}: {}'.format(
+                                laddr, exc.strerror.lower()))
+                        exceptions.append(exc)
+                else:
+                    sock.close()
+                    return None
+            connect_fut = self.sock_connect(sock, address)
+            if timeout is None:
+                yield from connect_fut
+            else:
+                try:
+                    yield from tasks.wait_for(connect_fut, timeout, loop=self)
+                except futures.TimeoutError:
+                    raise TimeoutError(
+                        errno.ETIMEDOUT,
+                        'timed out connecting to {!r}'.format(address)
+                        ) from None
+            return sock
+        except BaseException as exc:
+            if sock is not None:
+                if connect_fut is None or (connect_fut.done() and
+                                           not connect_fut.cancelled()):
+                    sock.close()
+                else:
+                    # The loop stops waiting for the socket when the
+                    # connect is cancelled; close it after that.
+                    connect_fut.cancel()
+                    self.call_soon(sock.close)
+            if not isinstance(exc, OSError):
+                raise
+            exceptions.append(exc)
+            return None
+
+    @tasks.coroutine
+    def _connect_staggered(self, exceptions, infos, laddr_infos, delay,
+                           timeout):
+        """Race connection attempts, as in RFC 8305 (Happy Eyeballs).
+
+        A new attempt starts every delay seconds, or as soon as one
+        fails.  Return the first connected socket, after cancelling
+        the other attempts, or None if all of them failed.
+        """
+        infos = collections.deque(infos)
+        pending = set()
+        winner = None
+        try:
+            while winner is None and (infos or pending):
+                wait_timeout = None
+                if infos:
+                    pending.add(tasks.async(self._connect_sock(
+                        exceptions, infos.popleft(), laddr_infos, timeout),
+                        loop=self))
+                    wait_timeout = delay
+                done, pending = yield from tasks.wait(
+                    pending, loop=self, timeout=wait_timeout,
+                    return_when=tasks.FIRST_COMPLETED)
+                for fut in done:
+                    sock = fut.result()
+                    if sock is None:
+                        continue
+                    if winner is None:
+                        winner = sock
+                    else:
+                        sock.close()
+        finally:
+            for fut in pending:
+                fut.cancel()
+        return winner
+
     @tasks.coroutine
     def create_datagram_endpoint(self, protocol_factory,
                                  local_addr=None, remote_addr=None, *,
-                                 family=0, proto=0, flags=0):
+                                 family=0, proto=0, flags=0,
+                                 reuse_port=None, cache_addrinfo=True):
         """Create datagram connection."""
+        if reuse_port:
+            _check_reuse_port()
         if not (local_addr or remote_addr):
             if family == 0:
                 raise ValueError('unexpected address family')
@@ -375,7 +871,7 @@ class BaseEventLoop(events.AbstractEventLoop):
 
                     infos = yield from self.getaddrinfo(
                         *addr, family=family, type=socket.SOCK_DGRAM,
-                        proto=proto, flags=flags)
+                        proto=proto, flags=flags, cache=cache_addrinfo)
                     if not infos:
                         raise OSError('getaddrinfo() returned empty list')
 
@@ -404,6 +900,8 @@ class BaseEventLoop(events.AbstractEventLoop):
                 sock = socket.socket(
                     family=family, type=socket.SOCK_DGRAM, proto=proto)
                 sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                if reuse_port:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
                 sock.setblocking(False)
 
                 if local_addr:
@@ -432,8 +930,23 @@ class BaseEventLoop(events.AbstractEventLoop):
                       sock=None,
                       backlog=100,
                       ssl=None,
-                      reuse_address=None):
+                      reuse_address=None,
+                      max_connections=None,
+                      max_accept_rate=None,
+                      reuse_port=None,
+                      cache_addrinfo=True):
         """XXX"""
+        if reuse_port:
+            _check_reuse_port()
+        if max_connections is not None or max_accept_rate is not None:
+            if not self._can_pause_serving:
+                raise NotImplementedError(
+                    'max_connections and max_accept_rate are not '
+                    'supported by %s' % self.__class__.__name__)
+            if max_connections is not None and max_connections < 1:
+                raise ValueError('max_connections must be at least 1')
+            if max_accept_rate is not None and max_accept_rate <= 0:
+                raise ValueError('max_accept_rate must be positive')
         if host is not None or port is not None:
             if sock is not None:
                 raise ValueError(
@@ -448,7 +961,8 @@ class BaseEventLoop(events.AbstractEventLoop):
 
             infos = yield from self.getaddrinfo(
                 host, port, family=family,
-                type=socket.SOCK_STREAM, proto=0, flags=flags)
+                type=socket.SOCK_STREAM, proto=0, flags=flags,
+                cache=cache_addrinfo)
             if not infos:
                 raise OSError('getaddrinfo() returned empty list')
 
@@ -461,6 +975,9 @@ class BaseEventLoop(events.AbstractEventLoop):
                     if reuse_address:
                         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR,
                                         True)
+                    if reuse_port:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT,
+                                        True)
                     # Disable IPv4/IPv6 dual stack support (enabled by
                     # default on Linux) which makes a single socket
                     # listen on both address families.
@@ -485,7 +1002,9 @@ class BaseEventLoop(events.AbstractEventLoop):
                     'host and port was not specified and no sock specified')
             sockets = [sock]
 
-        server = Server(self, sockets)
+        server = Server(self, sockets, protocol_factory, ssl,
+                        max_connections=max_connections,
+                        max_accept_rate=max_accept_rate)
         for sock in sockets:
             sock.listen(backlog)
             sock.setblocking(False)
@@ -539,7 +1058,11 @@ class BaseEventLoop(events.AbstractEventLoop):
         if handle._cancelled:
             return
         if isinstance(handle, events.TimerHandle):
-            heapq.heappush(self._scheduled, handle)
+            if self._timer_wheel is not None:
+                self._timer_wheel.push(handle)
+            else:
+                handle._scheduled = True
+                heapq.heappush(self._scheduled, handle)
         else:
             self._ready.append(handle)
 
@@ -555,13 +1078,27 @@ class BaseEventLoop(events.AbstractEventLoop):
         schedules the resulting callbacks, and finally schedules
         'call_later' callbacks.
         """
-        # Remove delayed calls that were cancelled from head of queue.
+        wheel = self._timer_wheel
+
+        # Get rid of cancelled delayed calls; if there are many of
+        # them, rebuild the heap, else just pop them from its head.
+        if (self._timer_cancelled_count > _MIN_TIMERS_TO_PURGE and
+            self._timer_cancelled_count >
+                _CANCELLED_TIMER_FRACTION * len(self._scheduled)):
+            self._purge_cancelled_timers()
         while self._scheduled and self._scheduled[0]._cancelled:
-            heapq.heappop(self._scheduled)
+            handle = heapq.heappop(self._scheduled)
+            handle._scheduled = False
+            if handle._loop is self:
+                self._timer_cancelled_count -= 1
 
         timeout = None
         if self._ready:
             timeout = 0
+        elif wheel is not None:
+            when = wheel.next_deadline()
+            if when is not None:
+                timeout = max(0, when - self.time())
         elif self._scheduled:
             # Compute the desired timeout.
             when = self._scheduled[0]._when
@@ -571,25 +1108,28 @@ class BaseEventLoop(events.AbstractEventLoop):
             else:
                 timeout = min(timeout, deadline)
 
-        # TODO: Instrumentation only in debug mode?
-        t0 = self.time()
-        event_list = self._selector.select(timeout)
-        t1 = self.time()
-        argstr = '' if timeout is None else '{:.3f}'.format(timeout)
-        if t1-t0 >= 1:
-            level = logging.INFO
+        instrument = self._instrument
+        if instrument is None:
+            event_list = self._poll_events(timeout)
         else:
-            level = logging.DEBUG
-        tulip_log.log(level, 'poll%s took %.3f seconds', argstr, t1-t0)
+            t0 = self.time()
+            event_list = self._poll_events(timeout)
+            poll_time = self.time() - t0
         self._process_events(event_list)
 
         # Handle 'later' callbacks that are ready.
+        nready = len(self._ready)
         now = self.time()
+        if wheel is not None:
+            self._ready.extend(wheel.pop_expired(now))
         while self._scheduled:
             handle = self._scheduled[0]
             if handle._when > now:
                 break
             handle = heapq.heappop(self._scheduled)
+            handle._scheduled = False
+            if handle._cancelled and handle._loop is self:
+                self._timer_cancelled_count -= 1
             self._ready.append(handle)
 
         # This is the only place where callbacks are actually *called*.
@@ -599,8 +1139,30 @@ class BaseEventLoop(events.AbstractEventLoop):
         # they will be run the next time (after another I/O poll).
         # Use an idiom that is threadsafe without using locks.
         ntodo = len(self._ready)
-        for i in range(ntodo):
-            handle = self._ready.popleft()
-            if not handle._cancelled:
-                handle._run()
+        if instrument is None:
+            for i in range(ntodo):
+                handle = self._ready.popleft()
+                if not handle._cancelled:
+                    handle._run()
+        else:
+            threshold = instrument.slow_callback_duration
+            t0 = self.time()
+            try:
+                for i in range(ntodo):
+                    handle = self._ready.popleft()
+                    if handle._cancelled:
+                        continue
+                    if threshold is None:
+                        handle._run()
+                    else:
+                        t1 = self.time()
+                        handle._run()
+                        duration = self.time() - t1
+                        if duration >= threshold:
+                            instrument.slow_callback(handle, duration)
+            finally:
+                # Also report the iteration in which stop() took effect.
+                callback_time = self.time() - t0
+                instrument.iteration(poll_time, callback_time, ntodo,
+                                     ntodo - nready, len(event_list))
         handle = None  # Needed to break cycles when an exception occurs.
@@ -50,11 +50,13 @@ def make_handle(callback, args):
 class TimerHandle(Handle):
     """Object returned by timed callback registration methods."""
 
-    def __init__(self, when, callback, args):
+    def __init__(self, when, callback, args, loop=None):
         assert when is not None
         super().__init__(callback, args)
 
         self._when = when
+        self._loop = loop
+        self._scheduled = False  # Set while it is in the loop's heap.
 
     def __repr__(self):
         res = 'TimerHandle({}, {}, {})'.format(self._when,
@@ -65,6 +67,11 @@ class TimerHandle(Handle):
 
         return res
 
+    def cancel(self):
+        if not self._cancelled and self._loop is not None:
+            self._loop._timer_handle_cancelled(self)
+        super().cancel()
+
     def __hash__(self):
         return hash(self._when)
 
@@ -164,7 +171,14 @@ class AbstractEventLoop:
 
     # Network I/O methods returning Futures.
 
-    def getaddrinfo(self, host, port, *, family=0, type=0, proto=0, flags=0):
+    def getaddrinfo(self, host, port, *, family=0, type=0, proto=0, flags=0,
+                    cache=True):
+        """Return a Future for the result of socket.getaddrinfo().
+
+        Results may be cached by the loop, and concurrent identical
+        lookups merged into one; pass cache=False to always do a new
+        lookup.
+        """
         raise NotImplementedError
 
     def getnameinfo(self, sockaddr, flags=0):
@@ -172,12 +186,36 @@ class AbstractEventLoop:
 
     def create_connection(self, protocol_factory, host=None, port=None, *,
                           ssl=None, family=0, proto=0, flags=0, sock=None,
-                          local_addr=None):
+                          local_addr=None, happy_eyeballs_delay=None,
+                          interleave=None, connect_timeout=None,
+                          cache_addrinfo=True):
+        """A coroutine which connects to host and port.
+
+        The addresses returned by getaddrinfo() are tried one after
+        the other.  If happy_eyeballs_delay is not None, a new
+        connection attempt is started every happy_eyeballs_delay
+        seconds (RFC 8305 recommends 0.25), or as soon as an attempt
+        fails, without waiting for the others to fail; the first to
+        connect wins and the others are cancelled.
+
+        interleave reorders the addresses to alternate between address
+        families, starting with that many addresses of the first one.
+        It defaults to 1 with happy_eyeballs_delay and to 0 (keep the
+        getaddrinfo() order) without.
+
+        connect_timeout, if not None, is the number of seconds after
+        which a single connection attempt fails with TimeoutError.
+
+        cache_addrinfo=False bypasses the loop's cache of getaddrinfo()
+        results; see getaddrinfo().
+        """
         raise NotImplementedError
 
     def create_server(self, protocol_factory, host=None, port=None, *,
                       family=socket.AF_UNSPEC, flags=socket.AI_PASSIVE,
-                      sock=None, backlog=100, ssl=None, reuse_address=None):
+                      sock=None, backlog=100, ssl=None, reuse_address=None,
+                      max_connections=None, max_accept_rate=None,
+                      reuse_port=None, cache_addrinfo=True):
         """A coroutine which creates a TCP server bound to host and port.
 
         The return value is a Server object which can be used to stop
@@ -200,18 +238,46 @@ class AbstractEventLoop:
         listen() (defaults to 100).
 
         ssl can be set to an SSLContext to enable SSL over the
-        accepted connections.
+        accepted connections.  The context is used as is: session
+        tickets (RFC 5077) let clients resume a session without the
+        server keeping any state, and are on unless the caller sets
+        ssl.OP_NO_TICKET in its options; sessions are then resumed
+        from the server-side session cache of the SSLContext.
 
         reuse_address tells the kernel to reuse a local socket in
         TIME_WAIT state, without waiting for its natural timeout to
         expire. If not specified will automatically be set to True on
         UNIX.
+
+        reuse_port sets SO_REUSEPORT on the listening sockets, which
+        lets several processes bind the same address; the kernel then
+        spreads incoming connections over them (see
+        unix_events.WorkerSupervisor).  Not all platforms support it.
+
+        max_connections, if not None, stops accepting connections
+        while that many are open; accepting resumes when the number
+        drops to 90% of it.  max_accept_rate, if not None, limits how
+        many connections are accepted per second, allowing bursts of
+        up to one second's worth.  Meanwhile, new connections wait in
+        the listen() backlog.  Server.get_stats() reports how often
+        and for how long accepting was paused.
+
+        cache_addrinfo=False bypasses the loop's cache of getaddrinfo()
+        results; see getaddrinfo().
         """
         raise NotImplementedError
 
     def create_datagram_endpoint(self, protocol_factory,
                                  local_addr=None, remote_addr=None, *,
-                                 family=0, proto=0, flags=0):
+                                 family=0, proto=0, flags=0,
+                                 reuse_port=None, cache_addrinfo=True):
+        """A coroutine which creates a datagram endpoint.
+
+        reuse_port sets SO_REUSEPORT on the socket, so that several
+        processes can bind local_addr and share the datagrams sent to
+        it; see create_server().  cache_addrinfo is also as for
+        create_server().
+        """
         raise NotImplementedError
 
     def connect_read_pipe(self, protocol_factory, pipe):
@@ -275,6 +341,9 @@ class AbstractEventLoop:
     def sock_sendall(self, sock, data):
         raise NotImplementedError
 
+    def sock_sendfile(self, sock, file, offset=0, count=None):
+        raise NotImplementedError
+
     def sock_connect(self, sock, address):
         raise NotImplementedError
 
@@ -0,0 +1,209 @@
+"""Event loop instrumentation.
+
+An instrument is attached to a loop with loop.set_instrument().  The
+loop then measures every iteration of _run_once() and reports it to
+the instrument.  A loop without an instrument does no measuring at
+all.
+
+A LagMonitor measures how late the loop runs a timer, which is a good
+proxy for how far the loop has fallen behind; the lateness is kept in
+a LatencyHistogram.
+"""
+
+__all__ = ['LoopInstrument', 'LatencyHistogram', 'LagMonitor']
+
+import array
+import math
+
+from .log import tulip_log
+
+
+class LoopInstrument:
+    """Collects per-iteration measurements from an event loop.
+
+    The loop calls iteration() once per iteration of its _run_once()
+    method, and slow_callback() for every callback that took at least
+    slow_callback_duration seconds (if that is not None).  Times are
+    measured with loop.time().
+
+    This implementation keeps running totals in public attributes and
+    logs slow polls and slow callbacks; subclasses can override the
+    two methods to export the measurements elsewhere.
+    """
+
+    def __init__(self, slow_callback_duration=None):
+        self.slow_callback_duration = slow_callback_duration
+        self.iterations = 0
+        self.poll_time = 0.0
+        self.callback_time = 0.0
+        self.max_ready = 0
+        self.timers_fired = 0
+        self.io_events = 0
+        self.slow_callbacks = 0
+
+    def iteration(self, poll_time, callback_time, ready, timers, events):
+        """Called at the end of each loop iteration.
+
+        poll_time is the time spent waiting in the selector,
+        callback_time the time spent running callbacks, ready the
+        number of callbacks that were in the ready queue, timers the
+        number of timers that expired and events the number of I/O
+        events returned by the selector.
+        """
+        self.iterations += 1
+        self.poll_time += poll_time
+        self.callback_time += callback_time
+        if ready > self.max_ready:
+            self.max_ready = ready
+        self.timers_fired += timers
+        self.io_events += events
+        if poll_time >= 1:
+            tulip_log.info('poll took %.3f seconds', poll_time)
+
+    def slow_callback(self, handle, duration):
+        """Called when running a Handle took too long."""
+        self.slow_callbacks += 1
+        tulip_log.warning('Executing %r took %.3f seconds',
+                          handle._callback, duration)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in the style of HdrHistogram.
+
+    Values are counted in buckets whose width grows with the value,
+    so that every bucket is narrower than 2**-(significant_bits-1)
+    times its lower bound.  All buckets are allocated up front;
+    recording a value only increments a counter.
+
+    Values are in seconds, counted in units of resolution seconds.
+    Values above highest are counted in the last bucket.
+    """
+
+    def __init__(self, resolution=1e-6, highest=3600.0, significant_bits=7):
+        if resolution <= 0 or highest < resolution:
+            raise ValueError('invalid resolution or highest value')
+        if significant_bits < 2:
+            raise ValueError('significant_bits must be at least 2')
+        self.resolution = resolution
+        self._sub_bits = significant_bits
+        self._sub_count = 1 << significant_bits
+        self._half = self._sub_count >> 1
+        self._highest = int(highest / resolution)
+        self._size = self._index(self._highest) + 1
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded values."""
+        self._counts = array.array('Q', [0]) * self._size
+        self.count = 0
+        self.total = 0.0
+        self._max = 0
+
+    def _index(self, value):
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self._sub_bits
+        return (self._sub_count + (shift - 1) * self._half +
+                (value >> shift) - self._half)
+
+    def _upper(self, index):
+        # Highest value that is counted in the given bucket.
+        if index < self._sub_count:
+            return index
+        shift, mantissa = divmod(index - self._sub_count, self._half)
+        return ((mantissa + self._half + 1) << (shift + 1)) - 1
+
+    def record(self, value):
+        """Record a value (in seconds)."""
+        units = int(value / self.resolution)
+        if units < 0:
+            units = 0
+        elif units > self._highest:
+            units = self._highest
+        self._counts[self._index(units)] += 1
+        self.count += 1
+        self.total += value
+        if units > self._max:
+            self._max = units
+
+    @property
+    def max(self):
+        """Largest recorded value, at the histogram's resolution."""
+        return self._max * self.resolution
+
+    def percentile(self, percent):
+        """Return the value below which percent % of the values fall.
+
+        The result is the highest value that falls in the same bucket,
+        so it errs on the high side.  Return 0 if nothing was recorded.
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError('percent must be between 0 and 100')
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            seen += n
+            if seen >= target:
+                return min(self._upper(index), self._max) * self.resolution
+        return self.max  # pragma: no cover
+
+    def summary(self):
+        """Return the count, max, mean, p50, p99 and p999 as a dict."""
+        return {'count': self.count,
+                'max': self.max,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(50),
+                'p99': self.percentile(99),
+                'p999': self.percentile(99.9),
+                }
+
+
+class LagMonitor:
+    """Measure how late the event loop runs a periodic probe.
+
+    Every interval seconds a probe is scheduled with call_at(); when
+    it runs, the difference between loop.time() and the time it was
+    scheduled for is recorded in the histogram.  If that lag is at
+    least threshold seconds, lag_detected() is called, which logs a
+    warning; override it to raise an alert some other way.
+    """
+
+    def __init__(self, loop, interval=1.0, threshold=None, histogram=None):
+        if histogram is None:
+            histogram = LatencyHistogram()
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.histogram = histogram
+        self._handle = None
+        self._expected = None
+
+    def start(self):
+        """Start probing."""
+        assert self._handle is None, 'LagMonitor already started'
+        self._schedule()
+
+    def stop(self):
+        """Stop probing."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = self.loop.time() + self.interval
+        self._handle = self.loop.call_at(self._expected, self._probe)
+
+    def _probe(self):
+        lag = self.loop.time() - self._expected
+        if lag < 0:
+            lag = 0.0
+        self.histogram.record(lag)
+        if self.threshold is not None and lag >= self.threshold:
+            self.lag_detected(lag)
+        self._schedule()
+
+    def lag_detected(self, lag):
+        """Called when a probe ran at least threshold seconds late."""
+        tulip_log.warning('Event loop is lagging by %.3f seconds', lag)
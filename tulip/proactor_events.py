@@ -1,7 +1,8 @@
 """Event loop using a proactor and related classes.
 
 A proactor is a "notify-on-completion" multiplexer.  Currently a
-proactor is only implemented on Windows with IOCP.
+proactor is implemented on Windows with IOCP and on Linux with
+io_uring.
 """
 
 import socket
@@ -9,11 +10,13 @@ import socket
 from . import base_events
 from . import constants
 from . import futures
+from . import protocols
 from . import transports
 from .log import tulip_log
 
 
-class _ProactorBasePipeTransport(transports.BaseTransport):
+class _ProactorBasePipeTransport(transports._FlowControlMixin,
+                                 transports.BaseTransport):
     """Base class for pipe and socket transports."""
 
     def __init__(self, loop, sock, protocol, waiter=None,
@@ -25,6 +28,8 @@ class _ProactorBasePipeTransport(transports.BaseTransport):
         self._protocol = protocol
         self._server = server
         self._buffer = []
+        self._buffer_size = 0  # Number of bytes in _buffer.
+        self._pending_write = 0  # Size of the data in _write_fut.
         self._read_fut = None
         self._write_fut = None
         self._conn_lost = 0
@@ -39,6 +44,9 @@ class _ProactorBasePipeTransport(transports.BaseTransport):
     def _set_extra(self, sock):
         self._extra['pipe'] = sock
 
+    def get_write_buffer_size(self):
+        return self._buffer_size + self._pending_write
+
     def close(self):
         if self._closing:
             return
@@ -64,6 +72,7 @@ class _ProactorBasePipeTransport(transports.BaseTransport):
             self._read_fut.cancel()
         self._write_fut = self._read_fut = None
         self._buffer = []
+        self._buffer_size = 0
         self._loop.call_soon(self._call_connection_lost, exc)
 
     def _call_connection_lost(self, exc):
@@ -75,7 +84,10 @@ class _ProactorBasePipeTransport(transports.BaseTransport):
             # just close our end.  First calling shutdown() seems to
             # cure it, but maybe using DisconnectEx() would be better.
             if hasattr(self._sock, 'shutdown'):
-                self._sock.shutdown(socket.SHUT_RDWR)
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass  # ENOTCONN on Unix if the peer closed first.
             self._sock.close()
             server = self._server
             if server is not None:
@@ -87,11 +99,14 @@ class _ProactorReadPipeTransport(_ProactorBasePipeTransport,
                                  transports.ReadTransport):
     """Transport for read pipes."""
 
+    max_size = 4096  # Buffer size passed to recv().
+
     def __init__(self, loop, sock, protocol, waiter=None,
                  extra=None, server=None):
         super().__init__(loop, sock, protocol, waiter, extra, server)
         self._read_fut = None
         self._paused = False
+        self._buffered = isinstance(protocol, protocols.BufferedProtocol)
         self._loop.call_soon(self._loop_reading)
 
     def pause(self):
@@ -104,6 +119,9 @@ class _ProactorReadPipeTransport(_ProactorBasePipeTransport,
         self._paused = False
         if self._closing:
             return
+        if self._read_fut is not None and not self._read_fut.done():
+            # _loop_reading() will be called when the read completes.
+            return
         self._loop.call_soon(self._loop_reading, self._read_fut)
 
     def _loop_reading(self, fut=None):
@@ -123,12 +141,36 @@ class _ProactorReadPipeTransport(_ProactorBasePipeTransport,
                 data = None
                 return
 
-            if data == b'':
+            if data is not None and not data:
                 # we got end-of-file so no need to reschedule a new read
                 return
 
+            if self._buffered and data:
+                # data is the number of bytes received; the protocol
+                # must be done with its buffer before it is asked for
+                # the next one.
+                nbytes, data = data, None
+                try:
+                    self._protocol.buffer_updated(nbytes)
+                except Exception as exc:
+                    self._fatal_error(exc)
+                    return
+                if self._paused or self._closing:
+                    return
+
             # reschedule a new read
-            self._read_fut = self._loop._proactor.recv(self._sock, 4096)
+            if self._buffered:
+                try:
+                    buf = transports._get_buffer(self._protocol,
+                                                 self.max_size)
+                except Exception as exc:
+                    self._fatal_error(exc)
+                    return
+                self._read_fut = self._loop._proactor.recv_into(
+                    self._sock, buf)
+            else:
+                self._read_fut = self._loop._proactor.recv(
+                    self._sock, self.max_size)
         except ConnectionAbortedError as exc:
             if not self._closing:
                 self._fatal_error(exc)
@@ -155,7 +197,7 @@ class _ProactorWritePipeTransport(_ProactorBasePipeTransport,
     """Transport for write pipes."""
 
     def write(self, data):
-        assert isinstance(data, bytes), repr(data)
+        data = transports._byte_view(data)
         if self._eof_written:
             raise IOError('write_eof() already called')
 
@@ -167,18 +209,28 @@ class _ProactorWritePipeTransport(_ProactorBasePipeTransport,
                 tulip_log.warning('socket.send() raised exception.')
             self._conn_lost += 1
             return
-        self._buffer.append(data)
+        # The proactor owns the data until the send completes.
+        self._buffer.append(self._snapshot(data))
+        self._buffer_size += len(data)
         if self._write_fut is None:
             self._loop_writing()
+        else:
+            self._maybe_pause_protocol()
 
     def _loop_writing(self, f=None):
         try:
             assert f is self._write_fut
             self._write_fut = None
             if f:
+                self._pending_write = 0
                 f.result()
-            data = b''.join(self._buffer)
+                self._maybe_resume_protocol()  # May append to buffer.
+            if len(self._buffer) == 1:
+                data = self._buffer[0]
+            else:
+                data = b''.join(self._buffer)
             self._buffer = []
+            self._buffer_size = 0
             if not data:
                 if self._closing:
                     self._loop.call_soon(self._call_connection_lost, None)
@@ -186,7 +238,9 @@ class _ProactorWritePipeTransport(_ProactorBasePipeTransport,
                     self._sock.shutdown(socket.SHUT_WR)
                 return
             self._write_fut = self._loop._proactor.send(self._sock, data)
+            self._pending_write = len(data)
             self._write_fut.add_done_callback(self._loop_writing)
+            self._maybe_pause_protocol()
         except ConnectionResetError as exc:
             self._force_close(exc)
         except OSError as exc:
@@ -1,6 +1,6 @@
 """Abstract Protocol class."""
 
-__all__ = ['Protocol', 'DatagramProtocol']
+__all__ = ['Protocol', 'BufferedProtocol', 'DatagramProtocol']
 
 
 class BaseProtocol:
@@ -29,6 +29,34 @@ class BaseProtocol:
         aborted or closed).
         """
 
+    def pause_writing(self):
+        """Called when the transport's buffer goes over the high-water mark.
+
+        Pause and resume calls are paired -- pause_writing() is called
+        once when the buffer goes strictly over the high-water mark
+        (even if subsequent writes increases the buffer size even
+        more), and eventually resume_writing() is called once when the
+        buffer size reaches the low-water mark.
+
+        Note that if the buffer size equals the high-water mark,
+        pause_writing() is not called -- it must go strictly over.
+        Conversely, resume_writing() is called when the buffer size is
+        equal or lower than the low-water mark.  These end conditions
+        are important to ensure that things go as expected when either
+        mark is zero.
+
+        NOTE: This is the only Protocol callback that is not called
+        through EventLoop.call_soon() -- if it were, it would have no
+        effect when it's most needed (when the app keeps writing
+        without yielding until pause_writing() is called).
+        """
+
+    def resume_writing(self):
+        """Called when the transport's buffer drains below the low-water mark.
+
+        See pause_writing() for details.
+        """
+
 
 class Protocol(BaseProtocol):
     """ABC representing a protocol.
@@ -66,6 +94,44 @@ class Protocol(BaseProtocol):
         """
 
 
+class BufferedProtocol(BaseProtocol):
+    """ABC representing a stream protocol that owns its receive buffer.
+
+    Use this instead of Protocol to avoid allocating a new bytes
+    object for every read: the transport asks for a buffer with
+    get_buffer(), receives data straight into it, and then calls
+    buffer_updated() with the number of bytes that were written.
+
+    State machine of calls:
+
+      start -> CM [-> GB [-> BU?]]* [-> ER?] -> CL -> end
+    """
+
+    def get_buffer(self, sizehint):
+        """Called to get a buffer to receive data into.
+
+        sizehint is the size the transport would read at most; the
+        returned buffer may be smaller or larger.  It must be a
+        writable, non-empty object supporting the buffer protocol,
+        such as a bytearray or a memoryview of one, and must not be
+        modified or resized until buffer_updated() has been called.
+        """
+
+    def buffer_updated(self, nbytes):
+        """Called when data has been written into the buffer.
+
+        nbytes is the number of bytes written, starting at the
+        beginning of the buffer returned by the last get_buffer()
+        call.
+        """
+
+    def eof_received(self):
+        """Called when the other end calls write_eof() or equivalent.
+
+        See Protocol.eof_received().
+        """
+
+
 class DatagramProtocol(BaseProtocol):
     """ABC representing a datagram protocol."""
 
@@ -5,7 +5,13 @@ also includes support for signal handling, see the unix_events sub-module.
 """
 
 import collections
+import errno
+import io
+import itertools
+import os
 import socket
+import stat
+import threading
 try:
     import ssl
 except ImportError:  # pragma: no cover
@@ -15,17 +21,72 @@ from . import base_events
 from . import constants
 from . import events
 from . import futures
+from . import protocols
 from . import selectors
+from . import sslproto
+from . import tasks
 from . import transports
 from .log import tulip_log
 
 
+# Socket transports send buffered data with a single sendmsg() call
+# where available; it takes at most _IOV_MAX buffers.
+_HAVE_SENDMSG = hasattr(socket.socket, 'sendmsg')
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):  # pragma: no cover
+    _IOV_MAX = 16
+
+# Errors from os.sendfile() meaning that it cannot be used for the
+# socket or the file at all.
+_SENDFILE_UNSUPPORTED = (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK,
+                         errno.EOPNOTSUPP)
+
+# Errors from accept() meaning that the process or the system is out
+# of file descriptors or memory, which may be over soon.
+_ACCEPT_RESOURCE_ERRORS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS,
+                           errno.ENOMEM)
+
+
+def _sendfile_args(sock, file, offset, count):
+    # Return the descriptor of file and the number of bytes to send
+    # with os.sendfile(), or raise _SendfileNotAvailable.
+    if not hasattr(os, 'sendfile'):  # pragma: no cover
+        raise base_events._SendfileNotAvailable(
+            'os.sendfile() is not available')
+    if ssl is not None and isinstance(sock, ssl.SSLSocket):
+        raise base_events._SendfileNotAvailable(
+            'os.sendfile() cannot be used with SSL')
+    try:
+        fileno = file.fileno()
+        st = os.fstat(fileno)
+    except (AttributeError, io.UnsupportedOperation, OSError):
+        raise base_events._SendfileNotAvailable('not a regular file')
+    if not stat.S_ISREG(st.st_mode):
+        raise base_events._SendfileNotAvailable('not a regular file')
+    size = max(st.st_size - offset, 0)
+    if count is None or count > size:
+        count = size
+    return fileno, count
+
+
 class BaseSelectorEventLoop(base_events.BaseEventLoop):
     """Selector event loop.
 
     See events.EventLoop for API specification.
     """
 
+    # Use _SelectorEdgeSocketTransport for socket transports; this
+    # requires a selector whose register() takes edge_triggered=True.
+    _edge_triggered = False
+
+    # How many connections to accept per readable event on a listening
+    # socket, and for how many seconds to stop accepting when running
+    # out of file descriptors.  Meanwhile, connections wait in the
+    # listen() backlog.
+    accept_batch = 100
+    accept_backoff = 1.0
+
     def __init__(self, selector=None):
         super().__init__()
 
@@ -33,19 +94,50 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
             selector = selectors.DefaultSelector()
         tulip_log.debug('Using selector: %s', selector.__class__.__name__)
         self._selector = selector
+        # Dispatch from select_raw() unless the selector is a stand-in.
+        self._raw_events = isinstance(selector, selectors.BaseSelector)
+        self._fd_changes = None  # Dict of pending changes when deferring.
+        self._fd_changes_requested = 0
+        self._fd_changes_applied = 0
+        self._fd_readiness = {}  # Readiness of edge-triggered fds.
+        self._corked_transports = []  # Transports with writes to flush.
+        self._ssl_default_context = None  # Made on first use of ssl=True.
+        self._ssl_session_cache = sslproto.SSLSessionCache()
+        self._accept_pauses = 0
         self._make_self_pipe()
 
     def _make_socket_transport(self, sock, protocol, waiter=None, *,
                                extra=None, server=None):
+        if self._edge_triggered:
+            return _SelectorEdgeSocketTransport(self, sock, protocol, waiter,
+                                                extra, server)
         return _SelectorSocketTransport(self, sock, protocol, waiter,
                                         extra, server)
 
     def _make_ssl_transport(self, rawsock, protocol, sslcontext, waiter, *,
                             server_side=False, server_hostname=None,
                             extra=None, server=None):
-        return _SelectorSslTransport(
-            self, rawsock, protocol, sslcontext, waiter,
-            server_side, server_hostname, extra, server)
+        session_key = None
+        if not server_side:
+            if sslcontext is None:
+                if self._ssl_default_context is None:
+                    self._ssl_default_context = (
+                        sslproto._create_default_context())
+                sslcontext = self._ssl_default_context
+            if self._ssl_session_cache is not None:
+                try:
+                    peername = rawsock.getpeername()
+                except OSError:
+                    pass
+                else:
+                    session_key = (sslcontext, peername, server_hostname)
+        ssl_protocol = sslproto.SSLProtocol(
+            self, protocol, sslcontext, waiter,
+            server_side, server_hostname,
+            session_cache=self._ssl_session_cache, session_key=session_key)
+        self._make_socket_transport(rawsock, ssl_protocol,
+                                    extra=extra, server=server)
+        return ssl_protocol._app_transport
 
     def _make_datagram_transport(self, sock, protocol,
                                  address=None, extra=None):
@@ -54,9 +146,79 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
     def close(self):
         if self._selector is not None:
             self._close_self_pipe()
+            if self._fd_changes is not None:
+                self._fd_changes = {}
             self._selector.close()
             self._selector = None
 
+    def set_defer_fd_changes(self, enabled):
+        """Coalesce reader/writer registration changes per iteration.
+
+        When enabled, add_reader(), remove_reader(), add_writer() and
+        remove_writer() only record the interest in a file descriptor;
+        the net change is passed to the selector once, right before
+        the next poll.  Adding and then removing a callback within one
+        iteration therefore costs no system call at all.
+
+        Removing the last callback for a file descriptor is still
+        applied immediately, because the file descriptor may be
+        closed and reused before the next poll.
+        """
+        if enabled:
+            if self._fd_changes is None:
+                self._fd_changes = {}
+        elif self._fd_changes is not None:
+            self._apply_fd_changes()
+            self._fd_changes = None
+
+    def set_ssl_session_cache(self, cache):
+        """Set the cache used to resume client SSL sessions.
+
+        Pass an sslproto.SSLSessionCache instance, or None to turn
+        session resumption off.  By default each loop has a cache of
+        up to 256 sessions; a session is looked up by SSL context,
+        peer address and server hostname.
+        """
+        self._ssl_session_cache = cache
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats.update(
+            fd_changes_requested=self._fd_changes_requested,
+            fd_changes_applied=self._fd_changes_applied,
+            fd_syscalls_saved=(self._fd_changes_requested -
+                               self._fd_changes_applied),
+            accept_pauses=self._accept_pauses,
+            )
+        if self._ssl_session_cache is not None:
+            for name, value in self._ssl_session_cache.get_stats().items():
+                stats['ssl_session_' + name] = value
+        return stats
+
+    def _run_once(self):
+        if self._corked_transports:
+            # Written to outside of the loop.
+            self._flush_corked_transports()
+        if self._fd_changes:
+            self._apply_fd_changes()
+        try:
+            super()._run_once()
+        finally:
+            # Also when a callback stopped the loop or raised.
+            if self._corked_transports:
+                self._flush_corked_transports()
+
+    def _flush_soon(self, transport):
+        # Called by a transport in cork mode on the first write() that
+        # it holds back; it is flushed at the end of this iteration.
+        self._corked_transports.append(transport)
+
+    def _flush_corked_transports(self):
+        transports = self._corked_transports
+        self._corked_transports = []
+        for transport in transports:
+            transport._flush_corked()
+
     def _socketpair(self):
         raise NotImplementedError
 
@@ -88,26 +250,49 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
         except (BlockingIOError, InterruptedError):
             pass
 
+    _can_pause_serving = True
+
     def _start_serving(self, protocol_factory, sock, ssl=None, server=None):
         self.add_reader(sock.fileno(), self._accept_connection,
                         protocol_factory, sock, ssl, server)
 
+    def _pause_serving(self, sock):
+        self.remove_reader(sock.fileno())
+
     def _accept_connection(self, protocol_factory, sock, ssl=None,
                            server=None):
-        try:
-            conn, addr = sock.accept()
-            conn.setblocking(False)
-        except (BlockingIOError, InterruptedError):
-            pass  # False alarm.
-        except Exception:
-            # Bad error. Stop serving.
-            self.remove_reader(sock.fileno())
-            sock.close()
-            # There's nowhere to send the error, so just log it.
-            # TODO: Someone will want an error handler for this.
-            tulip_log.exception('Accept failed')
-        else:
-            if ssl:
+        for i in range(self.accept_batch):
+            if server is not None and server._paused:
+                return  # Over max_connections or max_accept_rate.
+            try:
+                conn, addr = sock.accept()
+                conn.setblocking(False)
+            except (BlockingIOError, InterruptedError):
+                return  # False alarm, or no more connections waiting.
+            except ConnectionAbortedError:
+                continue  # Reset by the client while in the backlog.
+            except Exception as exc:
+                fd = sock.fileno()
+                self.remove_reader(fd)
+                if getattr(exc, 'errno', None) in _ACCEPT_RESOURCE_ERRORS:
+                    # Try again when some connections may have closed.
+                    tulip_log.warning(
+                        'Accept failed on socket %d: %s; pausing for %s '
+                        'seconds', fd, exc, self.accept_backoff)
+                    self._accept_pauses += 1
+                    self.call_later(self.accept_backoff,
+                                    self._resume_accepting,
+                                    protocol_factory, sock, ssl, server)
+                    return
+                # Bad error. Stop serving.
+                sock.close()
+                # There's nowhere to send the error, so just log it.
+                # TODO: Someone will want an error handler for this.
+                tulip_log.exception('Accept failed')
+                return
+            if server is not None and server._handoff is not None:
+                server._handoff(conn, addr, protocol_factory, ssl)
+            elif ssl:
                 self._make_ssl_transport(
                     conn, protocol_factory(), ssl, None,
                     server_side=True, extra={'peername': addr}, server=server)
@@ -115,11 +300,79 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
                 self._make_socket_transport(
                     conn, protocol_factory(), extra={'peername': addr},
                     server=server)
-        # It's now up to the protocol to handle the connection.
+            # It's now up to the protocol to handle the connection.
+
+    def _resume_accepting(self, protocol_factory, sock, ssl, server):
+        # Unless the server was closed or paused during the back-off;
+        # it starts serving again itself when it resumes.
+        if sock.fileno() != -1 and (server is None or not server._paused):
+            self._start_serving(protocol_factory, sock, ssl, server)
+
+    def _get_fd_state(self, fd):
+        """Return (fileobj, mask, reader, writer) including pending changes.
+
+        Only used when deferring fd changes.
+        """
+        fdno = selectors._fileobj_to_fd(fd)
+        state = self._fd_changes.get(fdno)
+        if state is not None:
+            return state
+        try:
+            key = self._selector.get_key(fdno)
+        except KeyError:
+            return fd, 0, None, None
+        reader, writer = key.data
+        return key.fileobj, key.events, reader, writer
+
+    def _set_fd_state(self, fd, old_mask, mask, reader, writer):
+        """Record a change to be applied by _apply_fd_changes()."""
+        fdno = selectors._fileobj_to_fd(fd)
+        if mask != old_mask:
+            self._fd_changes_requested += 1
+        if not mask:
+            self._fd_changes.pop(fdno, None)
+            try:
+                self._selector.get_key(fdno)
+            except KeyError:
+                pass
+            else:
+                self._fd_changes_applied += 1
+                self._selector.unregister(fdno)
+        else:
+            self._fd_changes[fdno] = (fd, mask, reader, writer)
+
+    def _apply_fd_changes(self):
+        """Pass the net pending fd changes to the selector."""
+        changes = self._fd_changes
+        self._fd_changes = {}
+        for fdno, (fileobj, mask, reader, writer) in changes.items():
+            try:
+                key = self._selector.get_key(fdno)
+            except KeyError:
+                key = None
+            try:
+                if key is None:
+                    self._fd_changes_applied += 1
+                    self._selector.register(fileobj, mask, (reader, writer))
+                else:
+                    if mask != key.events:
+                        self._fd_changes_applied += 1
+                    self._selector.modify(fdno, mask, (reader, writer))
+            except OSError:
+                # There's nobody to report this to; the fd was
+                # probably closed without removing its callbacks.
+                tulip_log.exception('Cannot register fd %d', fdno)
 
     def add_reader(self, fd, callback, *args):
         """Add a reader callback."""
         handle = events.make_handle(callback, args)
+        if self._fd_changes is not None:
+            fileobj, mask, reader, writer = self._get_fd_state(fd)
+            self._set_fd_state(fileobj, mask, mask | selectors.EVENT_READ,
+                               handle, writer)
+            if reader is not None:
+                reader.cancel()
+            return
         try:
             key = self._selector.get_key(fd)
         except KeyError:
@@ -134,6 +387,17 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
 
     def remove_reader(self, fd):
         """Remove a reader callback."""
+        if self._fd_changes is not None:
+            fileobj, mask, reader, writer = self._get_fd_state(fd)
+            if not mask:
+                return False
+            self._set_fd_state(fileobj, mask, mask & ~selectors.EVENT_READ,
+                               None, writer)
+            if reader is not None:
+                reader.cancel()
+                return True
+            else:
+                return False
         try:
             key = self._selector.get_key(fd)
         except KeyError:
@@ -155,6 +419,13 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
     def add_writer(self, fd, callback, *args):
         """Add a writer callback.."""
         handle = events.make_handle(callback, args)
+        if self._fd_changes is not None:
+            fileobj, mask, reader, writer = self._get_fd_state(fd)
+            self._set_fd_state(fileobj, mask, mask | selectors.EVENT_WRITE,
+                               reader, handle)
+            if writer is not None:
+                writer.cancel()
+            return
         try:
             key = self._selector.get_key(fd)
         except KeyError:
@@ -169,6 +440,17 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
 
     def remove_writer(self, fd):
         """Remove a writer callback."""
+        if self._fd_changes is not None:
+            fileobj, mask, reader, writer = self._get_fd_state(fd)
+            if not mask:
+                return False
+            self._set_fd_state(fileobj, mask, mask & ~selectors.EVENT_WRITE,
+                               reader, None)
+            if writer is not None:
+                writer.cancel()
+                return True
+            else:
+                return False
         try:
             key = self._selector.get_key(fd)
         except KeyError:
@@ -245,6 +527,52 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
                 data = data[n:]
             self.add_writer(fd, self._sock_sendall, fut, True, sock, data)
 
+    @tasks.coroutine
+    def _sock_sendfile_native(self, sock, file, offset, count):
+        fileno, count = _sendfile_args(sock, file, offset, count)
+        fut = futures.Future(loop=self)
+        if count:
+            self._sock_sendfile(fut, False, sock, fileno, offset, count, 0)
+        else:
+            fut.set_result(0)
+        total = yield from fut
+        file.seek(offset + total)
+        return total
+
+    def _sock_sendfile(self, fut, registered, sock, fileno, offset, count,
+                       total):
+        fd = sock.fileno()
+
+        if registered:
+            self.remove_writer(fd)
+        if fut.cancelled():
+            return
+
+        try:
+            n = os.sendfile(fd, fileno, offset + total, count - total)
+        except (BlockingIOError, InterruptedError):
+            n = None
+        except OSError as exc:
+            if not total and exc.errno in _SENDFILE_UNSUPPORTED:
+                exc = base_events._SendfileNotAvailable(str(exc))
+            fut.set_exception(exc)
+            return
+        except Exception as exc:
+            fut.set_exception(exc)
+            return
+
+        if n is not None:
+            if n == 0:
+                # The file was truncated.
+                fut.set_result(total)
+                return
+            total += n
+            if total == count:
+                fut.set_result(total)
+                return
+        self.add_writer(fd, self._sock_sendfile, fut, True, sock,
+                        fileno, offset, count, total)
+
     def sock_connect(self, sock, address):
         """XXX"""
         # That address better not require a lookup!  We're not calling
@@ -253,8 +581,18 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
         # IPv6 addresses (there are too many forms, apparently).
         fut = futures.Future(loop=self)
         self._sock_connect(fut, False, sock, address)
+        if not fut.done():
+            fd = sock.fileno()
+            fut.add_done_callback(
+                lambda fut: self._sock_connect_done(fd, fut))
         return fut
 
+    def _sock_connect_done(self, fd, fut):
+        # Stop waiting for a cancelled connect; the socket must not be
+        # closed before this is called.
+        if fut.cancelled():
+            self.remove_writer(fd)
+
     def _sock_connect(self, fut, registered, sock, address):
         # TODO: Use getaddrinfo() to look up the address, to avoid the
         # trap of hanging the entire event loop when the address
@@ -306,9 +644,48 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
         else:
             fut.set_result((conn, address))
 
+    def _add_edge_fd(self, fd, reader, writer):
+        """Register fd edge-triggered for both reading and writing.
+
+        The selector only reports fd when it becomes readable or
+        writable, so the loop remembers which events were seen until
+        the owner calls _clear_fd_ready() after getting EAGAIN.  The
+        fd starts out as writable, which a connected socket nearly
+        always is; if not, the first send() just raises EAGAIN.
+        """
+        self._selector.register(
+            fd, selectors.EVENT_READ | selectors.EVENT_WRITE,
+            (events.make_handle(reader, ()), events.make_handle(writer, ())),
+            edge_triggered=True)
+        self._fd_readiness[fd] = selectors.EVENT_WRITE
+
+    def _remove_edge_fd(self, fd):
+        """Unregister an fd added with _add_edge_fd()."""
+        self._fd_readiness.pop(fd, None)
+        self.remove_reader(fd)
+        self.remove_writer(fd)
+
+    def _fd_is_ready(self, fd, event):
+        return bool(self._fd_readiness.get(fd, 0) & event)
+
+    def _clear_fd_ready(self, fd, event):
+        if fd in self._fd_readiness:
+            self._fd_readiness[fd] &= ~event
+
+    def _poll_events(self, timeout):
+        if self._raw_events:
+            return self._selector.select_raw(timeout)
+        return self._selector.select(timeout)
+
     def _process_events(self, event_list):
+        if self._raw_events:
+            self._process_raw_events(event_list)
+            return
+        readiness = self._fd_readiness
         for key, mask in event_list:
             fileobj, (reader, writer) = key.fileobj, key.data
+            if readiness and key.fd in readiness:
+                readiness[key.fd] |= mask
             if mask & selectors.EVENT_READ and reader is not None:
                 if reader._cancelled:
                     self.remove_reader(fileobj)
@@ -320,14 +697,203 @@ class BaseSelectorEventLoop(base_events.BaseEventLoop):
                 else:
                     self._add_callback(writer)
 
+    def _process_raw_events(self, event_list):
+        # The (reader, writer) data of a selector key is the dispatch
+        # record for its fd: the handles go straight into the ready
+        # queue, without building a (key, events) pair per event.
+        selector = self._selector
+        fd_to_key = selector._fd_to_key
+        read_events = selector.raw_read_events
+        write_events = selector.raw_write_events
+        readiness = self._fd_readiness
+        ready = self._ready
+        for fd, events in event_list:
+            key = fd_to_key.get(fd)
+            if key is None:
+                continue
+            reader, writer = key.data
+            if readiness and fd in readiness:
+                if events & read_events:
+                    readiness[fd] |= selectors.EVENT_READ
+                if events & write_events:
+                    readiness[fd] |= selectors.EVENT_WRITE
+            if events & read_events and reader is not None:
+                if reader._cancelled:
+                    self.remove_reader(fd)
+                else:
+                    ready.append(reader)
+            if events & write_events and writer is not None:
+                if writer._cancelled:
+                    self.remove_writer(fd)
+                else:
+                    ready.append(writer)
+
     def _stop_serving(self, sock):
         self.remove_reader(sock.fileno())
         sock.close()
 
 
-class _SelectorTransport(transports.Transport):
+class LoopGroup:
+    """Event loops running in threads, sharing accepted connections.
+
+    loop is the acceptor loop: servers created with create_server()
+    listen in it, and every connection they accept is handed off to
+    one of workers worker loops (by default, one per CPU), each
+    running in its own thread.  balance chooses the worker loop:
+    'round_robin', or 'least_connections' for the one with the fewest
+    open connections.
+
+    This pays off for protocols that spend their time in code
+    releasing the GIL, such as hashing, compression or SSL.  Protocols
+    run in their worker loop's thread; get_event_loop() returns the
+    worker loop there.  create_server(), get_stats() and the Server
+    methods must be used in the acceptor loop's thread.
+    """
+
+    def __init__(self, loop, workers=None, *, loop_factory=None,
+                 balance='round_robin'):
+        if not isinstance(loop, BaseSelectorEventLoop):
+            raise TypeError('the acceptor must be a selector event loop')
+        if balance not in ('round_robin', 'least_connections'):
+            raise ValueError('unknown balance %r' % (balance,))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if loop_factory is None:
+            loop_factory = events.get_event_loop_policy().new_event_loop
+        self.acceptor = loop
+        self.balance = balance
+        self.loops = [loop_factory() for i in range(workers)]
+        self._threads = []
+        self._connections = [0] * workers
+        self._handoffs = 0
+        self._next = 0
+
+    def start(self):
+        """Start the worker loops, each in a new thread."""
+        assert not self._threads, 'already started'
+        for index, loop in enumerate(self.loops):
+            thread = threading.Thread(target=self._run, args=(loop,),
+                                      name='LoopGroup-%d' % index,
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the worker loops, wait for their threads and close them.
+
+        Connections still open in the worker loops are not closed;
+        close the servers and wait for them first.
+        """
+        for loop in self.loops:
+            loop.call_soon_threadsafe(loop.stop)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for loop in self.loops:
+            loop.close()
+
+    def _run(self, loop):
+        events.set_event_loop(loop)
+        loop.run_forever()
+
+    @tasks.coroutine
+    def create_server(self, protocol_factory, host=None, port=None,
+                      **kwargs):
+        """Like the acceptor loop's create_server(), with hand-off."""
+        server = yield from self.acceptor.create_server(
+            protocol_factory, host, port, **kwargs)
+        # The acceptor cannot have accepted anything yet.
+        server._handoff = lambda *args: self._handoff(server, *args)
+        return server
+
+    def get_stats(self):
+        """Return a dict with the open connections of each worker loop.
+
+        'connections' is a list of connection counts, by worker loop,
+        and 'handoffs' the total number of connections handed off.
+        """
+        return {'connections': list(self._connections),
+                'handoffs': self._handoffs,
+                }
+
+    def _pick(self):
+        if self.balance == 'least_connections':
+            return self._connections.index(min(self._connections))
+        index = self._next
+        self._next = (index + 1) % len(self.loops)
+        return index
+
+    def _handoff(self, server, conn, addr, protocol_factory, ssl):
+        # In the acceptor loop.  Counting the connection here, not in
+        # the worker, keeps admission control on the server exact.
+        index = self._pick()
+        self._connections[index] += 1
+        self._handoffs += 1
+        server.attach(None)
+        self.loops[index].call_soon_threadsafe(
+            self._start_connection, index, conn, addr, protocol_factory,
+            ssl, _WorkerServer(self, index, server))
+
+    def _start_connection(self, index, conn, addr, protocol_factory, ssl,
+                          server):
+        # In the worker loop.
+        loop = self.loops[index]
+        try:
+            protocol = protocol_factory()
+            if ssl:
+                loop._make_ssl_transport(
+                    conn, protocol, ssl, None, server_side=True,
+                    extra={'peername': addr}, server=server)
+            else:
+                loop._make_socket_transport(
+                    conn, protocol, extra={'peername': addr}, server=server)
+        except Exception:
+            conn.close()
+            server.detach(None)
+            tulip_log.exception('Starting connection from %r failed', addr)
+
+    def _detached(self, index, server):
+        # In the acceptor loop.
+        self._connections[index] -= 1
+        server.detach(None)
+
+
+class _WorkerServer:
+    """Stands in for a Server in the transports of a worker loop.
+
+    The connection was attached to the real Server when it was handed
+    off; detaching is passed back to the acceptor loop's thread.
+    """
+
+    def __init__(self, group, index, server):
+        self._group = group
+        self._index = index
+        self._server = server
+
+    def attach(self, transport):
+        pass
+
+    def detach(self, transport):
+        self._group.acceptor.call_soon_threadsafe(
+            self._group._detached, self._index, self._server)
+
+
+class _SelectorTransport(transports._FlowControlMixin,
+                         transports.Transport):
 
-    max_size = 256 * 1024  # Buffer size passed to recv().
+    # Stream transports adapt the buffer size passed to recv() to the
+    # amount of data that arrives per read, within these bounds.
+    min_size = 4 * 1024
+    max_size = 256 * 1024
+
+    # How much to read per readable event.  By default a transport
+    # reads once; with a larger read_budget it keeps reading until the
+    # socket would block, for at most read_budget reads and, unless
+    # read_byte_budget is None, read_byte_budget bytes.  The rest is
+    # left for the next poll so one busy connection cannot starve the
+    # others.
+    read_budget = 1
+    read_byte_budget = None
 
     def __init__(self, loop, sock, protocol, extra, server=None):
         super().__init__(extra)
@@ -342,23 +908,161 @@ class _SelectorTransport(transports.Transport):
         self._sock = sock
         self._sock_fd = sock.fileno()
         self._protocol = protocol
+        # Receive into the protocol's buffer rather than a new bytes.
+        self._buffered = isinstance(protocol, protocols.BufferedProtocol)
+        self._recv_size = self._extra['recv_size'] = self.min_size
+        self._small_reads = 0  # Consecutive reads of half _recv_size or less.
         self._server = server
         self._buffer = collections.deque()
+        self._buffer_size = 0  # Number of bytes in _buffer.
         self._conn_lost = 0
         self._closing = False  # Set when close() called.
+        self._eof = False  # Set when write_eof() called.
+        self._sendfile_queue = None  # Data written during sendfile().
+        self._sendfile_fut = None
+        self._drain_waiter = None
+        self._corked = False  # Set by set_cork().
+        self._cork_pending = False  # Set when a flush is scheduled.
+        self._tcp_cork = False
         if server is not None:
             server.attach(self)
 
     def abort(self):
         self._force_close(None)
 
+    def _adapt_recv_size(self, nbytes):
+        # Double the receive size when a read fills it; halve it after
+        # two reads in a row that fill half of it or less.
+        size = self._recv_size
+        if nbytes >= size:
+            self._small_reads = 0
+            if size < self.max_size:
+                size = min(size * 2, self.max_size)
+            else:
+                return
+        elif nbytes <= size // 2 and size > self.min_size:
+            self._small_reads += 1
+            if self._small_reads < 2:
+                return
+            self._small_reads = 0
+            size = max(size // 2, self.min_size)
+        else:
+            self._small_reads = 0
+            return
+        self._recv_size = self._extra['recv_size'] = size
+
+    def get_write_buffer_size(self):
+        return self._buffer_size
+
+    def write(self, data):
+        data = transports._byte_view(data)
+        assert not self._eof, 'Cannot call write() after write_eof()'
+        if not data:
+            return
+
+        if self._conn_lost:
+            if self._conn_lost >= constants.LOG_THRESHOLD_FOR_CONNLOST_WRITES:
+                tulip_log.warning('socket.send() raised exception.')
+            self._conn_lost += 1
+            return
+
+        if self._sendfile_queue is not None:
+            # Send it after the file.
+            self._sendfile_queue.append(self._snapshot(data))
+            self._buffer_size += len(data)
+            self._maybe_pause_protocol()
+            return
+
+        self._write(data)
+
+    def _write(self, data):
+        # Send or buffer data; the checks have been done by write().
+        raise NotImplementedError
+
+    @tasks.coroutine
+    def sendfile(self, file, offset=0, count=None):
+        """Send a file; see WriteTransport.sendfile()."""
+        assert not self._eof, 'Cannot call sendfile() after write_eof()'
+        assert self._sendfile_queue is None, 'sendfile() already running'
+        if offset < 0:
+            raise ValueError('offset must be >= 0')
+        if count is not None and count < 0:
+            raise ValueError('count must be None or >= 0')
+        if self._conn_lost:
+            raise ConnectionResetError('Connection lost')
+        queue = self._sendfile_queue = collections.deque()
+        try:
+            yield from self._drain()
+            try:
+                total = yield from self._sendfile_native(file, offset, count)
+            except base_events._SendfileNotAvailable:
+                total = yield from self._sendfile_fallback(
+                    file, offset, count)
+        finally:
+            # Unless the connection was lost, queue what was written
+            # in the meantime.
+            if self._sendfile_queue is queue:
+                self._sendfile_queue = None
+                self._buffer.extend(queue)
+                self._sendfile_done()
+        return total
+
+    @tasks.coroutine
+    def _sendfile_native(self, file, offset, count):
+        raise base_events._SendfileNotAvailable(
+            '{} does not support os.sendfile()'.format(
+                self.__class__.__name__))
+
+    @tasks.coroutine
+    def _sendfile_fallback(self, file, offset, count):
+        file.seek(offset)
+        total = 0
+        while count is None or total < count:
+            size = base_events._SENDFILE_CHUNK_SIZE
+            if count is not None:
+                size = min(size, count - total)
+            data = file.read(size)
+            if not data:
+                break
+            self._write(data)
+            total += len(data)
+            if self._conn_lost or self._sendfile_queue is None:
+                # _write() failed or the transport was closed; don't
+                # read the rest of the file.
+                raise ConnectionResetError('Connection lost')
+            if self._buffer_size > self._high_water:
+                yield from self._drain()
+        return total
+
+    def _sendfile_done(self):
+        # Called when sendfile() is done; _buffer may be non-empty.
+        pass
+
+    @tasks.coroutine
+    def _drain(self):
+        # Wait until the write buffer is empty during sendfile().
+        if self._buffer and self._sendfile_queue is not None:
+            self._drain_waiter = futures.Future(loop=self._loop)
+            try:
+                yield from self._drain_waiter
+            finally:
+                self._drain_waiter = None
+        if self._sendfile_queue is None:
+            raise ConnectionResetError('Connection lost')
+
+    def _drained(self):
+        # Called when the write buffer has become empty.
+        waiter = self._drain_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
     def close(self):
         if self._closing:
             return
         self._closing = True
         self._conn_lost += 1
         self._loop.remove_reader(self._sock_fd)
-        if not self._buffer:
+        if not self._buffer and self._sendfile_queue is None:
             self._loop.call_soon(self._call_connection_lost, None)
 
     def _fatal_error(self, exc):
@@ -367,9 +1071,22 @@ class _SelectorTransport(transports.Transport):
         self._force_close(exc)
 
     def _force_close(self, exc):
+        if self._cork_pending:
+            # The writer was not registered yet.
+            self._cork_pending = False
+            self._buffer.clear()
         if self._buffer:
             self._buffer.clear()
             self._loop.remove_writer(self._sock_fd)
+        self._buffer_size = 0
+        if self._sendfile_queue is not None:
+            # Make sendfile() raise ConnectionResetError.
+            self._sendfile_queue = None
+            fut = self._sendfile_fut
+            if fut is not None and not fut.done():
+                self._loop.remove_writer(self._sock_fd)
+                fut.set_exception(ConnectionResetError('Connection lost'))
+            self._drained()
 
         if self._closing:
             return
@@ -398,7 +1115,6 @@ class _SelectorSocketTransport(_SelectorTransport):
     def __init__(self, loop, sock, protocol, waiter=None,
                  extra=None, server=None):
         super().__init__(loop, sock, protocol, extra, server)
-        self._eof = False
         self._paused = False
 
         self._loop.add_reader(self._sock_fd, self._read_ready)
@@ -420,34 +1136,127 @@ class _SelectorSocketTransport(_SelectorTransport):
         self._loop.add_reader(self._sock_fd, self._read_ready)
 
     def _read_ready(self):
+        # A read that does not fill the buffer most likely drained the
+        # socket, so don't spend a recv() call to find out.
+        byte_budget = self.read_byte_budget
+        for i in range(self.read_budget):
+            try:
+                if self._buffered:
+                    buf = transports._get_buffer(self._protocol,
+                                                 self._recv_size)
+                    size = len(buf)
+                    nbytes = self._sock.recv_into(buf)
+                else:
+                    size = self._recv_size
+                    data = self._sock.recv(size)
+                    nbytes = len(data)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError as exc:
+                self._force_close(exc)
+                return
+            except Exception as exc:
+                self._fatal_error(exc)
+                return
+            if not nbytes:
+                keep_open = self._protocol.eof_received()
+                if not keep_open:
+                    self.close()
+                return
+            self._adapt_recv_size(nbytes)
+            if self._buffered:
+                self._protocol.buffer_updated(nbytes)
+            else:
+                self._protocol.data_received(data)
+            if nbytes < size or self._paused or self._closing:
+                return
+            if byte_budget is not None:
+                byte_budget -= nbytes
+                if byte_budget <= 0:
+                    return
+
+    def set_cork(self, enabled, *, tcp_nodelay=None, tcp_cork=False):
+        """Turn cork mode on or off.
+
+        In cork mode, data written during one iteration of the event
+        loop is not sent right away but gathered and sent with a single
+        system call at the end of the iteration, or when flush() is
+        called.  Turning cork mode off flushes.
+
+        If tcp_nodelay is not None, TCP_NODELAY is set to it, so that
+        what is flushed goes out without waiting for Nagle's algorithm.
+        If tcp_cork is true (Linux only), TCP_CORK is set while cork
+        mode is on, so the kernel also holds back partial segments
+        across iterations; flush() then pushes them out.
+        """
+        if tcp_nodelay is not None:
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                  bool(tcp_nodelay))
+        tcp_cork = bool(enabled and tcp_cork)
+        if tcp_cork != self._tcp_cork:
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK,
+                                  tcp_cork)
+            self._tcp_cork = tcp_cork
+        self._corked = bool(enabled)
+        if not enabled:
+            self._flush_corked()
+
+    def flush(self):
+        """Send the data held back by cork mode now.
+
+        This does nothing once the transport is closing or its
+        connection is lost.
+        """
+        if self._conn_lost or self._closing or self._sock is None:
+            return
+        self._flush_corked()
+        if self._tcp_cork and not self._closing:
+            # Clearing TCP_CORK sends out a partial segment.
+            try:
+                self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+                self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+            except OSError:
+                pass
+
+    def _cork(self, data):
+        # Hold back data written in cork mode while nothing is buffered.
+        self._buffer.append(self._snapshot(data))
+        self._buffer_size += len(data)
+        if not self._cork_pending:
+            self._cork_pending = True
+            self._loop._flush_soon(self)
+        self._maybe_pause_protocol()
+
+    def _flush_corked(self):
+        if not self._cork_pending:
+            return
+        self._cork_pending = False
         try:
-            data = self._sock.recv(self.max_size)
+            self._send_buffer()
         except (BlockingIOError, InterruptedError):
             pass
-        except ConnectionResetError as exc:
+        except (BrokenPipeError, ConnectionResetError) as exc:
             self._force_close(exc)
+            return
         except Exception as exc:
             self._fatal_error(exc)
-        else:
-            if data:
-                self._protocol.data_received(data)
-            else:
-                keep_open = self._protocol.eof_received()
-                if not keep_open:
-                    self.close()
-
-    def write(self, data):
-        assert isinstance(data, bytes), repr(type(data))
-        assert not self._eof, 'Cannot call write() after write_eof()'
-        if not data:
             return
+        else:
+            self._maybe_resume_protocol()  # May append to buffer.
+        if self._buffer:
+            if not self._cork_pending:
+                self._loop.add_writer(self._sock_fd, self._write_ready)
+        elif self._sendfile_queue is not None:
+            self._drained()
+        elif self._closing:
+            self._call_connection_lost(None)
+        elif self._eof:
+            self._sock.shutdown(socket.SHUT_WR)
 
-        if self._conn_lost:
-            if self._conn_lost >= constants.LOG_THRESHOLD_FOR_CONNLOST_WRITES:
-                tulip_log.warning('socket.send() raised exception.')
-            self._conn_lost += 1
+    def _write(self, data):
+        if self._corked and not self._buffer:
+            self._cork(data)
             return
-
         if not self._buffer:
             # Attempt to send it right away first.
             try:
@@ -461,23 +1270,84 @@ class _SelectorSocketTransport(_SelectorTransport):
                 self._fatal_error(exc)
                 return
             else:
-                data = data[n:]
-                if not data:
+                if n == len(data):
                     return
+                if n:
+                    data = memoryview(data)[n:]
             # Start async I/O.
             self._loop.add_writer(self._sock_fd, self._write_ready)
 
-        self._buffer.append(data)
+        self._buffer.append(self._snapshot(data))
+        self._buffer_size += len(data)
+        self._maybe_pause_protocol()
+
+    def writelines(self, list_of_data):
+        """Write a list of data bytes with as few system calls as possible.
+
+        If nothing is buffered yet, all of it is passed to a single
+        sendmsg() call; what is not sent is queued without joining.
+        """
+        if (self._buffer or self._eof or self._conn_lost or self._corked or
+                self._sendfile_queue is not None):
+            # Let write() handle the checks.
+            for data in list_of_data:
+                self.write(data)
+            return
+        buffer = self._buffer
+        for data in list_of_data:
+            data = transports._byte_view(data)
+            if data:
+                buffer.append(data)
+                self._buffer_size += len(data)
+        if not buffer:
+            return
+        try:
+            self._send_buffer()
+        except (BlockingIOError, InterruptedError):
+            pass
+        except (BrokenPipeError, ConnectionResetError) as exc:
+            self._force_close(exc)
+            return
+        except OSError as exc:
+            self._fatal_error(exc)
+            return
+        if buffer:
+            for i in range(len(buffer)):
+                buffer[i] = self._snapshot(buffer[i])
+            self._loop.add_writer(self._sock_fd, self._write_ready)
+            self._maybe_pause_protocol()
+
+    def _send_buffer(self):
+        # Send from the buffer with a single system call and drop the
+        # data that was sent.  A partially sent chunk is replaced by a
+        # memoryview of its remainder, so nothing is copied.
+        buffer = self._buffer
+        if len(buffer) == 1:
+            n = self._sock.send(buffer[0])
+        elif _HAVE_SENDMSG:
+            n = self._sock.sendmsg(list(itertools.islice(buffer, _IOV_MAX)))
+        else:  # pragma: no cover
+            # Join once; later partial sends only slice the result.
+            data = b''.join(buffer)
+            buffer.clear()
+            buffer.append(data)
+            n = self._sock.send(data)
+        self._buffer_size -= n
+        while n:
+            chunk = buffer[0]
+            if n < len(chunk):
+                buffer[0] = memoryview(chunk)[n:]
+                break
+            n -= len(chunk)
+            buffer.popleft()
 
     def _write_ready(self):
-        data = b''.join(self._buffer)
-        assert data, 'Data should not be empty'
+        assert self._buffer, 'Data should not be empty'
 
-        self._buffer.clear()
         try:
-            n = self._sock.send(data)
+            self._send_buffer()
         except (BlockingIOError, InterruptedError):
-            self._buffer.append(data)
+            pass
         except (BrokenPipeError, ConnectionResetError) as exc:
             self._loop.remove_writer(self._sock_fd)
             self._force_close(exc)
@@ -485,227 +1355,269 @@ class _SelectorSocketTransport(_SelectorTransport):
             self._loop.remove_writer(self._sock_fd)
             self._fatal_error(exc)
         else:
-            data = data[n:]
-            if not data:
+            self._maybe_resume_protocol()  # May append to buffer.
+            if not self._buffer:
                 self._loop.remove_writer(self._sock_fd)
-                if self._closing:
+                if self._sendfile_queue is not None:
+                    self._drained()
+                elif self._closing:
                     self._call_connection_lost(None)
                 elif self._eof:
                     self._sock.shutdown(socket.SHUT_WR)
-                return
 
-            self._buffer.append(data)  # Try again later.
+    @tasks.coroutine
+    def _sendfile_native(self, file, offset, count):
+        fileno, count = _sendfile_args(self._sock, file, offset, count)
+        fut = self._sendfile_fut = futures.Future(loop=self._loop)
+        if count:
+            self._loop._sock_sendfile(fut, False, self._sock, fileno,
+                                      offset, count, 0)
+        else:
+            fut.set_result(0)
+        try:
+            total = yield from fut
+        finally:
+            self._sendfile_fut = None
+        file.seek(offset + total)
+        return total
+
+    def _sendfile_done(self):
+        if self._buffer:
+            self._loop.add_writer(self._sock_fd, self._write_ready)
+        elif self._closing:
+            self._loop.call_soon(self._call_connection_lost, None)
+        elif self._eof:
+            self._sock.shutdown(socket.SHUT_WR)
 
     def write_eof(self):
         if self._eof:
             return
         self._eof = True
-        if not self._buffer:
+        if not self._buffer and self._sendfile_queue is None:
             self._sock.shutdown(socket.SHUT_WR)
 
     def can_write_eof(self):
         return True
 
 
-class _SelectorSslTransport(_SelectorTransport):
-
-    def __init__(self, loop, rawsock, protocol, sslcontext, waiter=None,
-                 server_side=False, server_hostname=None,
-                 extra=None, server=None):
-        if server_side:
-            assert isinstance(
-                sslcontext, ssl.SSLContext), 'Must pass an SSLContext'
-        else:
-            # Client-side may pass ssl=True to use a default context.
-            # The default is the same as used by urllib.
-            if sslcontext is None:
-                sslcontext = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
-                sslcontext.options |= ssl.OP_NO_SSLv2
-                sslcontext.set_default_verify_paths()
-                sslcontext.verify_mode = ssl.CERT_REQUIRED
-        wrap_kwargs = {
-            'server_side': server_side,
-            'do_handshake_on_connect': False,
-        }
-        if server_hostname is not None and not server_side and ssl.HAS_SNI:
-            wrap_kwargs['server_hostname'] = server_hostname
-        sslsock = sslcontext.wrap_socket(rawsock, **wrap_kwargs)
-
-        super().__init__(loop, sslsock, protocol, extra, server)
-
-        self._server_hostname = server_hostname
-        self._waiter = waiter
-        self._rawsock = rawsock
-        self._sslcontext = sslcontext
-        self._paused = False
-
-        # SSL-specific extra info.  (peercert is set later)
-        self._extra.update(sslcontext=sslcontext)
+class _SelectorEdgeSocketTransport(_SelectorSocketTransport):
+    """Socket transport for an edge-triggered selector.
 
-        self._on_handshake()
+    The socket is registered once, for both reading and writing, and
+    stays registered until the connection is lost; pause(), resume()
+    and buffering writes cost no system calls.  Because the selector
+    only reports the socket when it becomes ready, every event is
+    followed by recv() or send() calls until they raise EAGAIN.  At
+    most read_budget reads (and read_byte_budget bytes) and
+    write_budget sends are done per callback so one busy connection
+    cannot starve the others; the rest is done in a callback
+    scheduled with call_soon().
+    """
 
-    def _on_handshake(self):
-        try:
-            self._sock.do_handshake()
-        except ssl.SSLWantReadError:
-            self._loop.add_reader(self._sock_fd, self._on_handshake)
-            return
-        except ssl.SSLWantWriteError:
-            self._loop.add_writer(self._sock_fd, self._on_handshake)
-            return
-        except Exception as exc:
-            self._sock.close()
-            if self._waiter is not None:
-                self._waiter.set_exception(exc)
-            return
-        except BaseException as exc:
-            self._sock.close()
-            if self._waiter is not None:
-                self._waiter.set_exception(exc)
-            raise
-
-        # Verify hostname if requested.
-        peercert = self._sock.getpeercert()
-        if (self._server_hostname is not None and
-            self._sslcontext.verify_mode == ssl.CERT_REQUIRED):
-            try:
-                ssl.match_hostname(peercert, self._server_hostname)
-            except Exception as exc:
-                self._sock.close()
-                if self._waiter is not None:
-                    self._waiter.set_exception(exc)
-                return
+    read_budget = 16
+    write_budget = 16
 
-        # Add extra info that becomes available after handshake.
-        self._extra.update(peercert=peercert,
-                           cipher=self._sock.cipher(),
-                           compression=self._sock.compression(),
-                           )
+    def __init__(self, loop, sock, protocol, waiter=None,
+                 extra=None, server=None):
+        _SelectorTransport.__init__(self, loop, sock, protocol, extra, server)
+        self._paused = False
+        self._read_eof = False
 
-        self._loop.remove_reader(self._sock_fd)
-        self._loop.remove_writer(self._sock_fd)
-        self._loop.add_reader(self._sock_fd, self._on_ready)
-        self._loop.add_writer(self._sock_fd, self._on_ready)
+        self._loop._add_edge_fd(self._sock_fd,
+                                self._read_ready, self._write_ready)
         self._loop.call_soon(self._protocol.connection_made, self)
-        if self._waiter is not None:
-            self._loop.call_soon(self._waiter.set_result, None)
+        if waiter is not None:
+            self._loop.call_soon(waiter.set_result, None)
 
     def pause(self):
-        # XXX This is a bit icky, given the comment at the top of
-        # _on_ready().  Is it possible to evoke a deadlock?  I don't
-        # know, although it doesn't look like it; write() will still
-        # accept more data for the buffer and eventually the app will
-        # call resume() again, and things will flow again.
-
         assert not self._closing, 'Cannot pause() when closing'
         assert not self._paused, 'Already paused'
         self._paused = True
-        self._loop.remove_reader(self._sock_fd)
 
     def resume(self):
         assert self._paused, 'Not paused'
         self._paused = False
         if self._closing:
             return
-        self._loop.add_reader(self._sock_fd, self._on_ready)
-
-    def _on_ready(self):
-        # Because of renegotiations (?), there's no difference between
-        # readable and writable.  We just try both.  XXX This may be
-        # incorrect; we probably need to keep state about what we
-        # should do next.
+        # No new event will come for data that arrived while paused.
+        if self._loop._fd_is_ready(self._sock_fd, selectors.EVENT_READ):
+            self._loop.call_soon(self._read_ready)
 
-        # First try reading.
-        if not self._closing and not self._paused:
+    def _read_ready(self):
+        if self._paused or self._closing or self._read_eof:
+            return
+        byte_budget = self.read_byte_budget
+        for i in range(self.read_budget):
             try:
-                data = self._sock.recv(self.max_size)
-            except (BlockingIOError, InterruptedError,
-                    ssl.SSLWantReadError, ssl.SSLWantWriteError):
-                pass
+                if self._buffered:
+                    buf = transports._get_buffer(self._protocol,
+                                                 self._recv_size)
+                    nbytes = self._sock.recv_into(buf)
+                else:
+                    data = self._sock.recv(self._recv_size)
+                    nbytes = len(data)
+            except BlockingIOError:
+                self._loop._clear_fd_ready(self._sock_fd,
+                                           selectors.EVENT_READ)
+                return
+            except InterruptedError:
+                continue
             except ConnectionResetError as exc:
                 self._force_close(exc)
+                return
             except Exception as exc:
                 self._fatal_error(exc)
+                return
+            if not nbytes:
+                self._read_eof = True
+                keep_open = self._protocol.eof_received()
+                if not keep_open:
+                    self.close()
+                return
+            self._adapt_recv_size(nbytes)
+            if self._buffered:
+                self._protocol.buffer_updated(nbytes)
             else:
-                if data:
-                    self._protocol.data_received(data)
-                else:
-                    try:
-                        self._protocol.eof_received()
-                    finally:
-                        self.close()
+                self._protocol.data_received(data)
+            if self._paused or self._closing:
+                return
+            if byte_budget is not None:
+                byte_budget -= nbytes
+                if byte_budget <= 0:
+                    break
+        # Out of budget but maybe not drained: continue later.
+        self._loop.call_soon(self._read_ready)
+
+    def _write(self, data):
+        if self._corked and not self._buffer:
+            self._cork(data)
+            return
+        if self._buffer or not self._loop._fd_is_ready(
+                self._sock_fd, selectors.EVENT_WRITE):
+            # _write_ready() will be called when the socket is writable.
+            self._buffer.append(self._snapshot(data))
+            self._buffer_size += len(data)
+            self._maybe_pause_protocol()
+            return
 
-        # Now try writing, if there's anything to write.
-        if self._buffer:
-            data = b''.join(self._buffer)
-            self._buffer.clear()
+        try:
+            n = self._sock.send(data)
+        except BlockingIOError:
+            self._loop._clear_fd_ready(self._sock_fd, selectors.EVENT_WRITE)
+            self._buffer.append(self._snapshot(data))
+            self._buffer_size += len(data)
+            self._maybe_pause_protocol()
+            return
+        except InterruptedError:
+            n = 0
+        except (BrokenPipeError, ConnectionResetError) as exc:
+            self._force_close(exc)
+            return
+        except OSError as exc:
+            self._fatal_error(exc)
+            return
+        if n < len(data):
+            # Partially sent: keep going until send() raises EAGAIN,
+            # otherwise no event may follow.
+            self._buffer.append(self._snapshot(memoryview(data)[n:]))
+            self._buffer_size += len(data) - n
+            self._loop.call_soon(self._write_ready)
+            self._maybe_pause_protocol()
+
+    def writelines(self, list_of_data):
+        # write() queues everything after the first chunk that cannot
+        # be sent, and _write_ready() sends the queue with sendmsg().
+        for data in list_of_data:
+            self.write(data)
+
+    def _write_ready(self):
+        if not self._buffer:
+            return
+        for i in range(self.write_budget):
             try:
-                n = self._sock.send(data)
-            except (BlockingIOError, InterruptedError,
-                    ssl.SSLWantReadError, ssl.SSLWantWriteError):
-                n = 0
+                self._send_buffer()
+            except BlockingIOError:
+                self._loop._clear_fd_ready(self._sock_fd,
+                                           selectors.EVENT_WRITE)
+                self._maybe_resume_protocol()
+                return
+            except InterruptedError:
+                continue
             except (BrokenPipeError, ConnectionResetError) as exc:
-                self._loop.remove_writer(self._sock_fd)
                 self._force_close(exc)
                 return
             except Exception as exc:
-                self._loop.remove_writer(self._sock_fd)
                 self._fatal_error(exc)
                 return
+            if not self._buffer:
+                # resume_writing() may write more, which is then sent
+                # by write() or by a scheduled _write_ready().
+                self._maybe_resume_protocol()
+                if self._buffer:
+                    return
+                if self._sendfile_queue is not None:
+                    self._drained()
+                elif self._closing:
+                    self._call_connection_lost(None)
+                elif self._eof:
+                    self._sock.shutdown(socket.SHUT_WR)
+                return
+        self._loop.call_soon(self._write_ready)
+        self._maybe_resume_protocol()
 
-            if n < len(data):
-                self._buffer.append(data[n:])
-
-        if self._closing and not self._buffer:
-            self._loop.remove_writer(self._sock_fd)
-            self._call_connection_lost(None)
-
-    def write(self, data):
-        assert isinstance(data, bytes), repr(type(data))
-        if not data:
-            return
-
-        if self._conn_lost:
-            if self._conn_lost >= constants.LOG_THRESHOLD_FOR_CONNLOST_WRITES:
-                tulip_log.warning('socket.send() raised exception.')
-            self._conn_lost += 1
-            return
+    def _flush_corked(self):
+        if self._cork_pending:
+            self._cork_pending = False
+            self._write_ready()
 
-        self._buffer.append(data)
-        # We could optimize, but the callback can do this for now.
+    # The socket stays registered for writing, so os.sendfile() is
+    # not used; the file is written through the buffer instead.
+    _sendfile_native = _SelectorTransport._sendfile_native
 
-    def can_write_eof(self):
-        return False
+    def _sendfile_done(self):
+        if self._buffer:
+            self._loop.call_soon(self._write_ready)
+        elif self._closing:
+            self._loop.call_soon(self._call_connection_lost, None)
+        elif self._eof:
+            self._sock.shutdown(socket.SHUT_WR)
 
-    def close(self):
-        if self._closing:
-            return
-        self._closing = True
-        self._conn_lost += 1
-        self._loop.remove_reader(self._sock_fd)
+    def _call_connection_lost(self, exc):
+        self._loop._remove_edge_fd(self._sock_fd)
+        super()._call_connection_lost(exc)
 
 
 class _SelectorDatagramTransport(_SelectorTransport):
 
     def __init__(self, loop, sock, protocol, address=None, extra=None):
         super().__init__(loop, sock, protocol, extra)
+        # Datagrams are read whole, so the size does not adapt.
+        self._recv_size = self._extra['recv_size'] = self.max_size
 
         self._address = address
         self._loop.add_reader(self._sock_fd, self._read_ready)
         self._loop.call_soon(self._protocol.connection_made, self)
 
     def _read_ready(self):
-        try:
-            data, addr = self._sock.recvfrom(self.max_size)
-        except (BlockingIOError, InterruptedError):
-            pass
-        except Exception as exc:
-            self._fatal_error(exc)
-        else:
+        byte_budget = self.read_byte_budget
+        for i in range(self.read_budget):
+            try:
+                data, addr = self._sock.recvfrom(self.max_size)
+            except (BlockingIOError, InterruptedError):
+                return
+            except Exception as exc:
+                self._fatal_error(exc)
+                return
             self._protocol.datagram_received(data, addr)
+            if self._closing:
+                return
+            if byte_budget is not None:
+                byte_budget -= len(data)
+                if byte_budget <= 0:
+                    return
 
     def sendto(self, data, addr=None):
-        assert isinstance(data, bytes), repr(type(data))
+        data = transports._byte_view(data)
         if not data:
             return
 
@@ -736,11 +1648,14 @@ class _SelectorDatagramTransport(_SelectorTransport):
                 self._fatal_error(exc)
                 return
 
-        self._buffer.append((data, addr))
+        self._buffer.append((self._snapshot(data), addr))
+        self._buffer_size += len(data)
+        self._maybe_pause_protocol()
 
     def _sendto_ready(self):
         while self._buffer:
             data, addr = self._buffer.popleft()
+            self._buffer_size -= len(data)
             try:
                 if self._address:
                     self._sock.send(data)
@@ -752,11 +1667,13 @@ class _SelectorDatagramTransport(_SelectorTransport):
                 return
             except (BlockingIOError, InterruptedError):
                 self._buffer.appendleft((data, addr))  # Try again later.
+                self._buffer_size += len(data)
                 break
             except Exception as exc:
                 self._fatal_error(exc)
                 return
 
+        self._maybe_resume_protocol()  # May append to buffer.
         if not self._buffer:
             self._loop.remove_writer(self._sock_fd)
             if self._closing:
@@ -112,19 +112,40 @@ class BaseSelector(metaclass=ABCMeta):
         Returns:
         SelectorKey instance
         """
-        # TODO: Subclasses can probably optimize this even further.
         try:
             key = self._fd_to_key[_fileobj_to_fd(fileobj)]
         except KeyError:
             raise KeyError("{!r} is not registered".format(fileobj)) from None
-        if events != key.events or data != key.data:
-            # TODO: If only the data changed, use a shortcut that only
-            # updates the data.
+        if events != key.events:
+            # Subclasses override this to change the events in place.
             self.unregister(fileobj)
             return self.register(fileobj, events, data)
+        elif data != key.data:
+            # Only the data changed; no need to bother the kernel.
+            key = key._replace(data=data)
+            self._fd_to_key[key.fd] = key
+            return key
         else:
             return key
 
+    def _modify_key(self, fileobj, events, data):
+        """Helper for subclasses that implement modify() natively.
+
+        Return (old_key, new_key) if the events have changed, after
+        storing new_key; otherwise return (None, key) from modify().
+        """
+        try:
+            key = self._fd_to_key[_fileobj_to_fd(fileobj)]
+        except KeyError:
+            raise KeyError("{!r} is not registered".format(fileobj)) from None
+        if events == key.events:
+            return None, BaseSelector.modify(self, fileobj, events, data)
+        if (not events) or (events & ~(EVENT_READ | EVENT_WRITE)):
+            raise ValueError("Invalid events: {!r}".format(events))
+        new_key = key._replace(events=events, data=data)
+        self._fd_to_key[key.fd] = new_key
+        return key, new_key
+
     @abstractmethod
     def select(self, timeout=None):
         """Perform the actual selection, until some monitored file objects are
@@ -144,6 +165,26 @@ class BaseSelector(metaclass=ABCMeta):
         """
         raise NotImplementedError()
 
+    # Masks to test the events returned by select_raw() with.
+    raw_read_events = EVENT_READ
+    raw_write_events = EVENT_WRITE
+
+    def select_raw(self, timeout=None):
+        """Like select(), but return the events as the OS reports them.
+
+        This is for callers that dispatch many events per second and
+        cannot afford the list of (key, events) tuples built by
+        select().  Where the OS returns (fd, events) pairs, as with
+        poll and epoll, they are returned as is.
+
+        Returns:
+        list of (fd, events) for ready file descriptors
+        the fd is ready for reading if events & self.raw_read_events,
+        and for writing if events & self.raw_write_events; `events` is
+        not masked with the registered events
+        """
+        return [(key.fd, events) for key, events in self.select(timeout)]
+
     def close(self):
         """Close the selector.
 
@@ -205,6 +246,19 @@ class SelectSelector(BaseSelector):
         self._writers.discard(key.fd)
         return key
 
+    def modify(self, fileobj, events, data=None):
+        old_key, key = self._modify_key(fileobj, events, data)
+        if old_key is not None:
+            if events & EVENT_READ:
+                self._readers.add(key.fd)
+            else:
+                self._readers.discard(key.fd)
+            if events & EVENT_WRITE:
+                self._writers.add(key.fd)
+            else:
+                self._writers.discard(key.fd)
+        return key
+
     if sys.platform == 'win32':
         def _select(self, r, w, _, timeout=None):
             r, w, x = select.select(r, w, w, timeout)
@@ -239,18 +293,24 @@ if hasattr(select, 'poll'):
     class PollSelector(BaseSelector):
         """Poll-based selector."""
 
+        raw_read_events = ~select.POLLOUT
+        raw_write_events = ~select.POLLIN
+
         def __init__(self):
             super().__init__()
             self._poll = select.poll()
 
-        def register(self, fileobj, events, data=None):
-            key = super().register(fileobj, events, data)
+        def _poll_events(self, events):
             poll_events = 0
             if events & EVENT_READ:
                 poll_events |= select.POLLIN
             if events & EVENT_WRITE:
                 poll_events |= select.POLLOUT
-            self._poll.register(key.fd, poll_events)
+            return poll_events
+
+        def register(self, fileobj, events, data=None):
+            key = super().register(fileobj, events, data)
+            self._poll.register(key.fd, self._poll_events(events))
             return key
 
         def unregister(self, fileobj):
@@ -258,6 +318,16 @@ if hasattr(select, 'poll'):
             self._poll.unregister(key.fd)
             return key
 
+        def modify(self, fileobj, events, data=None):
+            old_key, key = self._modify_key(fileobj, events, data)
+            if old_key is not None:
+                try:
+                    self._poll.modify(key.fd, self._poll_events(events))
+                except Exception:
+                    self._fd_to_key[key.fd] = old_key
+                    raise
+            return key
+
         def select(self, timeout=None):
             timeout = None if timeout is None else max(int(1000 * timeout), 0)
             ready = []
@@ -277,37 +347,81 @@ if hasattr(select, 'poll'):
                     ready.append((key, events & key.events))
             return ready
 
+        def select_raw(self, timeout=None):
+            timeout = None if timeout is None else max(int(1000 * timeout), 0)
+            try:
+                return self._poll.poll(timeout)
+            except InterruptedError:
+                return []
+
 
 if hasattr(select, 'epoll'):
 
     class EpollSelector(BaseSelector):
-        """Epoll-based selector."""
+        """Epoll-based selector.
+
+        File objects registered with edge_triggered=True are polled
+        with EPOLLET: an event is reported only when the file becomes
+        ready, not as long as it stays ready, so the caller must keep
+        reading or writing until it gets EAGAIN.
+        """
+
+        raw_read_events = ~select.EPOLLOUT
+        raw_write_events = ~select.EPOLLIN
 
         def __init__(self):
             super().__init__()
             self._epoll = select.epoll()
+            self._edge_fds = set()
 
         def fileno(self):
             return self._epoll.fileno()
 
-        def register(self, fileobj, events, data=None):
-            key = super().register(fileobj, events, data)
+        def _epoll_events(self, events, fd):
             epoll_events = 0
             if events & EVENT_READ:
                 epoll_events |= select.EPOLLIN
             if events & EVENT_WRITE:
                 epoll_events |= select.EPOLLOUT
-            self._epoll.register(key.fd, epoll_events)
+            if fd in self._edge_fds:
+                epoll_events |= select.EPOLLET
+            return epoll_events
+
+        def register(self, fileobj, events, data=None, *,
+                     edge_triggered=False):
+            key = super().register(fileobj, events, data)
+            if edge_triggered:
+                self._edge_fds.add(key.fd)
+            try:
+                self._epoll.register(key.fd,
+                                     self._epoll_events(events, key.fd))
+            except Exception:
+                super().unregister(fileobj)
+                self._edge_fds.discard(key.fd)
+                raise
             return key
 
         def unregister(self, fileobj):
             key = super().unregister(fileobj)
+            self._edge_fds.discard(key.fd)
             self._epoll.unregister(key.fd)
             return key
 
+        def modify(self, fileobj, events, data=None):
+            old_key, key = self._modify_key(fileobj, events, data)
+            if old_key is not None:
+                # One EPOLL_CTL_MOD instead of EPOLL_CTL_DEL + EPOLL_CTL_ADD.
+                try:
+                    self._epoll.modify(key.fd,
+                                       self._epoll_events(events, key.fd))
+                except Exception:
+                    self._fd_to_key[key.fd] = old_key
+                    raise
+            return key
+
         def select(self, timeout=None):
             timeout = -1 if timeout is None else max(timeout, 0)
-            max_ev = len(self._fd_to_key)
+            max_ev = max(len(self._fd_to_key), 1)
             ready = []
             try:
                 fd_event_list = self._epoll.poll(timeout, max_ev)
@@ -325,6 +439,14 @@ if hasattr(select, 'epoll'):
                     ready.append((key, events & key.events))
             return ready
 
+        def select_raw(self, timeout=None):
+            timeout = -1 if timeout is None else max(timeout, 0)
+            max_ev = max(len(self._fd_to_key), 1)
+            try:
+                return self._epoll.poll(timeout, max_ev)
+            except InterruptedError:
+                return []
+
         def close(self):
             super().close()
             self._epoll.close()
@@ -366,6 +488,27 @@ if hasattr(select, 'kqueue'):
                 self._kqueue.control([kev], 0, 0)
             return key
 
+        def modify(self, fileobj, events, data=None):
+            old_key, key = self._modify_key(fileobj, events, data)
+            if old_key is not None:
+                # Submit only the difference, in a single kevent() call.
+                changes = []
+                for event, kq_filter in ((EVENT_READ, select.KQ_FILTER_READ),
+                                         (EVENT_WRITE,
+                                          select.KQ_FILTER_WRITE)):
+                    if events & event and not old_key.events & event:
+                        changes.append(select.kevent(key.fd, kq_filter,
+                                                     select.KQ_EV_ADD))
+                    elif old_key.events & event and not events & event:
+                        changes.append(select.kevent(key.fd, kq_filter,
+                                                     select.KQ_EV_DELETE))
+                try:
+                    self._kqueue.control(changes, 0, 0)
+                except Exception:
+                    self._fd_to_key[key.fd] = old_key
+                    raise
+            return key
+
         def select(self, timeout=None):
             timeout = None if timeout is None else max(timeout, 0)
             max_ev = len(self._fd_to_key)
@@ -0,0 +1,648 @@
+"""SSL/TLS on top of a plain stream transport.
+
+SSLProtocol is the protocol of an ordinary stream transport (e.g. a
+selector socket transport), which only carries ciphertext.  It runs
+the SSL state machine on an ssl.SSLObject with a pair of memory BIOs
+and gives the application protocol an _SSLProtocolTransport that
+carries plaintext.  Since the socket is only watched for writability
+while the stream transport has ciphertext to send, idle connections
+don't wake up the event loop.
+"""
+
+import collections
+import time
+try:
+    import ssl
+except ImportError:  # pragma: no cover
+    ssl = None
+
+from . import base_events
+from . import futures
+from . import protocols
+from . import tasks
+from . import transports
+from .log import tulip_log
+
+
+# States of SSLProtocol.
+_UNWRAPPED = 'UNWRAPPED'
+_DO_HANDSHAKE = 'DO_HANDSHAKE'
+_WRAPPED = 'WRAPPED'
+
+# A TLS record carries at most 16 KiB of plaintext, so this is the
+# most one SSLObject.read() call returns.
+_MAX_PLAINTEXT = 16 * 1024
+
+# ssl.SSLSession and the session argument of wrap_bio() are new in
+# Python 3.6; without them sessions are not resumed.
+_HAS_SESSIONS = ssl is not None and hasattr(ssl, 'SSLSession')
+
+
+def _create_default_context():
+    # Client-side may pass ssl=True to use a default context.
+    # The default is the same as used by urllib.
+    sslcontext = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    sslcontext.options |= ssl.OP_NO_SSLv2
+    sslcontext.set_default_verify_paths()
+    sslcontext.verify_mode = ssl.CERT_REQUIRED
+    return sslcontext
+
+
+class SSLSessionCache:
+    """Cache of client SSL sessions, to resume them.
+
+    Sessions are stored under a key, which the event loop makes from
+    the SSL context, the peer address and the server hostname; at
+    most maxsize of them are kept, the least recently used one is
+    dropped first.  Expired sessions are not returned.  Sessions are
+    only resumed on Python 3.6 or later (see ssl.SSLSession).
+
+    The cache also counts what happens: hits and misses count lookups
+    that did or did not find a session, client_reused and
+    server_reused how many of the client_handshakes and
+    server_handshakes resumed a session.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._sessions = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.client_handshakes = 0
+        self.client_reused = 0
+        self.server_handshakes = 0
+        self.server_reused = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, key):
+        """Return the session stored under key, or None."""
+        session = self._sessions.get(key)
+        if (session is not None and
+                session.time + session.timeout <= time.time()):
+            del self._sessions[key]
+            session = None
+        if session is None:
+            self.misses += 1
+            return None
+        self._sessions.move_to_end(key)
+        self.hits += 1
+        return session
+
+    def put(self, key, session):
+        """Store session under key."""
+        if session is None or self.maxsize <= 0:
+            return
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.maxsize:
+            self._sessions.popitem(last=False)
+
+    def discard(self, key):
+        """Forget the session stored under key, if any."""
+        self._sessions.pop(key, None)
+
+    def clear(self):
+        """Forget all sessions; the counters are kept."""
+        self._sessions.clear()
+
+    def get_stats(self):
+        """Return a dict with the size of the cache and the counters."""
+        return {'cached': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'client_handshakes': self.client_handshakes,
+                'client_reused': self.client_reused,
+                'server_handshakes': self.server_handshakes,
+                'server_reused': self.server_reused,
+                }
+
+
+class _SSLProtocolTransport(transports._FlowControlMixin,
+                            transports.Transport):
+    """The transport given to the application protocol.
+
+    Everything is delegated to the SSLProtocol, which writes the
+    ciphertext to the underlying transport.  Write flow control is
+    that of the underlying transport; _FlowControlMixin only provides
+    set_write_copy() for the plaintext that is held back.
+    """
+
+    def __init__(self, loop, ssl_protocol):
+        self._loop = loop
+        self._ssl_protocol = ssl_protocol
+        super().__init__()
+
+    def get_extra_info(self, name, default=None):
+        return self._ssl_protocol._get_extra_info(name, default)
+
+    def close(self):
+        self._ssl_protocol._start_shutdown()
+
+    def pause(self):
+        self._ssl_protocol._pause_reading()
+
+    def resume(self):
+        self._ssl_protocol._resume_reading()
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        transport = self._ssl_protocol._transport
+        if transport is not None:
+            transport.set_write_buffer_limits(high, low)
+
+    def get_write_buffer_size(self):
+        return self._ssl_protocol._get_write_buffer_size()
+
+    def write(self, data):
+        data = transports._byte_view(data)
+        if data:
+            self._ssl_protocol._write(data)
+
+    def set_cork(self, enabled, *, tcp_nodelay=None, tcp_cork=False):
+        # Corking the underlying transport coalesces the TLS records.
+        transport = self._ssl_protocol._transport
+        if transport is not None:
+            transport.set_cork(enabled, tcp_nodelay=tcp_nodelay,
+                               tcp_cork=tcp_cork)
+
+    def flush(self):
+        transport = self._ssl_protocol._transport
+        if transport is not None:
+            transport.flush()
+
+    def sendfile(self, file, offset=0, count=None):
+        """Send a file; see WriteTransport.sendfile().
+
+        The file is read in chunks and encrypted; os.sendfile() cannot
+        be used.
+        """
+        return self._ssl_protocol._sendfile(file, offset, count)
+
+    def write_eof(self):
+        self._ssl_protocol._write_eof()
+
+    def can_write_eof(self):
+        return True
+
+    def abort(self):
+        self._ssl_protocol._abort()
+
+
+class SSLProtocol(protocols.BufferedProtocol):
+    """SSL protocol.
+
+    Wraps app_protocol: create the underlying stream transport with
+    an SSLProtocol instance as its protocol and hand _app_transport
+    to the caller.  waiter, if not None, is a future that is set when
+    the handshake is done, or failed.
+
+    session_cache, if not None, is an SSLSessionCache that counts the
+    handshakes; on the client side, the session stored under
+    session_key is resumed, and the session of this connection is
+    stored there in turn.
+    """
+
+    def __init__(self, loop, app_protocol, sslcontext, waiter,
+                 server_side=False, server_hostname=None, *,
+                 session_cache=None, session_key=None):
+        if ssl is None:  # pragma: no cover
+            raise RuntimeError('stdlib ssl module not available')
+        if server_side:
+            assert isinstance(
+                sslcontext, ssl.SSLContext), 'Must pass an SSLContext'
+            session_key = None
+        elif sslcontext is None:
+            sslcontext = _create_default_context()
+        if server_side or not ssl.HAS_SNI:
+            server_hostname = None
+        if not _HAS_SESSIONS:
+            session_key = None
+
+        self._loop = loop
+        self._transport = None
+        self._app_protocol = app_protocol
+        self._app_buffered = isinstance(app_protocol,
+                                        protocols.BufferedProtocol)
+        self._app_transport = _SSLProtocolTransport(loop, self)
+        self._sslcontext = sslcontext
+        self._server_hostname = server_hostname
+        self._waiter = waiter
+        self._extra = dict(sslcontext=sslcontext)
+
+        self._server_side = server_side
+        self._session_cache = session_cache
+        self._session_key = session_key
+        session = None
+        if session_cache is not None and session_key is not None:
+            session = session_cache.get(session_key)
+
+        self._incoming = ssl.MemoryBIO()
+        self._outgoing = ssl.MemoryBIO()
+        kwargs = {}
+        if _HAS_SESSIONS:
+            kwargs['session'] = session
+        self._sslobj = sslcontext.wrap_bio(
+            self._incoming, self._outgoing, server_side=server_side,
+            server_hostname=server_hostname, **kwargs)
+        self._state = _UNWRAPPED
+        self._recv_buffer = None
+        self._connected = False  # Set when app connection_made() called.
+        self._paused = False  # Set by pause(), cleared by resume().
+        self._closing = False  # Set when close() or abort() called.
+        self._eof = False  # Set when write_eof() called.
+        self._eof_sent = False  # Set when close_notify has been sent.
+        self._eof_received = False  # Set when the peer's EOF is passed on.
+        self._write_paused = False  # Underlying transport over high-water.
+        # Plaintext that cannot be encrypted until the handshake (or a
+        # renegotiation) is done.
+        self._write_backlog = collections.deque()
+        self._write_backlog_size = 0
+        self._sendfile_queue = None  # Data written during sendfile().
+        self._drain_waiter = None
+
+    def _get_extra_info(self, name, default=None):
+        if name in self._extra:
+            return self._extra[name]
+        if self._transport is not None:
+            return self._transport.get_extra_info(name, default)
+        return default
+
+    def _wakeup_waiter(self, exc=None):
+        waiter = self._waiter
+        self._waiter = None
+        if waiter is not None and not waiter.cancelled():
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._state = _DO_HANDSHAKE
+        self._do_handshake()
+
+    def connection_lost(self, exc):
+        if self._state == _DO_HANDSHAKE:
+            self._wakeup_waiter(exc or ConnectionResetError(
+                'Connection lost during SSL handshake'))
+        elif self._connected:
+            # With TLS 1.3, the ticket that makes the session resumable
+            # arrives after the handshake.
+            self._store_session()
+        self._state = _UNWRAPPED
+        self._transport = None
+        self._write_backlog.clear()
+        self._write_backlog_size = 0
+        self._sendfile_queue = None
+        self._drained()
+        if self._connected:
+            self._connected = False
+            self._app_protocol.connection_lost(exc)
+        self._app_transport = None
+        self._app_protocol = None
+
+    def pause_writing(self):
+        self._write_paused = True
+        self._app_protocol.pause_writing()
+
+    def resume_writing(self):
+        self._write_paused = False
+        self._drained()
+        self._app_protocol.resume_writing()
+
+    def get_buffer(self, sizehint):
+        # Ciphertext is received into a buffer that is reused as long
+        # as it is large enough.
+        if self._recv_buffer is None or len(self._recv_buffer) < sizehint:
+            self._recv_buffer = memoryview(bytearray(sizehint))
+        return self._recv_buffer[:sizehint]
+
+    def buffer_updated(self, nbytes):
+        self._incoming.write(self._recv_buffer[:nbytes])
+        if self._state == _DO_HANDSHAKE:
+            self._do_handshake()
+        elif self._state == _WRAPPED:
+            self._read_plaintext()
+
+    def eof_received(self):
+        if self._state == _DO_HANDSHAKE:
+            self._handshake_failed(ConnectionResetError(
+                'Connection lost during SSL handshake'))
+        elif self._state == _WRAPPED:
+            # Pass on what is left; reading past it raises SSLEOFError
+            # unless the peer sent close_notify.
+            self._incoming.write_eof()
+            self._read_plaintext()
+        # Whether to close is up to the application protocol.
+        return True
+
+    def _do_handshake(self):
+        try:
+            self._sslobj.do_handshake()
+        except ssl.SSLWantReadError:
+            self._flush_outgoing()
+            return
+        except Exception as exc:
+            # Send the alert, if any.
+            self._flush_outgoing()
+            self._handshake_failed(exc)
+            return
+
+        # Verify hostname if requested.
+        peercert = self._sslobj.getpeercert()
+        if (self._server_hostname is not None and
+            self._sslcontext.verify_mode == ssl.CERT_REQUIRED):
+            try:
+                ssl.match_hostname(peercert, self._server_hostname)
+            except Exception as exc:
+                self._handshake_failed(exc)
+                return
+
+        # Add extra info that becomes available after handshake.
+        self._extra.update(peercert=peercert,
+                           cipher=self._sslobj.cipher(),
+                           compression=self._sslobj.compression(),
+                           ssl_object=self._sslobj,
+                           )
+
+        self._state = _WRAPPED
+        self._flush_outgoing()
+        self._count_handshake()
+        self._store_session()
+        self._connected = True
+        self._app_protocol.connection_made(self._app_transport)
+        self._wakeup_waiter()
+        self._process_write_backlog()
+        # The last handshake record may have been followed by data.
+        if self._state == _WRAPPED:
+            self._read_plaintext()
+
+    def _count_handshake(self):
+        cache = self._session_cache
+        if cache is None:
+            return
+        reused = getattr(self._sslobj, 'session_reused', False)
+        if self._server_side:
+            cache.server_handshakes += 1
+            cache.server_reused += reused
+        else:
+            cache.client_handshakes += 1
+            cache.client_reused += reused
+
+    def _store_session(self):
+        if self._session_cache is not None and self._session_key is not None:
+            self._session_cache.put(self._session_key, self._sslobj.session)
+
+    def _handshake_failed(self, exc):
+        if self._session_cache is not None and self._session_key is not None:
+            # Don't try the same session again.
+            self._session_cache.discard(self._session_key)
+        self._state = _UNWRAPPED
+        self._wakeup_waiter(exc)
+        self._transport.abort()
+
+    def _read_plaintext(self):
+        # Decrypt and pass on what has been received, unless reading
+        # is paused; the rest stays in the SSL object until resume().
+        try:
+            while not (self._paused or self._closing or self._eof_received):
+                if self._app_buffered:
+                    buf = transports._get_buffer(self._app_protocol,
+                                                 _MAX_PLAINTEXT)
+                    nbytes = self._sslobj.read(len(buf), buf)
+                    if not nbytes:
+                        self._on_eof()
+                        break
+                    self._app_protocol.buffer_updated(nbytes)
+                else:
+                    data = self._sslobj.read(_MAX_PLAINTEXT)
+                    if not data:
+                        self._on_eof()
+                        break
+                    self._app_protocol.data_received(data)
+        except ssl.SSLWantReadError:
+            pass
+        except ssl.SSLError as exc:
+            # The connection was closed without close_notify.  Not all
+            # OpenSSL versions report that as SSLEOFError.
+            if not (isinstance(exc, ssl.SSLEOFError) or self._incoming.eof):
+                self._fatal_error(exc)
+                return
+            self._on_eof()
+        except Exception as exc:
+            self._fatal_error(exc)
+            return
+        # Reading may have produced records to send (a renegotiation),
+        # after which plaintext held back can be encrypted.
+        self._flush_outgoing()
+        self._process_write_backlog()
+
+    def _on_eof(self):
+        if self._eof_received or self._state != _WRAPPED:
+            return
+        self._eof_received = True
+        keep_open = self._app_protocol.eof_received()
+        if not keep_open or self._eof:
+            self._start_shutdown()
+
+    def _pause_reading(self):
+        assert not self._closing, 'Cannot pause() when closing'
+        assert not self._paused, 'Already paused'
+        self._paused = True
+        self._transport.pause()
+
+    def _resume_reading(self):
+        assert self._paused, 'Not paused'
+        self._paused = False
+        if self._closing:
+            return
+        self._transport.resume()
+        # Pass on what was held back while paused.
+        self._loop.call_soon(self._resume_read_plaintext)
+
+    def _resume_read_plaintext(self):
+        if self._state == _WRAPPED:
+            self._read_plaintext()
+
+    def _get_write_buffer_size(self):
+        size = self._write_backlog_size
+        if self._transport is not None:
+            size += self._transport.get_write_buffer_size()
+        if self._sendfile_queue is not None:
+            size += sum(len(data) for data in self._sendfile_queue)
+        return size
+
+    def _write(self, data):
+        assert not self._eof, 'Cannot call write() after write_eof()'
+        if self._transport is None or self._closing:
+            return
+        if self._sendfile_queue is not None:
+            # Send it after the file.
+            self._sendfile_queue.append(self._app_transport._snapshot(data))
+            return
+        self._encrypt(data)
+
+    def _encrypt(self, data):
+        if self._state != _WRAPPED or self._write_backlog:
+            self._write_backlog.append(self._app_transport._snapshot(data))
+            self._write_backlog_size += len(data)
+            return
+        try:
+            n = self._sslobj.write(data)
+        except ssl.SSLWantReadError:
+            # Renegotiating; wait for the peer.
+            n = 0
+        except Exception as exc:
+            self._fatal_error(exc)
+            return
+        if n < len(data):
+            self._write_backlog.append(
+                self._app_transport._snapshot(data[n:]))
+            self._write_backlog_size += len(data) - n
+        self._flush_outgoing()
+
+    def _process_write_backlog(self):
+        while self._write_backlog and self._state == _WRAPPED:
+            data = self._write_backlog[0]
+            try:
+                n = self._sslobj.write(data)
+            except ssl.SSLWantReadError:
+                break
+            except Exception as exc:
+                self._fatal_error(exc)
+                return
+            self._write_backlog_size -= n
+            if n < len(data):
+                self._write_backlog[0] = data[n:]
+            else:
+                self._write_backlog.popleft()
+        self._flush_outgoing()
+        if not self._write_backlog and self._state == _WRAPPED:
+            if self._closing:
+                self._finish_shutdown()
+            elif self._eof and not self._eof_sent:
+                self._shutdown_write()
+
+    def _flush_outgoing(self):
+        if self._outgoing.pending and self._transport is not None:
+            data = self._outgoing.read()
+            if not self._eof_sent:
+                self._transport.write(data)
+
+    def _send_close_notify(self):
+        if self._eof_sent:
+            return
+        try:
+            self._sslobj.unwrap()
+        except ssl.SSLWantReadError:
+            pass  # The peer's close_notify has not arrived yet.
+        except ssl.SSLError as exc:
+            tulip_log.debug('SSL shutdown failed: %r', exc)
+        self._flush_outgoing()
+        self._eof_sent = True
+
+    def _write_eof(self):
+        if self._eof:
+            return
+        self._eof = True
+        if self._sendfile_queue is None:
+            self._process_write_backlog()
+
+    def _shutdown_write(self):
+        # Half-close: send close_notify, then EOF on the socket.
+        # Receiving still works until the peer closes its side.
+        self._send_close_notify()
+        self._transport.write_eof()
+        if self._eof_received:
+            self._start_shutdown()
+
+    def _start_shutdown(self):
+        if self._closing:
+            return
+        self._closing = True
+        if self._transport is None:
+            return
+        if self._state != _WRAPPED:
+            self._transport.close()
+        elif self._sendfile_queue is None:
+            self._process_write_backlog()
+
+    def _finish_shutdown(self):
+        # The peer's close_notify is not waited for.
+        self._send_close_notify()
+        self._state = _UNWRAPPED
+        self._transport.close()
+
+    def _abort(self):
+        self._closing = True
+        if self._transport is not None:
+            self._transport.abort()
+
+    def _fatal_error(self, exc):
+        # should be called from exception handler only
+        tulip_log.exception('Fatal error for %s', self)
+        self._closing = True
+        if self._transport is not None:
+            self._transport._force_close(exc)
+
+    @tasks.coroutine
+    def _sendfile(self, file, offset, count):
+        assert not self._eof, 'Cannot call sendfile() after write_eof()'
+        assert self._sendfile_queue is None, 'sendfile() already running'
+        if offset < 0:
+            raise ValueError('offset must be >= 0')
+        if count is not None and count < 0:
+            raise ValueError('count must be None or >= 0')
+        if self._transport is None or self._closing:
+            raise ConnectionResetError('Connection lost')
+        queue = self._sendfile_queue = collections.deque()
+        try:
+            file.seek(offset)
+            total = 0
+            while count is None or total < count:
+                size = base_events._SENDFILE_CHUNK_SIZE
+                if count is not None:
+                    size = min(size, count - total)
+                data = file.read(size)
+                if not data:
+                    break
+                self._encrypt(data)
+                total += len(data)
+                if self._transport_lost():
+                    raise ConnectionResetError('Connection lost')
+                yield from self._drain()
+        finally:
+            # Unless the connection was lost, send what was written in
+            # the meantime.
+            if self._sendfile_queue is queue:
+                self._sendfile_queue = None
+                for data in queue:
+                    self._encrypt(data)
+                if self._eof or self._closing:
+                    self._process_write_backlog()
+        return total
+
+    def _transport_lost(self):
+        # The transport drops what is written to it once its connection
+        # is lost, but connection_lost() is only called later.
+        return (self._transport is None or self._sendfile_queue is None or
+                bool(self._transport._conn_lost))
+
+    @tasks.coroutine
+    def _drain(self):
+        # Wait while the underlying transport is above its high-water
+        # mark during sendfile().
+        if self._write_paused:
+            self._drain_waiter = futures.Future(loop=self._loop)
+            try:
+                yield from self._drain_waiter
+            finally:
+                self._drain_waiter = None
+        if self._sendfile_queue is None:
+            raise ConnectionResetError('Connection lost')
+
+    def _drained(self):
+        waiter = self._drain_waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
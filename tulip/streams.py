@@ -42,7 +42,7 @@ def open_connection(host=None, port=None, *,
     return reader, transport  # (reader, writer)
 
 
-class StreamReaderProtocol(protocols.Protocol):
+class StreamReaderProtocol(protocols.BufferedProtocol):
     """Trivial helper class to adapt between Protocol and StreamReader.
 
     (This is a helper class instead of making StreamReader itself a
@@ -63,7 +63,14 @@ class StreamReaderProtocol(protocols.Protocol):
         else:
             self.stream_reader.set_exception(exc)
 
+    def get_buffer(self, sizehint):
+        return self.stream_reader.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.stream_reader.buffer_updated(nbytes)
+
     def data_received(self, data):
+        # For transports that don't support BufferedProtocol.
         self.stream_reader.feed_data(data)
 
     def eof_received(self):
@@ -86,6 +93,7 @@ class StreamReader:
         self._exception = None
         self._transport = None
         self._paused = False
+        self._recv_buffer = None  # Returned by get_buffer().
 
     def exception(self):
         return self._exception
@@ -116,6 +124,22 @@ class StreamReader:
             if not waiter.cancelled():
                 waiter.set_result(True)
 
+    def get_buffer(self, sizehint):
+        """Return a buffer for the transport to receive data into.
+
+        The same bytearray is reused for every read; buffer_updated()
+        appends the data received in it to the stream's buffer.
+        """
+        if self._recv_buffer is None or len(self._recv_buffer) < sizehint:
+            self._recv_buffer = memoryview(bytearray(sizehint))
+        return self._recv_buffer
+
+    def buffer_updated(self, nbytes):
+        # Slicing the memoryview does not copy; bytes() makes the one
+        # copy needed because buffer holds bytes objects and the
+        # receive buffer is reused for the next read.
+        self.feed_data(bytes(self._recv_buffer[:nbytes]))
+
     def feed_data(self, data):
         if not data:
             return
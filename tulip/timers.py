@@ -0,0 +1,247 @@
+"""Hierarchical timing wheel for scheduling TimerHandles.
+
+The default timer queue of the event loop is a heap of TimerHandles.
+That is O(log n) for every push and pop, and cancelled handles stay in
+the heap until they reach its head.  When most timers are cancelled
+before they expire (read and idle timeouts, typically) the heap mostly
+holds garbage.
+
+A TimerWheel gives O(1) insertion and O(1) removal on cancel.  Time
+is divided into ticks of `resolution` seconds.  Level 0 has one slot
+per tick for the next 64 ticks; each higher level has 64 slots that
+each cover 64 times the span of a slot in the level below.  Timers
+are moved down a level ("cascaded") when the current tick crosses the
+boundary of their slot, like the classic Linux kernel timer wheel.
+
+Handles are fired exactly when their deadline has passed, so the
+call_at() semantics of the loop are unchanged; the resolution only
+bounds how much work is needed to find the next deadline.
+
+Use BaseEventLoop.set_timer_wheel() to select it for a loop.
+"""
+
+__all__ = ['TimerWheel']
+
+import math
+
+
+_BITS = 6
+_SIZE = 1 << _BITS
+_MASK = _SIZE - 1
+_LEVELS = 4
+_MAX_DELTA = (1 << (_BITS * _LEVELS)) - 1
+
+
+class TimerWheel:
+    """Timer queue with O(1) insert and cancel."""
+
+    def __init__(self, resolution=0.001):
+        if resolution <= 0:
+            raise ValueError('resolution must be positive')
+        self._resolution = resolution
+        self._levels = [[{} for i in range(_SIZE)] for j in range(_LEVELS)]
+        self._counts = [0] * _LEVELS
+        self._where = {}  # Maps id(handle) to (level, slot).
+        self._due = {}  # Handles whose tick has already been processed.
+        self._current = None  # Next tick to process.
+        self._cascaded = None  # Last tick at which we cascaded.
+
+    def __len__(self):
+        return len(self._where) + len(self._due)
+
+    @property
+    def resolution(self):
+        return self._resolution
+
+    def _tick(self, when):
+        # The epsilon makes exact multiples of the resolution map to
+        # their own tick despite floating point rounding.
+        return math.floor(when / self._resolution + 1e-9)
+
+    def _time(self, tick):
+        # The inverse of _tick(), rounded up: tick * resolution may
+        # fall just short of the tick, and a deadline that maps to the
+        # previous tick would never let pop_expired() reach it.
+        when = tick * self._resolution
+        if self._tick(when) < tick:
+            when = (tick + 0.5) * self._resolution
+        return when
+
+    def reset(self, now):
+        """Start counting ticks from the given time.
+
+        This must be called while the wheel is empty, before it is
+        used; BaseEventLoop.set_timer_wheel() does this.
+        """
+        assert not self, 'Cannot reset a non-empty TimerWheel'
+        self._current = self._tick(now)
+        self._cascaded = None
+
+    def push(self, handle):
+        """Add a TimerHandle."""
+        assert self._current is not None, 'TimerWheel.reset() not called'
+        key = id(handle)
+        assert key not in self._where and key not in self._due
+        self._place(key, handle)
+
+    def _place(self, key, handle):
+        tick = self._tick(handle._when)
+        delta = tick - self._current
+        if delta < 0:
+            # That tick has already been processed.
+            self._due[key] = handle
+            return
+        if delta > _MAX_DELTA:
+            # Too far in the future; park it in the farthest slot.  It
+            # will be placed again when that slot is cascaded.
+            delta = _MAX_DELTA
+            tick = self._current + delta
+        level = 0
+        while delta >= _SIZE:
+            delta >>= _BITS
+            level += 1
+        slot = (tick >> (_BITS * level)) & _MASK
+        self._levels[level][slot][key] = handle
+        self._counts[level] += 1
+        self._where[key] = (level, slot)
+
+    def discard(self, handle):
+        """Remove a TimerHandle if it is in the wheel.
+
+        Return True if it was removed, False if it was not there.
+        """
+        key = id(handle)
+        if self._due.pop(key, None) is not None:
+            return True
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self._levels[level][slot][key]
+        self._counts[level] -= 1
+        return True
+
+    def next_deadline(self):
+        """Return a time no later than the earliest deadline, or None.
+
+        For timers in level 0 this is the exact deadline; for higher
+        levels it is the time at which their slot is cascaded, so the
+        loop may wake up early once in a while.
+        """
+        deadline = None
+        if self._due:
+            deadline = min(handle._when for handle in self._due.values())
+        if not self._where:
+            return deadline
+        cur = self._current
+        if self._counts[0]:
+            level0 = self._levels[0]
+            for tick in range(cur, cur + _SIZE):
+                slot = level0[tick & _MASK]
+                if slot:
+                    when = min(handle._when for handle in slot.values())
+                    if deadline is None or when < deadline:
+                        deadline = when
+                    break
+        cascade = None
+        for level in range(1, _LEVELS):
+            if not self._counts[level]:
+                continue
+            shift = _BITS * level
+            slots = self._levels[level]
+            base = cur >> shift
+            if (base << shift) == cur and self._cascaded != cur:
+                start = 0  # Cascade still pending at the current tick.
+            else:
+                start = 1
+            for i in range(start, _SIZE + 1):
+                if slots[(base + i) & _MASK]:
+                    tick = (base + i) << shift
+                    if cascade is None or tick < cascade:
+                        cascade = tick
+                    break
+        if cascade is not None:
+            when = self._time(cascade)
+            if deadline is None or when < deadline:
+                deadline = when
+        return deadline
+
+    def pop_expired(self, now):
+        """Remove and return the handles whose deadline is <= now.
+
+        The handles are returned sorted by deadline.
+        """
+        expired = []
+        if self._due:
+            for key, handle in list(self._due.items()):
+                if handle._when <= now:
+                    del self._due[key]
+                    expired.append(handle)
+        target = self._tick(now)
+        if not self._where:
+            if target > self._current:
+                self._current = target
+                self._cascaded = None
+            if len(expired) > 1:
+                expired.sort()
+            return expired
+
+        levels = self._levels
+        counts = self._counts
+        where = self._where
+        cur = self._current
+        while cur <= target:
+            if not cur & _MASK and self._cascaded != cur:
+                self._cascaded = cur
+                self._current = cur
+                self._cascade(cur)
+            slot = levels[0][cur & _MASK]
+            if slot:
+                for key, handle in list(slot.items()):
+                    if handle._when <= now:
+                        del slot[key]
+                        del where[key]
+                        counts[0] -= 1
+                        expired.append(handle)
+            if cur == target:
+                break
+            # Skip ahead over ticks where nothing can happen.
+            if counts[0]:
+                cur += 1
+            else:
+                for level in range(1, _LEVELS):
+                    if counts[level]:
+                        break
+                else:
+                    cur = target
+                    continue
+                cur = min((cur | ((1 << (_BITS * level)) - 1)) + 1, target)
+        self._current = cur
+        if len(expired) > 1:
+            expired.sort()
+        return expired
+
+    def _cascade(self, cur):
+        for level in range(1, _LEVELS):
+            index = (cur >> (_BITS * level)) & _MASK
+            slot = self._levels[level][index]
+            if slot:
+                self._levels[level][index] = {}
+                self._counts[level] -= len(slot)
+                for key, handle in slot.items():
+                    del self._where[key]
+                    self._place(key, handle)
+            if index:
+                break
+
+    def clear(self):
+        """Remove and return all handles."""
+        handles = list(self._due.values())
+        for level in self._levels:
+            for slot in level:
+                handles.extend(slot.values())
+                slot.clear()
+        self._counts = [0] * _LEVELS
+        self._where.clear()
+        self._due.clear()
+        return handles
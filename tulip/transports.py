@@ -2,6 +2,8 @@
 
 __all__ = ['ReadTransport', 'WriteTransport', 'Transport']
 
+from .log import tulip_log
+
 
 class BaseTransport:
     """Base ABC for transports."""
@@ -49,11 +51,49 @@ class ReadTransport(BaseTransport):
 class WriteTransport(BaseTransport):
     """ABC for write-only transports."""
 
+    def set_write_buffer_limits(self, high=None, low=None):
+        """Set the high- and low-water limits for write flow control.
+
+        These two values control when to call the protocol's
+        pause_writing() and resume_writing() methods.  If specified,
+        the low-water limit must be less than or equal to the
+        high-water limit.  Neither value can be negative.
+
+        The defaults are implementation-specific.  If only the
+        high-water limit is given, the low-water limit defaults to a
+        implementation-specific value less than or equal to the
+        high-water limit.  Setting high to zero forces low to zero as
+        well, and causes pause_writing() to be called whenever the
+        buffer becomes non-empty.
+        """
+        raise NotImplementedError
+
+    def get_write_buffer_size(self):
+        """Return the current size of the write buffer."""
+        raise NotImplementedError
+
     def write(self, data):
         """Write some data bytes to the transport.
 
         This does not block; it buffers the data and arranges for it
         to be sent out asynchronously.
+
+        data may be bytes or any other object supporting the buffer
+        protocol, such as a bytearray or a memoryview.  If it cannot
+        be sent right away, a copy is buffered, unless copying was
+        turned off with set_write_copy().
+        """
+        raise NotImplementedError
+
+    def set_write_copy(self, copy):
+        """Set whether write() copies mutable data that it buffers.
+
+        By default, data that is not bytes is copied if it has to be
+        buffered, so the caller can reuse the object as soon as
+        write() returns.  Passing copy=False makes the transport
+        buffer a reference instead; the caller then promises not to
+        modify the object until it has been sent (e.g. until the
+        write buffer is empty again).
         """
         raise NotImplementedError
 
@@ -61,11 +101,41 @@ class WriteTransport(BaseTransport):
         """Write a list (or any iterable) of data bytes to the transport.
 
         The default implementation just calls write() for each item in
-        the list/iterable.
+        the list/iterable.  Transports that can do scatter-gather I/O
+        override it to pass the whole list to a single system call.
         """
         for data in list_of_data:
             self.write(data)
 
+    def set_cork(self, enabled, *, tcp_nodelay=None, tcp_cork=False):
+        """Turn cork mode on or off.
+
+        In cork mode, writes made during one iteration of the event
+        loop are gathered and sent together at the end of the
+        iteration, instead of each write() trying to send right away.
+        tcp_nodelay and tcp_cork control the TCP_NODELAY and TCP_CORK
+        socket options of TCP transports.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Send data held back by cork mode now.
+
+        The default implementation does nothing.
+        """
+
+    def sendfile(self, file, offset=0, count=None):
+        """Send a file, starting at offset, to the transport.
+
+        This is a coroutine returning the number of bytes sent.  It
+        sends count bytes, or up to the end of the file if count is
+        None, using os.sendfile() where the transport supports it and
+        reading the file in chunks otherwise.  Buffered data is sent
+        first; data written while the file is being sent is sent
+        after it.  The file position is left after the last byte sent.
+        """
+        raise NotImplementedError
+
     def write_eof(self):
         """Closes the write end after flushing buffered data.
 
@@ -114,6 +184,17 @@ class Transport(ReadTransport, WriteTransport):
 class DatagramTransport(BaseTransport):
     """ABC for datagram (UDP) transports."""
 
+    def set_write_buffer_limits(self, high=None, low=None):
+        """Set the high- and low-water limits for write flow control.
+
+        See WriteTransport.set_write_buffer_limits().
+        """
+        raise NotImplementedError
+
+    def get_write_buffer_size(self):
+        """Return the number of bytes of queued datagrams."""
+        raise NotImplementedError
+
     def sendto(self, data, addr=None):
         """Send data to the transport.
 
@@ -121,6 +202,15 @@ class DatagramTransport(BaseTransport):
         to be sent out asynchronously.
         addr is target socket address.
         If addr is None use target address pointed on transport creation.
+        data may be any object supporting the buffer protocol; see
+        WriteTransport.write().
+        """
+        raise NotImplementedError
+
+    def set_write_copy(self, copy):
+        """Set whether sendto() copies mutable data that it buffers.
+
+        See WriteTransport.set_write_copy().
         """
         raise NotImplementedError
 
@@ -184,3 +274,96 @@ class SubprocessTransport(BaseTransport):
         http://docs.python.org/3/library/subprocess#subprocess.Popen.kill
         """
         raise NotImplementedError
+
+
+def _byte_view(data):
+    """Return data passed to write() as bytes or a flat byte memoryview.
+
+    Objects other than bytes that support the buffer protocol are
+    wrapped, not copied; see _FlowControlMixin._snapshot().
+    """
+    if isinstance(data, bytes):
+        return data
+    assert not isinstance(data, str), repr(type(data))
+    view = memoryview(data)
+    if view.ndim != 1 or view.format != 'B':
+        view = view.cast('B')
+    return view
+
+
+def _get_buffer(protocol, sizehint):
+    """Return the buffer of a BufferedProtocol as a flat byte memoryview."""
+    view = memoryview(protocol.get_buffer(sizehint))
+    if view.ndim != 1 or view.format != 'B':
+        view = view.cast('B')
+    if not view:
+        raise RuntimeError('get_buffer() returned an empty buffer')
+    return view
+
+
+class _FlowControlMixin:
+    """All the logic for (write) flow control in a mix-in base class.
+
+    The subclass must implement get_write_buffer_size(), call
+    _maybe_pause_protocol() whenever the write buffer size increases
+    and _maybe_resume_protocol() whenever it decreases, and set the
+    _protocol attribute.  It may also override
+    set_write_buffer_limits() (e.g. to specify different defaults).
+
+    The subclass constructor must call super().__init__(extra).  This
+    will call set_write_buffer_limits().
+
+    Data that has to be buffered must be passed through _snapshot(),
+    which copies it unless set_write_copy(False) was called.
+    """
+
+    def __init__(self, extra=None):
+        super().__init__(extra)
+        self._protocol_paused = False
+        self._write_copy = True
+        self.set_write_buffer_limits()
+
+    def set_write_copy(self, copy):
+        self._write_copy = bool(copy)
+
+    def _snapshot(self, data):
+        # data was returned by _byte_view(); views of bytes objects
+        # are immutable and never need to be copied.
+        if (self._write_copy and isinstance(data, memoryview) and
+                not isinstance(data.obj, bytes)):
+            return bytes(data)
+        return data
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            if low is None:
+                high = 64*1024
+            else:
+                high = 4*low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError('high (%r) must be >= low (%r) must be >= 0' %
+                             (high, low))
+        self._high_water = high
+        self._low_water = low
+
+    def _maybe_pause_protocol(self):
+        if self._protocol_paused:
+            return
+        if self.get_write_buffer_size() <= self._high_water:
+            return
+        self._protocol_paused = True
+        try:
+            self._protocol.pause_writing()
+        except Exception:
+            tulip_log.exception('pause_writing() failed')
+
+    def _maybe_resume_protocol(self):
+        if (self._protocol_paused and
+                self.get_write_buffer_size() <= self._low_water):
+            self._protocol_paused = False
+            try:
+                self._protocol.resume_writing()
+            except Exception:
+                tulip_log.exception('resume_writing() failed')
@@ -10,23 +10,27 @@ import socket
 import stat
 import subprocess
 import sys
+import time
 
 
 from . import constants
 from . import events
 from . import protocols
 from . import selector_events
+from . import selectors
 from . import tasks
 from . import transports
 from .log import tulip_log
 
 
-__all__ = ['SelectorEventLoop', 'STDIN', 'STDOUT', 'STDERR']
+__all__ = ['SelectorEventLoop', 'EdgeTriggeredEventLoop', 'WorkerSupervisor',
+           'STDIN', 'STDOUT', 'STDERR']
 
 STDIN = 0
 STDOUT = 1
 STDERR = 2
 
+_HAVE_WRITEV = hasattr(os, 'writev')
 
 if sys.platform == 'win32':  # pragma: no cover
     raise ImportError('Signals are not really supported on Windows')
@@ -192,6 +196,160 @@ class SelectorEventLoop(selector_events.BaseSelectorEventLoop):
         self._subprocesses.pop(pid, None)
 
 
+class EdgeTriggeredEventLoop(SelectorEventLoop):
+    """Unix event loop polling socket transports edge-triggered.
+
+    Socket transports are registered with epoll once, with EPOLLET,
+    and drain the socket on every event instead of adding and
+    removing readers and writers as they go.  Other file descriptors
+    (listening sockets, pipes, the sock_*() methods) are still polled
+    level-triggered.  Linux only.
+    """
+
+    _edge_triggered = True
+
+    def __init__(self, selector=None):
+        if selector is None:
+            if not hasattr(selectors, 'EpollSelector'):
+                raise NotImplementedError(
+                    'Edge-triggered polling requires epoll')
+            selector = selectors.EpollSelector()
+        super().__init__(selector)
+
+
+# Signals making WorkerSupervisor.run() stop the workers.
+_STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def _returncode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class WorkerSupervisor:
+    """Run a server in several forked worker processes.
+
+    worker(loop, index) is called in each child process with a new
+    event loop made by loop_factory, which is also set as the current
+    event loop; index runs from 0 to workers - 1 (by default, one
+    worker per CPU).  The worker typically creates its servers or
+    datagram endpoints with reuse_port=True, so that all workers bind
+    the same address and the kernel spreads the load over them, and
+    then calls loop.run_forever().  The child exits with status 0 when
+    worker returns, the code of SystemExit, or 1 if it raises.
+
+    run() forks the workers and waits for all of them to exit.  A
+    worker that crashes, i.e. exits with a non-zero status or is
+    killed by a signal, is forked again after restart_delay seconds,
+    up to max_restarts times for each index.  SIGTERM and SIGINT make
+    the supervisor call stop().
+    """
+
+    def __init__(self, worker, workers=None, *, loop_factory=None,
+                 restart_delay=1.0, max_restarts=5):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        if loop_factory is None:
+            loop_factory = SelectorEventLoop
+        self._worker = worker
+        self._loop_factory = loop_factory
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.max_restarts = max_restarts
+        self.pids = {}  # Maps the pid of a running worker to its index.
+        self.returncodes = [None] * workers
+        self.restarts = [0] * workers
+        self._stopping = False
+
+    def run(self):
+        """Fork the workers and wait until all of them have exited.
+
+        Return the list of the workers' last exit statuses, by index.
+        Like subprocess returncodes, a worker killed by signal N has
+        status -N.
+        """
+        handlers = {}
+        for sig in _STOP_SIGNALS:
+            handlers[sig] = signal.signal(sig, self._handle_signal)
+        try:
+            for index in range(self.workers):
+                if not self._stopping:
+                    self._spawn(index)
+            while self.pids:
+                try:
+                    pid, status = os.waitpid(-1, 0)
+                except ChildProcessError:
+                    break
+                index = self.pids.pop(pid, None)
+                if index is None:
+                    continue  # Not one of ours.
+                returncode = self.returncodes[index] = _returncode(status)
+                if (returncode and not self._stopping and
+                        self.restarts[index] < self.max_restarts):
+                    tulip_log.warning('Worker %d (pid %d) exited with %d, '
+                                      'restarting', index, pid, returncode)
+                    self.restarts[index] += 1
+                    time.sleep(self.restart_delay)
+                    if not self._stopping:
+                        self._spawn(index)
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+        return self.returncodes
+
+    def stop(self, sig=signal.SIGTERM):
+        """Stop restarting workers and send sig to the running ones."""
+        self._stopping = True
+        for pid in self.pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _handle_signal(self, sig, frame):
+        self.stop()
+
+    def _spawn(self, index):
+        # Block the stop signals until the pid is recorded, so that
+        # stop() can't miss the new worker.
+        mask = signal.pthread_sigmask(signal.SIG_BLOCK, _STOP_SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                self._run_worker(index, mask)
+            self.pids[pid] = index
+        finally:
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+
+    def _run_worker(self, index, mask):
+        # In the child; this never returns.
+        status = 1
+        try:
+            for sig in _STOP_SIGNALS:
+                signal.signal(sig, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+            # Don't close the parent's loop: an epoll or kqueue object
+            # is shared with the parent after fork().
+            loop = self._loop_factory()
+            events.set_event_loop(loop)
+            self._worker(loop, index)
+            status = 0
+        except SystemExit as exc:
+            if exc.code is None or isinstance(exc.code, int):
+                status = exc.code or 0
+        except BaseException:
+            tulip_log.exception('Worker %d failed', index)
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(status)
+
+
 def _set_nonblocking(fd):
     flags = fcntl.fcntl(fd, fcntl.F_GETFL)
     flags = flags | os.O_NONBLOCK
@@ -210,6 +368,7 @@ class _UnixReadPipeTransport(transports.ReadTransport):
         self._fileno = pipe.fileno()
         _set_nonblocking(self._fileno)
         self._protocol = protocol
+        self._buffered = isinstance(protocol, protocols.BufferedProtocol)
         self._closing = False
         self._loop.add_reader(self._fileno, self._read_ready)
         self._loop.call_soon(self._protocol.connection_made, self)
@@ -218,14 +377,25 @@ class _UnixReadPipeTransport(transports.ReadTransport):
 
     def _read_ready(self):
         try:
-            data = os.read(self._fileno, self.max_size)
+            if self._buffered:
+                buf = transports._get_buffer(self._protocol, self.max_size)
+                nbytes = os.readv(self._fileno, [buf])
+            else:
+                data = os.read(self._fileno, self.max_size)
+                nbytes = len(data)
         except (BlockingIOError, InterruptedError):
             pass
-        except OSError as exc:
+        except Exception as exc:
             self._fatal_error(exc)
         else:
-            if data:
-                self._protocol.data_received(data)
+            if nbytes:
+                if self._buffered:
+                    try:
+                        self._protocol.buffer_updated(nbytes)
+                    except Exception as exc:
+                        self._fatal_error(exc)
+                else:
+                    self._protocol.data_received(data)
             else:
                 self._closing = True
                 self._loop.remove_reader(self._fileno)
@@ -262,7 +432,8 @@ class _UnixReadPipeTransport(transports.ReadTransport):
             self._loop = None
 
 
-class _UnixWritePipeTransport(transports.WriteTransport):
+class _UnixWritePipeTransport(transports._FlowControlMixin,
+                              transports.WriteTransport):
 
     def __init__(self, loop, pipe, protocol, waiter=None, extra=None):
         super().__init__(extra)
@@ -275,6 +446,7 @@ class _UnixWritePipeTransport(transports.WriteTransport):
         _set_nonblocking(self._fileno)
         self._protocol = protocol
         self._buffer = []
+        self._buffer_size = 0  # Number of bytes in _buffer.
         self._conn_lost = 0
         self._closing = False  # Set when close() or write_eof() called.
         self._loop.add_reader(self._fileno, self._read_ready)
@@ -283,12 +455,15 @@ class _UnixWritePipeTransport(transports.WriteTransport):
         if waiter is not None:
             self._loop.call_soon(waiter.set_result, None)
 
+    def get_write_buffer_size(self):
+        return self._buffer_size
+
     def _read_ready(self):
         # pipe was closed by peer
         self._close()
 
     def write(self, data):
-        assert isinstance(data, bytes), repr(data)
+        data = transports._byte_view(data)
         if not data:
             return
 
@@ -312,20 +487,74 @@ class _UnixWritePipeTransport(transports.WriteTransport):
             if n == len(data):
                 return
             elif n > 0:
-                data = data[n:]
+                data = memoryview(data)[n:]
             self._loop.add_writer(self._fileno, self._write_ready)
 
-        self._buffer.append(data)
+        self._buffer.append(self._snapshot(data))
+        self._buffer_size += len(data)
+        self._maybe_pause_protocol()
+
+    def writelines(self, list_of_data):
+        """Write a list of data bytes with as few system calls as possible.
+
+        If nothing is buffered yet, all of it is passed to a single
+        os.writev() call; what is not written is queued without joining.
+        """
+        if self._buffer or self._conn_lost or self._closing:
+            for data in list_of_data:
+                self.write(data)
+            return
+        buffer = self._buffer
+        for data in list_of_data:
+            data = transports._byte_view(data)
+            if data:
+                buffer.append(data)
+                self._buffer_size += len(data)
+        if not buffer:
+            return
+        try:
+            self._write_buffer()
+        except (BlockingIOError, InterruptedError):
+            pass
+        except Exception as exc:
+            self._conn_lost += 1
+            self._fatal_error(exc)
+            return
+        if buffer:
+            buffer[:] = map(self._snapshot, buffer)
+            self._loop.add_writer(self._fileno, self._write_ready)
+            self._maybe_pause_protocol()
+
+    def _write_buffer(self):
+        # Write from the buffer with a single system call and drop the
+        # data that was written; see _SelectorSocketTransport.
+        buffer = self._buffer
+        if len(buffer) == 1:
+            n = os.write(self._fileno, buffer[0])
+        elif _HAVE_WRITEV:
+            n = os.writev(self._fileno,
+                          buffer[:selector_events._IOV_MAX])
+        else:  # pragma: no cover
+            buffer[:] = [b''.join(buffer)]
+            n = os.write(self._fileno, buffer[0])
+        self._buffer_size -= n
+        i = 0
+        while n:
+            chunk = buffer[i]
+            if n < len(chunk):
+                buffer[i] = memoryview(chunk)[n:]
+                break
+            n -= len(chunk)
+            i += 1
+        del buffer[:i]
 
     def _write_ready(self):
-        data = b''.join(self._buffer)
-        assert data, 'Data should not be empty'
+        assert self._buffer, 'Data should not be empty'
 
-        self._buffer.clear()
         try:
-            n = os.write(self._fileno, data)
+            self._write_buffer()
         except (BlockingIOError, InterruptedError):
-            self._buffer.append(data)
+            pass
         except Exception as exc:
             self._conn_lost += 1
             # Remove writer here, _fatal_error() doesn't it
@@ -333,16 +562,12 @@ class _UnixWritePipeTransport(transports.WriteTransport):
             self._loop.remove_writer(self._fileno)
             self._fatal_error(exc)
         else:
-            if n == len(data):
+            self._maybe_resume_protocol()  # May append to buffer.
+            if not self._buffer:
                 self._loop.remove_writer(self._fileno)
                 if self._closing:
                     self._loop.remove_reader(self._fileno)
                     self._call_connection_lost(None)
-                return
-            elif n > 0:
-                data = data[n:]
-
-            self._buffer.append(data)  # Try again later.
 
     def can_write_eof(self):
         return True
@@ -377,6 +602,7 @@ class _UnixWritePipeTransport(transports.WriteTransport):
         if self._buffer:
             self._loop.remove_writer(self._fileno)
         self._buffer.clear()
+        self._buffer_size = 0
         self._loop.remove_reader(self._fileno)
         self._loop.call_soon(self._call_connection_lost, exc)
 
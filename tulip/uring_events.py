@@ -0,0 +1,247 @@
+"""Proactor event loop for Linux using io_uring."""
+
+import os
+import socket
+import struct
+
+from . import futures
+from . import proactor_events
+from . import _uring
+from .log import tulip_log
+
+
+__all__ = ['ProactorEventLoop', 'UringProactor']
+
+
+# Returned by a completion callback that has resubmitted the operation.
+_AGAIN = object()
+
+# File offset for IORING_OP_READ/WRITE meaning "the current position".
+_CURRENT_POS = 2**64 - 1
+
+
+class _UringFuture(futures.Future):
+    """Subclass of Future which represents an io_uring operation.
+
+    Cancelling it also asks the kernel to cancel the operation.
+    """
+
+    def __init__(self, proactor, *, loop=None):
+        super().__init__(loop=loop)
+        self._proactor = proactor
+        self._key = None  # user_data of the submitted operation.
+
+    def cancel(self):
+        if not self.done() and self._key is not None:
+            self._proactor._cancel(self._key)
+        return super().cancel()
+
+
+def _sockaddr(family, address):
+    # Build a struct sockaddr for IORING_OP_CONNECT.  The address must
+    # be numeric, as returned by getaddrinfo().
+    if family == socket.AF_INET:
+        host, port = address[:2]
+        return (struct.pack('=H', family) + struct.pack('!H', port) +
+                socket.inet_pton(family, host) + bytes(8))
+    elif family == socket.AF_INET6:
+        host, port, flowinfo, scope_id = (tuple(address) + (0, 0))[:4]
+        host = host.partition('%')[0]
+        return (struct.pack('=H', family) +
+                struct.pack('!HI', port, flowinfo) +
+                socket.inet_pton(family, host) + struct.pack('=I', scope_id))
+    elif family == getattr(socket, 'AF_UNIX', None):
+        if isinstance(address, str):
+            address = os.fsencode(address)
+        return struct.pack('=H', family) + address + b'\0'
+    else:
+        raise ValueError('Unsupported address family {}'.format(family))
+
+
+class UringProactor:
+    """Proactor implementation using io_uring.
+
+    Like IocpProactor, the recv(), send(), accept() and connect()
+    methods return futures which are completed by select().
+    Operations are queued in the submission ring and all passed to
+    the kernel by the single io_uring_enter() call that also waits
+    for completions.
+    """
+
+    def __init__(self, entries=256):
+        self._loop = None
+        self._results = []
+        self._ring = _uring.IoUring(entries)
+        # Maps user_data to (future, obj, buffer, callback, release).
+        self._cache = {}
+        self._next_key = 1  # user_data 0 is used for cancel requests.
+
+    def set_loop(self, loop):
+        self._loop = loop
+
+    def select(self, timeout=None):
+        if not self._results:
+            self._poll(timeout)
+        tmp = self._results
+        self._results = []
+        return tmp
+
+    def recv(self, conn, nbytes, flags=0):
+        buf = bytearray(nbytes)
+        if isinstance(conn, socket.socket):
+            opcode, off = _uring.IORING_OP_RECV, 0
+        else:
+            opcode, off, flags = _uring.IORING_OP_READ, _CURRENT_POS, 0
+        def finish(res):
+            return bytes(memoryview(buf)[:res])
+        return self._submit(opcode, conn, buf, finish,
+                            addr=_uring.sqe_address(buf), length=nbytes,
+                            off=off, op_flags=flags)
+
+    def recv_into(self, conn, buf, flags=0):
+        # The kernel writes straight into buf, which must be a writable
+        # buffer; the future's result is the number of bytes received.
+        if isinstance(conn, socket.socket):
+            opcode, off = _uring.IORING_OP_RECV, 0
+        else:
+            opcode, off, flags = _uring.IORING_OP_READ, _CURRENT_POS, 0
+        nbytes = memoryview(buf).nbytes
+        def finish(res):
+            return res
+        return self._submit(opcode, conn, buf, finish,
+                            addr=_uring.sqe_address(buf), length=nbytes,
+                            off=off, op_flags=flags)
+
+    def send(self, conn, buf, flags=0):
+        # Unlike WSASend(), a send may complete partially; the future
+        # is only completed once everything has been sent.
+        data = bytes(buf)
+        if isinstance(conn, socket.socket):
+            opcode, off = _uring.IORING_OP_SEND, 0
+        else:
+            opcode, off, flags = _uring.IORING_OP_WRITE, _CURRENT_POS, 0
+        address = _uring.sqe_address(data)
+        sent = 0
+        def finish(res):
+            nonlocal sent
+            sent += res
+            if sent < len(data):
+                self._submit(opcode, conn, data, finish,
+                             addr=address + sent, length=len(data) - sent,
+                             off=off, op_flags=flags, fut=f)
+                return _AGAIN
+            return sent
+        f = self._submit(opcode, conn, data, finish,
+                         addr=address, length=len(data),
+                         off=off, op_flags=flags)
+        return f
+
+    def accept(self, listener):
+        def finish_accept(res):
+            conn = socket.socket(listener.family, socket.SOCK_STREAM,
+                                 listener.proto, fileno=res)
+            conn.settimeout(listener.gettimeout())
+            return conn, conn.getpeername()
+        flags = socket.SOCK_CLOEXEC | socket.SOCK_NONBLOCK
+        return self._submit(_uring.IORING_OP_ACCEPT, listener, None,
+                            finish_accept, op_flags=flags, release=os.close)
+
+    def connect(self, conn, address):
+        sockaddr = bytearray(_sockaddr(conn.family, address))
+        def finish_connect(res):
+            return conn
+        return self._submit(_uring.IORING_OP_CONNECT, conn, sockaddr,
+                            finish_connect,
+                            addr=_uring.sqe_address(sockaddr),
+                            off=len(sockaddr))
+
+    def _submit(self, opcode, obj, buf, callback, *, addr=0, length=0, off=0,
+                op_flags=0, fut=None, release=None):
+        # Queue an operation; its result is passed to callback() when
+        # it completes.  buf is kept alive until then.  If the future
+        # was cancelled but the operation still succeeded, the result
+        # is passed to release() instead, e.g. to close an accepted fd.
+        if fut is None:
+            fut = _UringFuture(self, loop=self._loop)
+        key = self._next_key
+        self._next_key += 1
+        self._ring.prepare(opcode, obj.fileno(), key, addr=addr,
+                           length=length, off=off, op_flags=op_flags)
+        self._cache[key] = (fut, obj, buf, callback, release)
+        fut._key = key
+        return fut
+
+    def _cancel(self, key):
+        if key in self._cache:
+            self._ring.prepare(_uring.IORING_OP_ASYNC_CANCEL, -1, 0,
+                               addr=key)
+
+    def _poll(self, timeout=None):
+        if timeout is not None and timeout < 0:
+            raise ValueError("negative timeout")
+        ring = self._ring
+        if timeout is not None and timeout == 0:
+            ring.submit()
+        else:
+            ring.submit(wait=True, timeout=timeout)
+        for key, res in ring.completions():
+            try:
+                f, obj, buf, callback, release = self._cache.pop(key)
+            except KeyError:
+                continue  # Result of a cancel request.
+            if f.cancelled():
+                # The kernel finished before it saw the cancel request;
+                # popping the entry drops our reference to buf.
+                if res >= 0 and release is not None:
+                    try:
+                        release(res)
+                    except OSError:
+                        pass
+                continue
+            if res < 0:
+                f.set_exception(OSError(-res, os.strerror(-res)))
+                self._results.append(f)
+                continue
+            try:
+                value = callback(res)
+            except OSError as e:
+                f.set_exception(e)
+            else:
+                if value is _AGAIN:
+                    continue
+                f.set_result(value)
+            self._results.append(f)
+
+    def _stop_serving(self, obj):
+        # obj is a listening socket.  Closing it does not end the
+        # pending accept(), so cancel that explicitly.
+        for f, cached_obj, *rest in list(self._cache.values()):
+            if cached_obj is obj:
+                f.cancel()
+
+    def close(self):
+        if self._ring is None:
+            return
+        # Cancel remaining operations and wait until the kernel is
+        # done with their buffers.
+        for f, *rest in list(self._cache.values()):
+            f.cancel()
+        while self._cache:
+            self._poll(1)
+            if self._cache:
+                tulip_log.debug('taking long time to close proactor')
+        self._results = []
+        self._ring.close()
+        self._ring = None
+
+
+class ProactorEventLoop(proactor_events.BaseProactorEventLoop):
+    """Linux version of proactor event loop using io_uring."""
+
+    def __init__(self, proactor=None):
+        if proactor is None:
+            proactor = UringProactor()
+        super().__init__(proactor)
+
+    def _socketpair(self):
+        return socket.socketpair()
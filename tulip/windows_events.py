@@ -188,6 +188,28 @@ class IocpProactor:
                     raise
         return self._register(ov, conn, finish)
 
+    def recv_into(self, conn, buf, flags=0):
+        # _overlapped has no WSARecvInto(); receive into the overlapped
+        # object's own buffer and copy the data into buf.
+        self._register_with_iocp(conn)
+        buf = memoryview(buf).cast('B')
+        ov = _overlapped.Overlapped(NULL)
+        if isinstance(conn, socket.socket):
+            ov.WSARecv(conn.fileno(), len(buf), flags)
+        else:
+            ov.ReadFile(conn.fileno(), len(buf))
+        def finish(trans, key, ov):
+            try:
+                data = ov.getresult()
+            except OSError as exc:
+                if exc.winerror == _overlapped.ERROR_NETNAME_DELETED:
+                    raise ConnectionResetError(*exc.args)
+                else:
+                    raise
+            buf[:len(data)] = data
+            return len(data)
+        return self._register(ov, conn, finish)
+
     def send(self, conn, buf, flags=0):
         self._register_with_iocp(conn)
         ov = _overlapped.Overlapped(NULL)